@@ -9,78 +9,104 @@ bl_info = {
     "update_date": "2024/12/9"  # 更新日期
 }
 
+import os
+import time
+
 import bpy
+import numpy as np
+from bpy_extras.io_utils import ExportHelper
 from mathutils import Vector
 
-def get_source_bone_structure(source_armature):
+from .align import align_bone_arrays, ik_target_lengths
+from .bulk import (
+    BoneArrays,
+    bone_arrays_from_structure,
+    bone_structure_from_arrays,
+    create_bones_bulk,
+    missing_mask,
+    read_bone_arrays,
+)
+from .codec import decode_constraint, encode_constraint
+from .deferred import deferred_updates, mark_updated
+from .hierarchy import HierarchyIndex
+from .log import TransferLog
+from .incremental import (
+    BONE_TAG,
+    diff_constraints,
+    find_changed_bones,
+    get_bone_fingerprints,
+    get_constraint_fingerprints,
+    get_constraint_tags,
+    set_constraint_tags,
+)
+from .mapping import get_bone_mapping, get_cached_bone_mapping, get_normalizer
+from .preview import get_cached_preview, register_handlers, store_preview, unregister_handlers, watched_armatures
+from .scope import ArmatureSource, ReferenceDataSource, Scope, build_scoped_data, record_subtargets
+from .template import get_loaded_template_hash, load_template, write_template
+from .verify import (
+    DEFAULT_ANGLE_TOLERANCE,
+    DEFAULT_LOCATION_TOLERANCE,
+    DEFAULT_MAX_ANGLE,
+    DEFAULT_POSES,
+    action_frames,
+    verify_pose_equivalence,
+)
+
+def get_source_bone_structure(source_armature, bone_arrays=None):
+    """在物体模式下用 foreach_get 读取 armature.data.bones 获取骨骼结构，不切换编辑模式"""
     bone_structure = {}
     if source_armature:
-        current_mode = bpy.context.object.mode
         try:
-            bpy.context.view_layer.objects.active = source_armature
-            if bpy.ops.object.mode_set.poll():
-                bpy.ops.object.mode_set(mode='EDIT')
-                
-                edit_bones = source_armature.data.edit_bones
-                
-                for bone in edit_bones:
-                    parent_name = bone.parent.name if bone.parent else None
-                    bone_structure[bone.name] = {
-                        'head': bone.head.copy(),
-                        'tail': bone.tail.copy(),
-                        'roll': bone.roll,
-                        'parent': parent_name,
-                    }
-                
-                bpy.ops.object.mode_set(mode=current_mode)
-            else:
-                raise RuntimeError("Cannot switch to EDIT mode.")
+            if bone_arrays is None:
+                bone_arrays = read_bone_arrays(source_armature)
+            bone_structure = bone_structure_from_arrays(bone_arrays, Vector)
         except Exception as e:
-            bpy.ops.object.mode_set(mode=current_mode)
             raise RuntimeError(f"Failed to get source bone structure: {e}")
     return bone_structure
 
-def create_missing_bones(target_armature, bone_structure, ik_end_bones=None):
-    current_mode = bpy.context.object.mode
+def create_missing_bones(target_armature, bone_structure, ik_end_bones=None, indices=None, bone_mapping=None, hierarchy=None,
+                         update_indices=None, fingerprints=None, log=None, ik_lengths=None):
+    """批量创建目标骨架中缺失的骨骼
+
+    bone_structure 可以是骨骼结构字典或 BoneArrays；indices 指定要创建的骨骼下标（会按拓扑顺序创建）；
+    bone_mapping 用于把参考骨架中的父骨骼名转换为目标骨架中的骨骼名；
+    update_indices 指定需要按参考骨骼就地更新的已有骨骼，fingerprints 为写入骨骼标记的几何指纹；
+    ik_lengths 为按IK链长度确定的IK目标骨骼长度（对齐放置时使用，见 align.ik_target_lengths）。
+    """
+    if log is None:
+        log = TransferLog()
+    current_mode = bpy.context.object.mode if bpy.context.object else 'OBJECT'
     try:
         if target_armature:
+            if isinstance(bone_structure, BoneArrays):
+                bone_arrays = bone_structure
+            else:
+                bone_arrays = bone_arrays_from_structure(bone_structure)
+            if indices is None:
+                indices = np.arange(len(bone_arrays.names))
+            
+            # 没有缺失或需要更新的骨骼时不进入编辑模式
+            names = np.asarray(bone_arrays.names, dtype=str)
+            has_missing = len(indices) and missing_mask(names[indices], target_armature.data.bones.keys()).any()
+            if not has_missing and (update_indices is None or not len(update_indices)):
+                return []
+            
             bpy.context.view_layer.objects.active = target_armature
             if bpy.ops.object.mode_set.poll():
                 bpy.ops.object.mode_set(mode='EDIT')
+                log.count('mode_switches')
                 
-                edit_bones = target_armature.data.edit_bones
-                
-                created_bones = []
-                for bone_name, bone_data in bone_structure.items():
-                    if bone_name not in edit_bones:
-                        new_bone = edit_bones.new(bone_name)
-                        
-                        # 如果是IK链末端骨骼，创建target bone并设置其头部位置为IK骨骼的尾部
-                        if ik_end_bones and bone_name in ik_end_bones:
-                            ik_bone = edit_bones[bone_name]
-                            new_bone.head = ik_bone.tail.copy()
-                            new_bone.tail = new_bone.head + Vector((0.05, 0, 0))  # 设置默认长度和方向
-                            
-                            # 创建IK目标骨骼
-                            ik_target_name = f"{bone_name}_IK_Target"
-                            if ik_target_name not in edit_bones:
-                                ik_target_bone = edit_bones.new(ik_target_name)
-                                ik_target_bone.head = ik_bone.tail.copy()
-                                ik_target_bone.tail = ik_target_bone.head + Vector((0.1, 0, 0))  # 设置默认长度和方向
-                                created_bones.append(ik_target_bone.name)
-                        else:
-                            new_bone.head = bone_data['head']
-                            new_bone.tail = bone_data['tail']
-                        
-                        new_bone.roll = bone_data['roll']
-                        
-                        if bone_data['parent'] and bone_data['parent'] in edit_bones:
-                            new_bone.parent = edit_bones[bone_data['parent']]
-                        
-                        created_bones.append(new_bone.name)
+                created_bones = create_bones_bulk(
+                    target_armature.data.edit_bones, bone_arrays, indices, ik_end_bones, bone_mapping, hierarchy,
+                    update_indices, fingerprints, ik_lengths
+                )
                 
                 bpy.ops.object.mode_set(mode=current_mode)
-                print(f"Created bones: {created_bones}")  # 输出创建的骨骼列表
+                log.count('mode_switches')
+                log.count('bones_created', len(created_bones))
+                if update_indices is not None and len(update_indices):
+                    log.count('bones_updated', len(update_indices))
+                log.debug("Created bones: %s", created_bones)  # 输出创建的骨骼列表
                 return created_bones
             else:
                 raise RuntimeError("Cannot switch to EDIT mode.")
@@ -90,168 +116,177 @@ def create_missing_bones(target_armature, bone_structure, ik_end_bones=None):
         bpy.ops.object.mode_set(mode=current_mode)
         raise RuntimeError(f"Failed to create missing bones: {e}")
 
-def find_ik_chain_end_bones(armature):
+def find_ik_chain_end_bones(armature, log=None):
     """查找包含IK约束的骨骼，并返回所有链末端骨骼的名称"""
-    current_mode = bpy.context.object.mode if bpy.context.object else 'OBJECT'
     try:
-        bpy.context.view_layer.objects.active = armature
-        if bpy.ops.object.mode_set.poll():
-            bpy.ops.object.mode_set(mode='POSE')
-            
-            pose_bones = armature.pose.bones
-            ik_chain_ends = []
-
-            for pb in pose_bones:
-                for c in pb.constraints:
-                    if c.type == 'IK':
-                        ik_chain_ends.append(pb.name)
-                        break  # 每个骨骼只记录一次
-            
-            bpy.ops.object.mode_set(mode=current_mode)
-            print(f"IK Chain End Bones: {ik_chain_ends}")  # 输出IK链末端骨骼
-            return ik_chain_ends
-        else:
-            raise RuntimeError("Cannot switch to POSE mode.")
+        ik_chain_ends = []
+        # pose.bones 在物体模式下同样可读，无需切换到姿态模式
+        for pb in armature.pose.bones:
+            for c in pb.constraints:
+                if c.type == 'IK':
+                    ik_chain_ends.append(pb.name)
+                    break  # 每个骨骼只记录一次
+        
+        if log is not None:
+            log.debug("IK Chain End Bones: %s", ik_chain_ends)  # 输出IK链末端骨骼
+        return ik_chain_ends
     except Exception as e:
-        bpy.ops.object.mode_set(mode=current_mode)
         raise RuntimeError(f"Failed to find IK chain end bones: {e}")
 
 def get_all_constraints(armature):
+    """获取骨架上所有约束的编码记录 {骨骼名: [ConstraintRecord]}"""
     all_constraints = {}
     for bone in armature.pose.bones:
-        bone_constraints = []
-        for constraint in bone.constraints:
-            constraint_data = {}
-            for attr in dir(constraint):
-                if not attr.startswith("_") and not callable(getattr(constraint, attr)):
-                    try:
-                        value = getattr(constraint, attr)
-                        constraint_data[attr] = value
-                    except AttributeError:
-                        pass  # 忽略无法获取的属性
-            bone_constraints.append(constraint_data)
-        if bone_constraints:
-            all_constraints[bone.name] = bone_constraints
+        if bone.constraints:
+            all_constraints[bone.name] = [encode_constraint(c, armature) for c in bone.constraints]
     return all_constraints
 
-def apply_constraints(target_armature, source_constraints, bone_mapping):
-    current_mode = bpy.context.object.mode if bpy.context.object else 'OBJECT'
-    
+def log_failures(log, record, failures):
+    """记录约束属性写入失败"""
+    for attr, reason in failures:
+        log.count('setattr_failures')
+        log.warning("Could not set attribute '%s' on constraint of type '%s': %s", attr, record.type, reason)
+
+def log_unmatched_bones(log, unmatched):
+    """未匹配的骨骼汇总为一条警告，完整列表只在调试级别输出"""
+    if not unmatched:
+        return
+    shown = ', '.join(unmatched[:10])
+    more = f" and {len(unmatched) - 10} more" if len(unmatched) > 10 else ''
+    log.warning("%d bones not found in the target armature: %s%s", len(unmatched), shown, more)
+    log.debug("Unmatched bones: %s", unmatched)
+
+def constraint_operations(diff):
+    """把约束差异展开为按应用顺序排列的操作列表，可以分块应用
+
+    ('REMOVE', 骨骼名, 约束名)、('UPDATE', 骨骼名, 约束名, 记录, 指纹)、('ADD', 骨骼名, 记录, 指纹)、('ADOPT', 骨骼名, 约束名, 指纹)
+    """
+    return ([('REMOVE',) + item for item in diff.stale]
+            + [('UPDATE',) + item for item in diff.changed]
+            + [('ADD',) + item for item in diff.missing]
+            + [('ADOPT',) + item for item in diff.adopted])
+
+def apply_constraint_operations(target_armature, operations, bone_mapping, log=None, journal=None):
+    """按顺序应用约束操作并更新约束标记
+
+    给定 journal 列表时追加撤销所需的记录（被删除和被更新约束的原始编码、添加的约束名、原有标记），
+    供 rollback_constraint_operations 回滚。
+    """
+    if log is None:
+        log = TransferLog()
     try:
-        if not target_armature or not isinstance(target_armature, bpy.types.Object) or target_armature.type != 'ARMATURE':
-            raise RuntimeError("Target armature is not available or not an armature.")
-        
-        bpy.context.view_layer.objects.active = target_armature
-        if bpy.ops.object.mode_set.poll() and current_mode != 'POSE':
-            bpy.ops.object.mode_set(mode='POSE')
-        
         pose_bones = target_armature.pose.bones
+        tags_by_bone = {}
         
-        for source_bone_name, constraints in source_constraints.items():
-            if source_bone_name not in pose_bones:
-                print(f"Warning: Bone '{source_bone_name}' does not exist in the target armature.")
-                continue
-            
-            pb = pose_bones[source_bone_name]
+        for operation in operations:
+            kind, bone_name = operation[0], operation[1]
+            pb = pose_bones[bone_name]
+            tags = tags_by_bone.get(bone_name)
+            if tags is None:
+                tags = tags_by_bone[bone_name] = get_constraint_tags(pb)
+                if journal is not None:
+                    journal.append(('TAGS', bone_name, dict(tags)))
+            constraints = pb.constraints
             
-            for constraint_data in constraints:
-                c_type = constraint_data.get('type', '')
-                new_constraint = pb.constraints.new(c_type)
-                
-                # 设置除 'type' 外的所有其他属性
-                for attr, value in constraint_data.items():
-                    if hasattr(new_constraint, attr) and attr != 'type':  # 跳过 'type'
-                        if attr == 'target':
-                            # 确保约束的目标总是当前的目标骨架对象
-                            setattr(new_constraint, attr, target_armature)
-                        elif attr == 'subtarget' and isinstance(value, str):
-                            # 使用映射来找到对应的目标骨骼
-                            mapped_subtarget = bone_mapping.get(value)
-                            if mapped_subtarget and mapped_subtarget in pose_bones:
-                                setattr(new_constraint, attr, mapped_subtarget)
-                            else:
-                                print(f"Warning: Subtarget bone '{value}' not found in the target armature.")
-                        elif attr in {'target_space', 'owner_space'} and isinstance(value, str):
-                            # 尝试将字符串转换为有效的枚举值
-                            enum_values = [item.identifier for item in new_constraint.rna_type.properties[attr].enum_items]
-                            if value.upper() in enum_values:
-                                setattr(new_constraint, attr, value.upper())
-                            else:
-                                print(f"Warning: Invalid space setting '{value}' for attribute '{attr}'. Using default.")
-                        else:
-                            try:
-                                setattr(new_constraint, attr, value)
-                            except AttributeError:
-                                print(f"Warning: Could not set attribute '{attr}' on constraint of type '{c_type}'.")
-                # 特殊处理特定类型的约束
-                if c_type == 'IK':
-                    for attr in ['chain_count', 'use_stretch', 'iterations', 'pole_angle']:
-                        if attr in constraint_data:
-                            try:
-                                setattr(new_constraint, attr, constraint_data[attr])
-                            except AttributeError:
-                                print(f"Warning: Could not set attribute '{attr}' on IK constraint.")
-                    if 'pole_target' in constraint_data:
-                        pole_value = constraint_data['pole_target']
-                        if pole_value:
-                            pole_obj = bpy.data.objects.get(pole_value)
-                            if pole_obj and pole_obj.type == 'ARMATURE':
-                                setattr(new_constraint, 'pole_target', pole_obj)  # IK极向目标可以是其他骨架
-                            else:
-                                print(f"Warning: Pole target '{pole_value}' not found or not an armature.")
-                                setattr(new_constraint, 'pole_target', None)
-                        else:
-                            setattr(new_constraint, 'pole_target', None)
-                elif c_type == 'DAMPED_TRACK':
-                    for attr in ['track_axis', 'influence']:
-                        if attr in constraint_data:
-                            try:
-                                setattr(new_constraint, attr, constraint_data[attr])
-                            except AttributeError:
-                                print(f"Warning: Could not set attribute '{attr}' on DAMPED_TRACK constraint.")
-                elif c_type in ['COPY_LOCATION', 'COPY_ROTATION', 'COPY_SCALE']:
-                    for attr in ['use_offset', 'invert_x', 'invert_y', 'invert_z', 'use_x', 'use_y', 'use_z', 'mix_mode', 'owner_space', 'target_space']:
-                        if attr in constraint_data:
-                            try:
-                                setattr(new_constraint, attr, constraint_data[attr])
-                            except AttributeError:
-                                print(f"Warning: Could not set attribute '{attr}' on {c_type} constraint.")
-                elif c_type == 'LIMIT_ROTATION':
-                    for attr in ['use_limit_x', 'use_limit_y', 'use_limit_z', 'min_x', 'max_x', 'min_y', 'max_y', 'min_z', 'max_z', 'owner_space']:
-                        if attr in constraint_data:
-                            try:
-                                setattr(new_constraint, attr, constraint_data[attr])
-                            except AttributeError:
-                                print(f"Warning: Could not set attribute '{attr}' on LIMIT_ROTATION constraint.")
-
-        if current_mode != 'POSE':
-            bpy.ops.object.mode_set(mode=current_mode)
+            if kind == 'REMOVE':
+                constraint_name = operation[2]
+                constraint = constraints.get(constraint_name)
+                if constraint is not None:
+                    if journal is not None:
+                        journal.append(('REMOVE', bone_name, encode_constraint(constraint, target_armature),
+                                        list(constraints).index(constraint)))
+                    constraints.remove(constraint)
+                    log.count('constraints_removed')
+                tags.pop(constraint_name, None)
+            elif kind == 'UPDATE':
+                constraint_name, record, fingerprint = operation[2:]
+                constraint = constraints[constraint_name]
+                previous = encode_constraint(constraint, target_armature) if journal is not None else None
+                log.count('constraints_updated')
+                log_failures(log, record, decode_constraint(constraint, record, target_armature, bone_mapping, pose_bones))
+                if journal is not None:
+                    journal.append(('UPDATE', bone_name, constraint.name, previous))
+                tags.pop(constraint_name, None)
+                tags[constraint.name] = fingerprint
+            elif kind == 'ADD':
+                record, fingerprint = operation[2:]
+                new_constraint = constraints.new(record.type)
+                log.count('constraints_added')
+                log_failures(log, record, decode_constraint(new_constraint, record, target_armature, bone_mapping, pose_bones))
+                if journal is not None:
+                    journal.append(('ADD', bone_name, new_constraint.name))
+                tags[new_constraint.name] = fingerprint
+            else:
+                tags[operation[2]] = operation[3]
+        
+        for bone_name, tags in tags_by_bone.items():
+            set_constraint_tags(pose_bones[bone_name], tags)
     
     except Exception as e:
-        if bpy.ops.object.mode_set.poll():
-            bpy.ops.object.mode_set(mode=current_mode)
         raise RuntimeError(f"Failed to apply constraints: {e}")
 
-# 辅助函数：创建从源骨架到目标骨架的骨骼名称映射
-def create_bone_mapping(source_armature, target_armature, created_bones=[]):
-    """创建从源骨架到目标骨架的骨骼名称映射"""
-    source_bones = [bone.name for bone in source_armature.pose.bones]
-    target_bones = [bone.name for bone in target_armature.pose.bones]
-
-    bone_mapping = {}
-    for source_name in source_bones:
-        if source_name in target_bones:
-            bone_mapping[source_name] = source_name  # 假设骨骼名称一致
-        elif source_name in created_bones:
-            bone_mapping[source_name] = source_name  # 已经创建的骨骼
+def rollback_constraint_operations(target_armature, journal):
+    """按相反顺序撤销 journal 中记录的约束修改，并清空 journal"""
+    pose_bones = target_armature.pose.bones
+    for entry in reversed(journal):
+        kind, bone_name = entry[0], entry[1]
+        if bone_name not in pose_bones:
+            continue
+        pb = pose_bones[bone_name]
+        constraints = pb.constraints
+        if kind == 'TAGS':
+            set_constraint_tags(pb, entry[2])
+        elif kind == 'ADD':
+            constraint = constraints.get(entry[2])
+            if constraint is not None:
+                constraints.remove(constraint)
+        elif kind == 'UPDATE':
+            constraint = constraints.get(entry[2])
+            if constraint is not None:
+                # 原始编码中的子目标已是目标骨架中的骨骼名，无需映射
+                decode_constraint(constraint, entry[3], target_armature, None, pose_bones)
         else:
-            print(f"Warning: Bone '{source_name}' not found in the target armature.")
-    
-    print(f"Bone Mapping: {bone_mapping}")  # 输出骨骼映射
-    return bone_mapping
+            record, index = entry[2], entry[3]
+            constraint = constraints.new(record.type)
+            decode_constraint(constraint, record, target_armature, None, pose_bones)
+            constraints.move(len(constraints) - 1, min(index, len(constraints) - 1))
+    journal.clear()
+
+def restore_bones(target_armature, created_bones, snapshot, log=None):
+    """一次进入编辑模式删除 created_bones，并按 snapshot {骨骼名: (头, 尾, roll, 父骨骼名, 骨骼标记)} 还原被更新的骨骼"""
+    if log is None:
+        log = TransferLog()
+    if not created_bones and not snapshot:
+        return
+    current_mode = bpy.context.object.mode if bpy.context.object else 'OBJECT'
+    bpy.context.view_layer.objects.active = target_armature
+    bpy.ops.object.mode_set(mode='EDIT')
+    log.count('mode_switches')
+    try:
+        edit_bones = target_armature.data.edit_bones
+        for name, (head, tail, roll, parent, _) in snapshot.items():
+            edit_bone = edit_bones.get(name)
+            if edit_bone is None:
+                continue
+            edit_bone.head = head
+            edit_bone.tail = tail
+            edit_bone.roll = roll
+            edit_bone.parent = edit_bones.get(parent) if parent else None
+        # 按创建顺序倒序删除，子骨骼总是先于父骨骼删除
+        for name in reversed(created_bones):
+            edit_bone = edit_bones.get(name)
+            if edit_bone is not None:
+                edit_bones.remove(edit_bone)
+    finally:
+        bpy.ops.object.mode_set(mode=current_mode)
+        log.count('mode_switches')
+    bones = target_armature.data.bones
+    for name, (_, _, _, _, tag) in snapshot.items():
+        if name in bones and tag is not None:
+            bones[name][BONE_TAG] = tag
 
 # 辅助函数：获取IK链中的所有骨骼
-def get_ik_chain_bones_recursive(armature):
+def get_ik_chain_bones_recursive(armature, hierarchy=None, log=None):
     """获取IK链中的所有骨骼及其父骨骼"""
     ik_chain_bones = set()
     
@@ -266,94 +301,1040 @@ def get_ik_chain_bones_recursive(armature):
                 if constraint.pole_target and constraint.pole_subtarget:
                     ik_chain_bones.add(constraint.pole_subtarget)
     
-    # 递归添加所有父骨骼
-    pose_bones = armature.pose.bones
-    for bone_name in list(ik_chain_bones):
-        pb = pose_bones[bone_name]
-        while pb.parent:
-            ik_chain_bones.add(pb.parent.name)
-            pb = pb.parent
+    # 通过层级索引添加所有父骨骼，共享的祖先链只遍历一次
+    if hierarchy is None:
+        hierarchy = HierarchyIndex.from_armature(armature)
+    closure = hierarchy.with_ancestors(hierarchy.indices_of(ik_chain_bones))
+    ik_chain_bones.update(hierarchy.names[i] for i in np.flatnonzero(closure))
     
-    print(f"Recursive IK Chain Bones: {ik_chain_bones}")  # 输出递归查找的IK链骨骼
+    if log is not None:
+        log.debug("Recursive IK Chain Bones: %s", ik_chain_bones)  # 输出递归查找的IK链骨骼
     return ik_chain_bones
 
+def extract_reference_data(reference_armature, log=None, scope=None):
+    """在物体模式下提取参考骨架快照（骨骼结构、IK链和约束信息），不调用任何操作符，结果可重复用于多个目标骨架
+
+    给定 scope（Scope）时只提取范围内的骨骼及其约束引用的子目标和祖先骨骼，见 scope.py。
+    """
+    if log is None:
+        log = TransferLog()
+    if scope is not None:
+        with log.phase('extraction'):
+            return build_scoped_data(ArmatureSource(reference_armature), scope, ('ARMATURE', reference_armature.name),
+                                     armature=reference_armature)
+    with log.phase('extraction'):
+        try:
+            bone_arrays = read_bone_arrays(reference_armature)
+            hierarchy = HierarchyIndex.from_arrays(bone_arrays)
+            bone_structure = get_source_bone_structure(reference_armature, bone_arrays)
+        except Exception as e:
+            raise RuntimeError(f"Failed to get source bone structure: {e}")
+
+    with log.phase('ik_discovery'):
+        try:
+            ik_end_bones = find_ik_chain_end_bones(reference_armature, log)
+        except Exception as e:
+            raise RuntimeError(f"Failed to find IK chain end bones: {e}")
+
+        try:
+            ik_chain_bones = get_ik_chain_bones_recursive(reference_armature, hierarchy, log)
+        except Exception as e:
+            raise RuntimeError(f"Failed to get IK chain bones: {e}")
+
+    with log.phase('constraint_encoding'):
+        constraints = get_all_constraints(reference_armature)
+
+    return {
+        'key': ('ARMATURE', reference_armature.name),
+        'armature': reference_armature,
+        'bone_structure': bone_structure,
+        'bone_arrays': bone_arrays,
+        'hierarchy': hierarchy,
+        'ik_end_bones': ik_end_bones,
+        'ik_chain_bones': ik_chain_bones,
+        'constraints': constraints,
+    }
+
+def scope_reference_data(reference_data, scope):
+    """从已提取或已加载模板的参考数据中取出范围内的部分，约束只反序列化范围内的骨骼"""
+    return build_scoped_data(ReferenceDataSource(reference_data), scope, reference_data['key'],
+                             bone_arrays=reference_data['bone_arrays'])
+
+def select_transfer_bones(reference_data, transfer_ik_bones, transfer_missing_bones):
+    """返回 (IK链骨骼, 需要创建的骨骼, 需要更新和比较约束的骨骼) 三个与参考骨骼对应的布尔掩码
+
+    范围传递时范围内的骨骼及补充的子目标和祖先骨骼都可以创建，但只更新范围内的骨骼。
+    """
+    names = np.asarray(reference_data['bone_arrays'].names, dtype=str)
+    ik_chain_bones = reference_data['ik_chain_bones']
+    scoped = reference_data.get('scope') is not None
+    is_ik_bone = np.isin(names, list(ik_chain_bones)) if ik_chain_bones else np.zeros(len(names), dtype=bool)
+    selected = np.full(len(names), scoped, dtype=bool)
+    if transfer_ik_bones:
+        selected |= is_ik_bone
+    if transfer_missing_bones:
+        selected |= ~is_ik_bone
+    in_scope = np.isin(names, reference_data['scope']) if scoped else selected
+    return is_ik_bone, selected, in_scope
+
+def filter_constraints(reference_data, transfer_ik_bones, transfer_missing_bones):
+    """过滤IK链中的约束（只按骨骼名过滤，模板中的约束在读取时才反序列化）；范围传递时返回范围内的全部约束"""
+    source_constraints = reference_data['constraints']
+    ik_chain_bones = reference_data['ik_chain_bones']
+    scoped = reference_data.get('scope') is not None
+    bone_names = [
+        bone_name for bone_name in source_constraints
+        if scoped
+        or (transfer_ik_bones and bone_name in ik_chain_bones)
+        or (transfer_missing_bones and bone_name not in ik_chain_bones)
+    ]
+    subset = getattr(source_constraints, 'subset', None)
+    if subset is not None:
+        return subset(bone_names)
+    return {bone_name: source_constraints[bone_name] for bone_name in bone_names}
+
+class TransferJob:
+    """可以分块执行和回滚的传递
+
+    prepare() 计算骨骼映射，一次进入编辑模式创建缺失骨骼，并把约束差异展开为操作列表（prepare_steps() 为其分步版本）；
+    step() 每次应用有限数量的约束操作；rollback() 撤销已应用的约束操作，删除本次创建的骨骼并还原被更新的骨骼。
+    record_undo 为 False 时不记录撤销信息（同步传递不需要回滚）。
+    参考数据按范围提取（带有 'scope'）时，范围内的骨骼和约束全部传递，不再按是否属于IK链区分。
+    align 为 True 时创建和更新的骨骼按与目标骨架对齐后的几何放置（见 align.py），per_limb_scale 启用按肢体缩放。
+    """
+
+    def __init__(self, reference_data, target_armature, transfer_ik_bones=True, transfer_missing_bones=False,
+                 normalizer=None, incremental=True, log=None, record_undo=False, align=True, per_limb_scale=False):
+        self.reference_data = reference_data
+        self.target_armature = target_armature
+        self.transfer_ik_bones = transfer_ik_bones
+        self.transfer_missing_bones = transfer_missing_bones
+        self.normalizer = normalizer if normalizer is not None else get_normalizer()
+        self.incremental = incremental
+        self.align = align
+        self.per_limb_scale = per_limb_scale
+        self.alignment = None
+        self.log = log if log is not None else TransferLog()
+        self.journal = [] if record_undo else None
+        self.created_bones = []
+        self.updated_bones = []
+        # 被更新骨骼的原始几何和标记 {骨骼名: (头, 尾, roll, 父骨骼名, 骨骼标记)}
+        self.bone_snapshot = {}
+        self.bone_mapping = {}
+        self.operations = []
+        self.position = 0
+        self.diff = None
+        self.filtered_constraints = {}
+
+    @property
+    def total(self):
+        return len(self.operations)
+
+    @property
+    def finished(self):
+        return self.position >= len(self.operations)
+
+    def prepare(self):
+        """创建缺失骨骼、更新变化的骨骼，并计算需要应用的约束操作"""
+        for _ in self.prepare_steps():
+            pass
+
+    def prepare_steps(self):
+        """分步执行 prepare()：每一步开始前 yield 该步的说明，模态操作符在不同的计时器回调中执行各步"""
+        reference_data = self.reference_data
+        target_armature = self.target_armature
+        transfer_ik_bones = self.transfer_ik_bones
+        transfer_missing_bones = self.transfer_missing_bones
+        log = self.log
+        scoped = reference_data.get('scope') is not None
+
+        # 分离IK链骨骼和其他骨骼
+        bone_arrays = reference_data['bone_arrays']
+        is_ik_bone, selected, in_scope = select_transfer_bones(reference_data, transfer_ik_bones, transfer_missing_bones)
+
+        if log.is_enabled('DEBUG'):
+            log.debug("IK Bone Structure: %s", [bone_arrays.names[i] for i in np.flatnonzero(is_ik_bone)])  # 输出IK骨骼结构
+            log.debug("Other Bone Structure: %s", [bone_arrays.names[i] for i in np.flatnonzero(~is_ik_bone)])  # 输出其他骨骼结构
+
+        # 骨骼映射：名称写法不同但能匹配上的骨骼不会被重复创建
+        yield "Mapping bones"
+        with log.phase('mapping'):
+            mapping_result = get_bone_mapping(reference_data['key'], bone_arrays.names, target_armature, self.normalizer)
+            is_mapped = np.isin(np.asarray(bone_arrays.names, dtype=str), list(mapping_result.mapping))
+
+        # 创建缺失的骨骼：按拓扑顺序一次进入编辑模式全部创建，父骨骼总是先于子骨骼创建
+        yield "Finding bones to create"
+        with log.phase('bone_creation'):
+            indices = reference_data['hierarchy'].topological(np.flatnonzero(selected & ~is_mapped))
+            ik_end_bones = reference_data['ik_end_bones'] if transfer_ik_bones or scoped else None
+            bone_fingerprints = get_bone_fingerprints(reference_data)
+            if self.incremental:
+                update_indices = find_changed_bones(reference_data, target_armature, mapping_result.mapping,
+                                                    np.flatnonzero(in_scope & is_mapped), self.align)
+            else:
+                update_indices = np.zeros(0, dtype=np.int64)
+            self.updated_bones = [mapping_result.mapping[bone_arrays.names[i]] for i in update_indices]
+            if self.journal is not None and self.updated_bones:
+                self.bone_snapshot = self._snapshot_bones(self.updated_bones)
+
+        # 对齐单独计时（与 bone_creation 并列，阶段耗时不重复计入）
+        yield "Aligning bones"
+        placement, target_lengths = self._placement(mapping_result.mapping, ik_end_bones,
+                                                    len(indices) or len(update_indices))
+
+        yield "Creating bones"
+        with log.phase('bone_creation'):
+            self.created_bones = create_missing_bones(
+                target_armature, placement, ik_end_bones, indices, mapping_result.mapping, reference_data['hierarchy'],
+                update_indices, bone_fingerprints, log, target_lengths
+            )
+
+        # 创建骨骼后刷新映射（结果会被缓存，下次对同一目标传递时直接复用）
+        with log.phase('mapping'):
+            if self.created_bones:
+                mapping_result = get_bone_mapping(reference_data['key'], bone_arrays.names, target_armature, self.normalizer)
+        bone_mapping = self.bone_mapping = mapping_result.mapping
+        log_unmatched_bones(log, mapping_result.unmatched)
+        log.debug("Bone Mapping: %s", bone_mapping)  # 输出骨骼映射
+
+        yield "Comparing constraints"
+        with log.phase('constraints'):
+            if self.incremental:
+                # 只比较传递范围内的骨骼，范围外的约束即使带有标记也不会被删除；
+                # 不按范围传递时参考中已删除的骨骼也在范围内，其对应骨骼上带标记的约束会被删除
+                diff = self.diff = diff_constraints(reference_data, target_armature, bone_mapping,
+                                                    [bone_arrays.names[i] for i in np.flatnonzero(in_scope)],
+                                                    orphans=not scoped)
+                self.operations = constraint_operations(diff)
+                log.info("Incremental diff for '%s': %d missing, %d changed, %d stale, %d unchanged",
+                         target_armature.name, len(diff.missing), len(diff.changed), len(diff.stale), diff.unchanged)
+                return
+
+            filtered_constraints = self.filtered_constraints = filter_constraints(
+                reference_data, transfer_ik_bones, transfer_missing_bones)
+
+            log.debug("Filtered Constraints: %s", list(filtered_constraints))  # 输出过滤后的约束
+
+            pose_bones = target_armature.pose.bones
+            for bone_name in filtered_constraints:
+                target_bone_name = bone_mapping.get(bone_name, bone_name)
+                if target_bone_name not in pose_bones:
+                    log.warning("Bone '%s' does not exist in the target armature.", bone_name)
+                    continue
+                records = filtered_constraints[bone_name]
+                fingerprints = get_constraint_fingerprints(reference_data, bone_name)
+                self.operations.extend(('ADD', target_bone_name, record, fingerprint)
+                                       for record, fingerprint in zip(records, fingerprints))
+
+    def _placement(self, bone_mapping, ik_end_bones, needed):
+        """返回创建和更新骨骼时使用的骨骼几何及IK目标骨骼长度；不对齐时为参考骨骼的原始几何"""
+        reference_data = self.reference_data
+        if not self.align or not needed:
+            return reference_data['bone_arrays'], None
+        with self.log.phase('alignment'):
+            hierarchy = reference_data['hierarchy']
+            placement, alignment = self.alignment = align_bone_arrays(
+                reference_data['bone_arrays'], hierarchy, self.target_armature, bone_mapping, self.per_limb_scale)
+            target_lengths = ik_target_lengths(placement, hierarchy, reference_data['constraints'], ik_end_bones or ())
+        self.log.info("Aligned '%s' to the reference from %d matched bones: scale %.4g, residual %.4g",
+                      self.target_armature.name, alignment.matched, alignment.scale, alignment.residual)
+        return placement, target_lengths
+
+    def _snapshot_bones(self, names):
+        arrays = read_bone_arrays(self.target_armature)
+        bones = self.target_armature.data.bones
+        index = {name: i for i, name in enumerate(arrays.names)}
+        snapshot = {}
+        for name in names:
+            i = index[name]
+            parent = arrays.names[arrays.parents[i]] if arrays.parents[i] >= 0 else None
+            snapshot[name] = (tuple(arrays.heads[i]), tuple(arrays.tails[i]), float(arrays.rolls[i]), parent,
+                              bones[name].get(BONE_TAG))
+        return snapshot
+
+    def step(self, count=None):
+        """应用接下来的 count 个约束操作（None 表示全部），全部完成时返回 True"""
+        end = len(self.operations) if count is None else min(len(self.operations), self.position + count)
+        with self.log.phase('constraints'):
+            apply_constraint_operations(self.target_armature, self.operations[self.position:end], self.bone_mapping,
+                                        self.log, self.journal)
+        self.position = end
+        return self.finished
+
+    def has_changes(self):
+        """是否创建、更新了骨骼或修改了约束（只接管已有约束不算修改）"""
+        return bool(self.created_bones or self.updated_bones
+                    or any(operation[0] != 'ADOPT' for operation in self.operations))
+
+    def target_available(self):
+        """目标骨架是否仍然存在（没有被删除，也没有因撤销或打开文件而失效）"""
+        try:
+            return bpy.data.objects.get(self.target_armature.name) == self.target_armature
+        except ReferenceError:
+            return False
+
+    def rollback(self):
+        """撤销已应用的约束操作，删除本次创建的骨骼并还原被更新的骨骼；需要以 record_undo=True 创建"""
+        if self.journal is None:
+            raise RuntimeError("This transfer was not recorded for rollback.")
+        with self.log.phase('rollback'):
+            rollback_constraint_operations(self.target_armature, self.journal)
+            restore_bones(self.target_armature, self.created_bones, self.bone_snapshot, self.log)
+        self.created_bones = []
+        self.updated_bones = []
+        self.bone_snapshot = {}
+        self.position = 0
+
+    def result(self):
+        if self.diff is not None:
+            diff = self.diff
+            return {
+                'created_bones': self.created_bones,
+                'updated_bones': self.updated_bones,
+                'constrained_bones': len({item[0] for item in diff.missing + diff.changed}),
+                'constraints': len(diff.missing) + len(diff.changed),
+                'removed_constraints': len(diff.stale),
+            }
+        return {
+            'created_bones': self.created_bones,
+            'updated_bones': [],
+            'constrained_bones': len(self.filtered_constraints),
+            'constraints': sum(len(c) for c in self.filtered_constraints.values()),
+            'removed_constraints': 0,
+        }
+
+def transfer_to_target(reference_data, target_armature, transfer_ik_bones=True, transfer_missing_bones=False, normalizer=None,
+                       incremental=True, log=None, defer_updates=True, align=True, per_limb_scale=False):
+    """使用已提取的参考数据为目标骨架创建缺失骨骼并添加约束
+
+    incremental 为 True（默认，与面板和命令行一致）时按指纹只传递差异：更新参考中已变化的 BoneCT 骨骼，
+    添加缺失的约束，就地更新变化的约束并删除过期的约束；已是最新的目标骨架不会被修改。
+    为 False 时不比较，参考中的约束全部重新添加。
+    log 为 TransferLog，用于收集消息、阶段耗时和计数器。
+    defer_updates 为 True 时批量添加约束期间暂停本插件的 depsgraph 处理器，结束后只做一次关系更新和求值（见 deferred.py）。
+    align 为 True 时把创建的骨骼对齐到目标骨架的比例和姿势，per_limb_scale 启用按肢体缩放。
+    需要分块执行或回滚时使用 TransferJob。
+    """
+    job = TransferJob(reference_data, target_armature, transfer_ik_bones, transfer_missing_bones, normalizer,
+                      incremental, log, align=align, per_limb_scale=per_limb_scale)
+    job.prepare()
+    with deferred_updates(enabled=defer_updates, log=job.log):
+        job.step()
+        if job.has_changes():
+            mark_updated(target_armature)
+    return job.result()
+
+def compute_transfer_preview(reference_data, target_armature, transfer_ik_bones=True, transfer_missing_bones=False,
+                             normalizer=None, incremental=True, align=True):
+    """不修改目标骨架，计算传递将要做的修改；align 与传递时的设置相同，影响哪些骨骼会被更新
+
+    返回字典：missing_bones 将创建的参考骨骼名，ik_targets 将额外创建的IK目标骨骼名，updated_bones 将更新的骨骼名，
+    constraints_added / constraints_updated / constraints_removed 约束数量，constrained_bones 将添加或更新约束的骨骼名，
+    unmapped_subtargets 约束引用的、在目标骨架中既没有对应骨骼也不会被创建的参考骨骼名。
+    """
+    if normalizer is None:
+        normalizer = get_normalizer()
+    names = reference_data['bone_arrays'].names
+    scoped = reference_data.get('scope') is not None
+    _, selected, in_scope = select_transfer_bones(reference_data, transfer_ik_bones, transfer_missing_bones)
+    mapping = get_bone_mapping(reference_data['key'], names, target_armature, normalizer).mapping
+    is_mapped = np.isin(np.asarray(names, dtype=str), list(mapping))
+
+    missing_bones = [names[i] for i in np.flatnonzero(selected & ~is_mapped)]
+    missing = set(missing_bones)
+    target_bones = target_armature.data.bones
+    ik_end_bones = reference_data['ik_end_bones'] if transfer_ik_bones or scoped else ()
+    ik_targets = [f"{name}_IK_Target" for name in ik_end_bones
+                  if name in missing and f"{name}_IK_Target" not in target_bones]
+
+    # (目标骨骼名, 约束记录)
+    added, updated = [], []
+    removed = 0
+    if incremental:
+        updated_bones = [mapping[names[i]] for i in find_changed_bones(reference_data, target_armature, mapping,
+                                                                       np.flatnonzero(in_scope & is_mapped), align)]
+        scope_names = [names[i] for i in np.flatnonzero(in_scope)]
+        diff = diff_constraints(reference_data, target_armature, mapping, scope_names, orphans=not scoped)
+        added = [(bone_name, record) for bone_name, record, _ in diff.missing]
+        updated = [(bone_name, record) for bone_name, _, record, _ in diff.changed]
+        removed = len(diff.stale)
+        # 尚不存在的骨骼在创建后添加其全部约束
+        source_constraints = reference_data['constraints']
+        for name in scope_names:
+            if name in missing and name in source_constraints:
+                added.extend((name, record) for record in source_constraints[name])
+    else:
+        updated_bones = []
+        filtered_constraints = filter_constraints(reference_data, transfer_ik_bones, transfer_missing_bones)
+        for name in filtered_constraints:
+            if name in mapping or name in missing:
+                added.extend((mapping.get(name, name), record) for record in filtered_constraints[name])
+
+    available = missing.union(mapping)
+    unmapped = {subtarget for _, record in added + updated for subtarget in record_subtargets(record)
+                if subtarget not in available}
+    return {
+        'missing_bones': missing_bones,
+        'ik_targets': ik_targets,
+        'updated_bones': updated_bones,
+        'constraints_added': len(added),
+        'constraints_updated': len(updated),
+        'constraints_removed': removed,
+        'constrained_bones': sorted({bone_name for bone_name, _ in added + updated}),
+        'unmapped_subtargets': sorted(unmapped),
+        'error': None,
+    }
+
+def transfer_constraints_batch(reference, target_armatures, transfer_ik_bones=True, transfer_missing_bones=False, normalizer=None,
+                               incremental=True, log=None, defer_updates=True, align=True, per_limb_scale=False):
+    """只提取一次参考骨架，依次传递到多个目标骨架；单个目标失败不会中断整个批次
+    
+    reference 可以是参考骨架对象，也可以是已提取或从模板加载的参考数据；
+    所有目标共用同一个 log，阶段耗时和计数器为整个批次的合计。
+    defer_updates 为 True 时整个批次期间暂停本插件的 depsgraph 处理器，所有目标完成后只求值一次。
+    """
+    if log is None:
+        log = TransferLog()
+    reference_data = reference if isinstance(reference, dict) else extract_reference_data(reference, log)
+    reference_armature = reference_data['armature']
+    view_layer = bpy.context.view_layer
+    previous_active = view_layer.objects.active
+
+    results = []
+    # 整个批次只在最后统一求值一次
+    with deferred_updates(enabled=defer_updates, log=log):
+        for target_armature in target_armatures:
+            result = {
+                'target': target_armature.name,
+                'status': 'FINISHED',
+                'created_bones': [],
+                'updated_bones': [],
+                'constrained_bones': 0,
+                'constraints': 0,
+                'removed_constraints': 0,
+                'error': None,
+            }
+            try:
+                if target_armature.type != 'ARMATURE':
+                    raise RuntimeError("Target is not an armature.")
+                if reference_armature is not None and target_armature == reference_armature:
+                    raise RuntimeError("Target is the reference armature.")
+                result.update(transfer_to_target(
+                    reference_data,
+                    target_armature,
+                    transfer_ik_bones=transfer_ik_bones,
+                    transfer_missing_bones=transfer_missing_bones,
+                    normalizer=normalizer,
+                    incremental=incremental,
+                    log=log,
+                    align=align,
+                    per_limb_scale=per_limb_scale,
+                ))
+            except Exception as e:
+                result['status'] = 'CANCELLED'
+                result['error'] = str(e)
+                log.error("%s: %s", target_armature.name, e)
+            results.append(result)
+
+    view_layer.objects.active = previous_active
+    return results
+
+def verify_transfer(reference_armature, target_armature, normalizer=None, poses=DEFAULT_POSES, use_keyframes=False,
+                    max_angle=DEFAULT_MAX_ANGLE, seed=0, angle_tolerance=DEFAULT_ANGLE_TOLERANCE,
+                    location_tolerance=DEFAULT_LOCATION_TOLERANCE, log=None):
+    """验证传递后的目标骨架与参考骨架在相同姿态下的行为是否一致，返回验证报告（见 verify.py）
+
+    use_keyframes 为 True 时使用参考骨架动作中的关键帧（最多 poses 个），否则使用 poses 个随机采样的姿态。
+    """
+    if normalizer is None:
+        normalizer = get_normalizer()
+    if log is None:
+        log = TransferLog()
+    with log.phase('verification'):
+        bone_mapping = get_bone_mapping(('ARMATURE', reference_armature.name), reference_armature.data.bones.keys(),
+                                        target_armature, normalizer).mapping
+        frames = None
+        if use_keyframes:
+            frames = action_frames(reference_armature, poses)
+            if not frames:
+                raise RuntimeError("The reference armature has no keyframes.")
+        return verify_pose_equivalence(
+            bpy.context, reference_armature, target_armature, bone_mapping, poses=poses, frames=frames,
+            max_angle=max_angle, seed=seed, angle_tolerance=angle_tolerance,
+            location_tolerance=location_tolerance, log=log,
+        )
+
+def export_reference_template(reference_armature, filepath):
+    """将参考骨架导出为模板文件"""
+    reference_data = extract_reference_data(reference_armature)
+    metadata = {
+        'reference': reference_armature.name,
+        'addon_version': list(bl_info['version']),
+        'blender_version': list(bpy.app.version),
+    }
+    write_template(reference_data, filepath, metadata)
+    return reference_data
+
+def has_reference(scene):
+    """检查面板中是否设置了参考骨架或参考模板"""
+    if scene.Reference_Source == 'TEMPLATE':
+        return bool(scene.Reference_Template_Path)
+    return scene.Reference_Armature is not None
+
+def get_selected_bone_names(armature):
+    """用 foreach_get 读取骨骼的选择状态，返回选中的骨骼名"""
+    bones = armature.data.bones
+    selected = np.zeros(len(bones), dtype=bool)
+    bones.foreach_get('select', selected)
+    names = bones.keys()
+    return [names[i] for i in np.flatnonzero(selected)]
+
+def get_scene_scope(scene):
+    """根据面板设置返回传递范围；传递整个骨架时返回 None
+
+    选中骨骼范围使用参考骨架中选中的骨骼；参考来源为模板时使用目标骨架中选中的骨骼（按名称在模板中查找）。
+    """
+    kind = scene.Transfer_Scope
+    if kind == 'ALL':
+        return None
+    if kind == 'SELECTED':
+        armature = scene.Reference_Armature if scene.Reference_Source == 'ARMATURE' else scene.Armature_to_Add_Constraints
+        if armature is None:
+            raise RuntimeError("No armature to take the selected bones from.")
+        return Scope('SELECTED', get_selected_bone_names(armature), scene.Scope_Include_Children)
+    value = {'IK_CHAIN': scene.Scope_IK_Chain, 'COLLECTION': scene.Scope_Collections, 'PATTERN': scene.Scope_Patterns}[kind]
+    if not value:
+        raise RuntimeError("The transfer scope is empty.")
+    return Scope(kind, value)
+
+def get_reference_data(scene, log=None):
+    """根据面板设置提取参考骨架数据或加载参考模板，并按传递范围只取出范围内的部分"""
+    if log is None:
+        log = TransferLog()
+    scope = get_scene_scope(scene)
+    if scene.Reference_Source == 'TEMPLATE':
+        with log.phase('extraction'):
+            reference_data = load_template(bpy.path.abspath(scene.Reference_Template_Path))
+            return scope_reference_data(reference_data, scope) if scope is not None else reference_data
+    return extract_reference_data(scene.Reference_Armature, log, scope)
+
+def create_scene_log(scene):
+    """按面板中的日志级别创建传递日志"""
+    return TransferLog(scene.Log_Level)
+
+def write_scene_log(scene, log):
+    """按面板设置把日志写入文本数据块和 JSON 文件；写入失败时返回错误信息"""
+    if scene.Log_Text:
+        log.write_text(scene.Log_Text)
+    if scene.Log_File_Path:
+        try:
+            log.write_json(bpy.path.abspath(scene.Log_File_Path))
+        except OSError as e:
+            return f"Could not write log file: {e}"
+    return None
+
+def get_scene_normalizer(scene):
+    """根据面板中设置的对照表和别名表文本获取骨骼名规范化器"""
+    translations = scene.Bone_Translation_Text.as_string() if scene.Bone_Translation_Text else ''
+    aliases = scene.Bone_Alias_Text.as_string() if scene.Bone_Alias_Text else ''
+    return get_normalizer(translations, aliases)
+
+def get_reference_key(scene):
+    """获取面板中参考骨架或参考模板的缓存键，不读取模板文件"""
+    if scene.Reference_Source == 'TEMPLATE':
+        content_hash = get_loaded_template_hash(bpy.path.abspath(scene.Reference_Template_Path))
+        return ('TEMPLATE', content_hash) if content_hash else None
+    return ('ARMATURE', scene.Reference_Armature.name) if scene.Reference_Armature else None
+
+def get_preview_key(scene):
+    """获取传递预览的缓存键；参考模板尚未成功加载（如无法读取）时使用模板路径和修改时间，使加载错误也能被缓存"""
+    reference_key = get_reference_key(scene)
+    if reference_key is None and scene.Reference_Source == 'TEMPLATE':
+        filepath = bpy.path.abspath(scene.Reference_Template_Path)
+        try:
+            modified = os.path.getmtime(filepath)
+        except OSError:
+            modified = None
+        reference_key = ('TEMPLATE_PATH', filepath, modified)
+    return reference_key
+
+def get_preview_settings(scene):
+    """影响预览结果的面板设置"""
+    return (
+        scene.Transfer_IK_Bones,
+        scene.Transfer_Missing_Bones,
+        scene.Incremental_Transfer,
+        scene.Align_Created_Bones,
+        scene.Transfer_Scope,
+        scene.Scope_Include_Children,
+        scene.Scope_IK_Chain,
+        scene.Scope_Collections,
+        scene.Scope_Patterns,
+        scene.Bone_Translation_Text.name if scene.Bone_Translation_Text else '',
+        scene.Bone_Alias_Text.name if scene.Bone_Alias_Text else '',
+    )
+
+# 预览失效后延迟计算；每次新的结构变化都会重新开始计时，连续修改骨架时只在停止修改后计算一次
+PREVIEW_DELAY = 0.3
+
+def update_scene_preview():
+    """计算面板中的传递预览并存入缓存；作为一次性计时器回调运行，不在 draw() 中计算"""
+    context = bpy.context
+    scene = context.scene
+    target_armature = scene.Armature_to_Add_Constraints
+    if not has_reference(scene) or target_armature is None or modal_transfer_progress:
+        return None
+    try:
+        preview = compute_transfer_preview(
+            get_reference_data(scene, TransferLog('ERROR', echo=False)),
+            target_armature,
+            transfer_ik_bones=scene.Transfer_IK_Bones,
+            transfer_missing_bones=scene.Transfer_Missing_Bones,
+            normalizer=get_scene_normalizer(scene),
+            incremental=scene.Incremental_Transfer,
+            align=scene.Align_Created_Bones,
+        )
+    except Exception as e:
+        preview = {'error': str(e)}
+    reference_armature = scene.Reference_Armature if scene.Reference_Source == 'ARMATURE' else None
+    # 参考模板在计算时才加载，因此在计算后获取缓存键
+    store_preview(get_preview_key(scene), target_armature, get_preview_settings(scene), preview,
+                  watched_armatures(reference_armature, target_armature))
+    tag_view3d_redraw(context)
+    return None
+
+def request_scene_preview():
+    """安排计算传递预览（供 draw() 在缓存未命中时调用）；已经安排时不重新计时，频繁重绘不会推迟计算"""
+    if not bpy.app.timers.is_registered(update_scene_preview):
+        bpy.app.timers.register(update_scene_preview, first_interval=PREVIEW_DELAY)
+
+def reschedule_scene_preview():
+    """预览因骨架结构变化失效时重新开始计时（去抖动），面板中未显示预览时不计算"""
+    if bpy.app.timers.is_registered(update_scene_preview):
+        bpy.app.timers.unregister(update_scene_preview)
+    if bpy.context.scene.Show_Transfer_Preview:
+        bpy.app.timers.register(update_scene_preview, first_interval=PREVIEW_DELAY)
+
+def get_batch_target_armatures(context):
+    """获取批量传递的目标骨架：优先使用选中的骨架，否则使用面板中指定的目标骨架"""
+    reference_armature = context.scene.Reference_Armature
+    targets = [obj for obj in context.selected_objects if obj.type == 'ARMATURE' and obj != reference_armature]
+    if not targets and context.scene.Armature_to_Add_Constraints:
+        targets = [context.scene.Armature_to_Add_Constraints]
+    return targets
+
 class OBJECT_OT_TransferConstraintsOperator(bpy.types.Operator):
     bl_idname = "object.transfer_constraints"
     bl_label = "Transfer Constraints"
 
     @classmethod
     def poll(cls, context):
-        return context.scene.Reference_Armature and context.scene.Armature_to_Add_Constraints
+        return has_reference(context.scene) and context.scene.Armature_to_Add_Constraints
 
     def execute(self, context):
-        reference_armature = context.scene.Reference_Armature
         target_armature = context.scene.Armature_to_Add_Constraints
         
-        if not reference_armature or not target_armature:
+        if not has_reference(context.scene) or not target_armature:
             self.report({'ERROR'}, "Please select both Reference and Target Armatures in the BoneCT panel before transferring constraints.")
             return {'CANCELLED'}
         
+        log = create_scene_log(context.scene)
         try:
-            # 获取源骨架的骨结构
+            # 提取参考骨架数据或加载参考模板
             try:
-                source_bone_structure = get_source_bone_structure(reference_armature)
-                print(f"Source Bone Structure: {list(source_bone_structure.keys())}")  # 输出源骨架的骨骼结构
+                reference_data = get_reference_data(context.scene, log)
             except Exception as e:
-                self.report({'ERROR'}, f"Failed to get source bone structure: {str(e)}")
+                self.report({'ERROR'}, str(e))
                 return {'CANCELLED'}
 
-            # 查找IK链末端骨骼
-            try:
-                ik_end_bones = find_ik_chain_end_bones(reference_armature)
-            except Exception as e:
-                self.report({'ERROR'}, f"Failed to find IK chain end bones: {str(e)}")
-                return {'CANCELLED'}
+            # 应用到目标骨架
+            transfer_to_target(
+                reference_data,
+                target_armature,
+                transfer_ik_bones=context.scene.Transfer_IK_Bones,
+                transfer_missing_bones=context.scene.Transfer_Missing_Bones,
+                normalizer=get_scene_normalizer(context.scene),
+                incremental=context.scene.Incremental_Transfer,
+                log=log,
+                align=context.scene.Align_Created_Bones,
+                per_limb_scale=context.scene.Align_Per_Limb_Scale,
+            )
+            warnings = log.messages('WARNING')
+            if warnings:
+                self.report({'WARNING'}, f"Constraints transferred with {len(warnings)} warnings: {log.summary()}")
+            else:
+                self.report({'INFO'}, f"Constraints transferred: {log.summary()}")
+        except Exception as e:
+            self.report({'ERROR'}, f"An unexpected error occurred: {str(e)}")
+            return {'CANCELLED'}
+        finally:
+            error = write_scene_log(context.scene, log)
+            if error:
+                self.report({'WARNING'}, error)
+
+        return {'FINISHED'}
+
+# 正在运行的模态传递的进度 {'target': 目标骨架名, 'stage': 正在进行的准备步骤（准备完成后为 None），
+# 'done': 已应用的操作数, 'total': 操作总数}，供面板显示
+modal_transfer_progress = {}
+
+def tag_view3d_redraw(context):
+    """重绘所有窗口中的 3D 视图，使面板中的进度和预览及时更新（在计时器中同样可用）"""
+    for window in context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
 
-            # 获取IK链中的所有骨骼
+class OBJECT_OT_ModalTransferConstraintsOperator(bpy.types.Operator):
+    """在计时器中分步准备传递（提取参考、映射、对齐、创建骨骼、比较约束）并分块应用约束，显示进度，按 Esc 取消并回滚已应用的部分
+
+    运行期间只放行视图导航事件，撤销和其他编辑操作被拦截，避免传递任务引用已失效的数据。
+    """
+    bl_idname = "object.transfer_constraints_modal"
+    bl_label = "Transfer Constraints (Interactive)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    frame_budget: bpy.props.FloatProperty(
+        name="Frame Budget (ms)",
+        description="Time each timer tick may spend applying constraints; the chunk size adapts to stay within it",
+        default=20.0,
+        min=1.0,
+        max=1000.0
+    )
+
+    # 第一块的操作数量；之后按实际耗时调整，每次最多翻倍或减为四分之一
+    INITIAL_CHUNK = 32
+    MAX_CHUNK = 10000
+    TIMER_STEP = 0.01
+    # 运行期间放行的事件（视图导航），其他事件（撤销、编辑操作等）都被拦截
+    PASS_THROUGH_EVENTS = {
+        'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE',
+        'TRACKPADPAN', 'TRACKPADZOOM', 'MOUSEROTATE', 'MOUSESMARTZOOM', 'NDOF_MOTION',
+    }
+
+    @classmethod
+    def poll(cls, context):
+        return (has_reference(context.scene) and context.scene.Armature_to_Add_Constraints is not None
+                and not modal_transfer_progress)
+
+    def create_job(self, context):
+        """提取参考数据并创建可回滚的传递任务，在一次编辑模式中创建缺失骨骼"""
+        self.log = create_scene_log(context.scene)
+        for _ in self.prepare_steps(context):
+            pass
+
+    def prepare_steps(self, context):
+        """分步提取参考数据、创建并准备传递任务，每一步开始前 yield 该步的说明；使用已创建的 self.log"""
+        scene = context.scene
+        self.job = None
+        yield "Reading the reference"
+        reference_data = get_reference_data(scene, self.log)
+        self.job = TransferJob(
+            reference_data,
+            scene.Armature_to_Add_Constraints,
+            transfer_ik_bones=scene.Transfer_IK_Bones,
+            transfer_missing_bones=scene.Transfer_Missing_Bones,
+            normalizer=get_scene_normalizer(scene),
+            incremental=scene.Incremental_Transfer,
+            log=self.log,
+            record_undo=True,
+            align=scene.Align_Created_Bones,
+            per_limb_scale=scene.Align_Per_Limb_Scale,
+        )
+        yield from self.job.prepare_steps()
+
+    def execute(self, context):
+        # 脚本中调用（EXEC_DEFAULT）时一次执行全部步骤
+        try:
+            self.create_job(context)
+            with deferred_updates(log=self.log):
+                self.job.step()
+                if self.job.has_changes():
+                    mark_updated(self.job.target_armature)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            if hasattr(self, 'log'):
+                self.report_log_error(context)
+        self.report({'INFO'}, f"Constraints transferred: {self.log.summary()}")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        # 准备工作同样在计时器回调中分步进行，每次回调执行一步，期间面板显示当前步骤
+        self.log = create_scene_log(context.scene)
+        self.stages = self.prepare_steps(context)
+        self.job = None
+        self.progress_started = False
+        self.chunk = self.INITIAL_CHUNK
+        self.target_name = context.scene.Armature_to_Add_Constraints.name
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(self.TIMER_STEP, window=context.window)
+        wm.modal_handler_add(self)
+        modal_transfer_progress.update(target=self.target_name, stage="Starting", done=0, total=0)
+        tag_view3d_redraw(context)
+        return {'RUNNING_MODAL'}
+
+    def prepare_step(self, context):
+        """执行准备工作的下一步，全部完成时开始显示约束操作的进度"""
+        try:
+            modal_transfer_progress['stage'] = next(self.stages)
+        except StopIteration:
+            self.stages = None
+            total = self.job.total
+            context.window_manager.progress_begin(0, max(total, 1))
+            self.progress_started = True
+            modal_transfer_progress.update(stage=None, total=total)
+        tag_view3d_redraw(context)
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            return self.cancel_transfer(context)
+        if event.type in self.PASS_THROUGH_EVENTS:
+            return {'PASS_THROUGH'}
+        if event.type != 'TIMER':
+            return {'RUNNING_MODAL'}
+
+        job = self.job
+        if job is not None and not job.target_available():
+            return self.cancel_transfer(context)
+        if self.stages is not None:
             try:
-                ik_chain_bones = get_ik_chain_bones_recursive(reference_armature)
+                self.prepare_step(context)
             except Exception as e:
-                self.report({'ERROR'}, f"Failed to get IK chain bones: {str(e)}")
-                return {'CANCELLED'}
+                self.report({'ERROR'}, str(e))
+                return self.cancel_transfer(context)
+            return {'RUNNING_MODAL'}
+
+        start = time.perf_counter()
+        try:
+            finished = job.step(self.chunk)
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return self.cancel_transfer(context)
+        elapsed = time.perf_counter() - start
+
+        # 按上一块的耗时调整块大小，使每次计时器回调都不超过帧预算
+        if elapsed > 0.0:
+            ratio = min(2.0, max(0.25, self.frame_budget / 1000.0 / elapsed))
+            self.chunk = max(1, min(self.MAX_CHUNK, int(self.chunk * ratio)))
+        context.window_manager.progress_update(job.position)
+        modal_transfer_progress['done'] = job.position
+        tag_view3d_redraw(context)
+        if not finished:
+            return {'RUNNING_MODAL'}
+
+        self.finish(context)
+        warnings = self.log.messages('WARNING')
+        if warnings:
+            self.report({'WARNING'}, f"Constraints transferred with {len(warnings)} warnings: {self.log.summary()}")
+        else:
+            self.report({'INFO'}, f"Constraints transferred: {self.log.summary()}")
+        return {'FINISHED'}
+
+    def cancel_transfer(self, context):
+        """回滚已应用的约束操作和本次创建的骨骼后结束"""
+        self.rollback_job()
+        self.finish(context)
+        return {'CANCELLED'}
+
+    def cancel(self, context):
+        # Blender 在窗口关闭等情况下中止模态操作符时调用，同样回滚，不留下只应用了一部分的传递
+        self.rollback_job()
+        self.finish(context)
+
+    def rollback_job(self):
+        """回滚传递；目标骨架已不存在时无法回滚，记录传递只完成了一部分"""
+        job = self.job
+        if job is None:
+            return
+        applied, created = job.position, len(job.created_bones)
+        if not job.target_available():
+            message = (f"Transfer to '{self.target_name}' stopped after {applied} of {job.total} constraint changes "
+                       f"because the target armature no longer exists; nothing was rolled back.")
+            self.log.error(message)
+            self.report({'ERROR'}, message)
+            return
+        try:
+            job.rollback()
+            self.report({'WARNING'}, f"Transfer cancelled; rolled back {applied} constraint changes and "
+                                     f"removed {created} created bones.")
+        except Exception as e:
+            self.log.error("Rollback of the transfer to '%s' failed after %d of %d constraint changes: %s",
+                           self.target_name, applied, job.total, e)
+            self.report({'ERROR'}, f"Transfer cancelled, but the rollback failed: {e}")
+
+    def finish(self, context):
+        wm = context.window_manager
+        if getattr(self, 'stages', None) is not None:
+            self.stages.close()
+            self.stages = None
+        if getattr(self, 'timer', None) is not None:
+            wm.event_timer_remove(self.timer)
+            self.timer = None
+        if getattr(self, 'progress_started', False):
+            self.progress_started = False
+            wm.progress_end()
+        modal_transfer_progress.clear()
+        tag_view3d_redraw(context)
+        self.report_log_error(context)
+
+    def report_log_error(self, context):
+        error = write_scene_log(context.scene, self.log)
+        if error:
+            self.report({'WARNING'}, error)
 
-            # 分离IK链骨骼和其他骨骼
-            ik_bone_structure = {bone_name: bone_data for bone_name, bone_data in source_bone_structure.items() if bone_name in ik_chain_bones}
-            other_bone_structure = {bone_name: bone_data for bone_name, bone_data in source_bone_structure.items() if bone_name not in ik_chain_bones}
+class OBJECT_OT_BatchTransferConstraintsOperator(bpy.types.Operator):
+    """将参考骨架的骨骼和约束一次性传递到所有选中的骨架"""
+    bl_idname = "object.batch_transfer_constraints"
+    bl_label = "Batch Transfer Constraints"
+    bl_options = {'REGISTER', 'UNDO'}
 
-            print(f"IK Bone Structure: {list(ik_bone_structure.keys())}")  # 输出IK骨骼结构
-            print(f"Other Bone Structure: {list(other_bone_structure.keys())}")  # 输出其他骨骼结构
+    @classmethod
+    def poll(cls, context):
+        return has_reference(context.scene)
 
-            # 创建缺失的骨骼
-            created_bones = []
-            if context.scene.Transfer_IK_Bones:
-                created_bones.extend(create_missing_bones(target_armature, ik_bone_structure, ik_end_bones))
+    def execute(self, context):
+        target_armatures = get_batch_target_armatures(context)
 
-            if context.scene.Transfer_Missing_Bones:
-                created_bones.extend(create_missing_bones(target_armature, other_bone_structure))
+        if not target_armatures:
+            self.report({'ERROR'}, "Please select at least one target armature (other than the reference) for batch transfer.")
+            return {'CANCELLED'}
 
-            # 创建骨骼映射
-            bone_mapping = create_bone_mapping(reference_armature, target_armature, created_bones)
+        log = create_scene_log(context.scene)
+        try:
+            results = transfer_constraints_batch(
+                get_reference_data(context.scene, log),
+                target_armatures,
+                transfer_ik_bones=context.scene.Transfer_IK_Bones,
+                transfer_missing_bones=context.scene.Transfer_Missing_Bones,
+                normalizer=get_scene_normalizer(context.scene),
+                incremental=context.scene.Incremental_Transfer,
+                log=log,
+                align=context.scene.Align_Created_Bones,
+                per_limb_scale=context.scene.Align_Per_Limb_Scale,
+            )
+        except Exception as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finally:
+            error = write_scene_log(context.scene, log)
+            if error:
+                self.report({'WARNING'}, error)
 
-            # 获取所有约束信息
-            source_constraints = get_all_constraints(reference_armature)
+        failed = [r for r in results if r['status'] != 'FINISHED']
+        for r in failed:
+            self.report({'WARNING'}, f"{r['target']}: {r['error']}")
+        self.report(
+            {'WARNING'} if failed else {'INFO'},
+            f"Batch transfer finished: {len(results) - len(failed)} succeeded, {len(failed)} failed; {log.summary()}"
+        )
+        return {'FINISHED'} if len(failed) < len(results) else {'CANCELLED'}
 
-            # 过滤IK链中的约束
-            filtered_constraints = {}
-            for bone_name, constraints in source_constraints.items():
-                if context.scene.Transfer_IK_Bones and bone_name in ik_chain_bones:
-                    filtered_constraints[bone_name] = constraints
-                elif context.scene.Transfer_Missing_Bones and bone_name not in ik_chain_bones:
-                    filtered_constraints[bone_name] = constraints
+# 最近一次验证的报告 {目标骨架名: 报告}，供面板显示
+verification_reports = {}
 
-            print(f"Filtered Constraints: {filtered_constraints.keys()}")  # 输出过滤后的约束
+class OBJECT_OT_VerifyTransferOperator(bpy.types.Operator):
+    """让参考骨架和目标骨架摆出相同的姿态，报告行为不一致的骨骼和约束"""
+    bl_idname = "object.verify_transfer"
+    bl_label = "Verify Pose Equivalence"
+
+    @classmethod
+    def poll(cls, context):
+        scene = context.scene
+        return (scene.Reference_Source == 'ARMATURE' and scene.Reference_Armature is not None
+                and scene.Armature_to_Add_Constraints is not None and context.mode != 'EDIT_ARMATURE')
 
-            # 应用约束到目标骨架
-            apply_constraints(target_armature, filtered_constraints, bone_mapping)
-            self.report({'INFO'}, "Constraints transferred successfully.")
+    def execute(self, context):
+        scene = context.scene
+        target_armature = scene.Armature_to_Add_Constraints
+        log = create_scene_log(scene)
+        try:
+            report = verify_transfer(
+                scene.Reference_Armature,
+                target_armature,
+                normalizer=get_scene_normalizer(scene),
+                poses=scene.Verify_Poses,
+                use_keyframes=scene.Verify_Use_Keyframes,
+                angle_tolerance=scene.Verify_Angle_Tolerance,
+                location_tolerance=scene.Verify_Location_Tolerance,
+                log=log,
+            )
         except Exception as e:
-            self.report({'ERROR'}, f"An unexpected error occurred: {str(e)}")
+            self.report({'ERROR'}, f"Verification failed: {e}")
             return {'CANCELLED'}
+        finally:
+            error = write_scene_log(scene, log)
+            if error:
+                self.report({'WARNING'}, error)
+
+        verification_reports[target_armature.name] = report
+        summary = (f"{report['poses']} poses, {report['mapped_bones']} bones; "
+                   f"max deviation {report['max_angle']:.3g} deg, {report['max_location']:.3g}")
+        if report['bones']:
+            sources = sum(1 for entry in report['bones'] if entry['source'])
+            self.report({'WARNING'}, f"{len(report['bones'])} bones deviate from the reference "
+                                     f"({sources} at their own constraints or pose): {summary}")
+        else:
+            self.report({'INFO'}, f"Target behaves like the reference: {summary}")
+        return {'FINISHED'}
+
+class OBJECT_OT_RefreshBoneMappingOperator(bpy.types.Operator):
+    """计算参考骨架与目标骨架之间的骨骼名称映射，供在面板中检查"""
+    bl_idname = "object.refresh_bone_mapping"
+    bl_label = "Refresh Bone Mapping"
+
+    @classmethod
+    def poll(cls, context):
+        return has_reference(context.scene) and context.scene.Armature_to_Add_Constraints
+
+    def execute(self, context):
+        scene = context.scene
+        try:
+            if scene.Reference_Source == 'TEMPLATE':
+                reference_data = load_template(bpy.path.abspath(scene.Reference_Template_Path))
+                reference_key, source_names = reference_data['key'], reference_data['bone_arrays'].names
+            else:
+                reference_key, source_names = get_reference_key(scene), scene.Reference_Armature.data.bones.keys()
+            result = get_bone_mapping(reference_key, source_names, scene.Armature_to_Add_Constraints, get_scene_normalizer(scene))
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to compute bone mapping: {e}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Mapped {len(result.mapping)} bones, {len(result.unmatched)} unmatched.")
+        return {'FINISHED'}
+
+class OBJECT_OT_RefreshTransferPreviewOperator(bpy.types.Operator):
+    """立即重新计算面板中的传递预览"""
+    bl_idname = "object.refresh_transfer_preview"
+    bl_label = "Refresh Transfer Preview"
+
+    @classmethod
+    def poll(cls, context):
+        return has_reference(context.scene) and context.scene.Armature_to_Add_Constraints is not None
+
+    def execute(self, context):
+        update_scene_preview()
+        return {'FINISHED'}
+
+class OBJECT_OT_ExportReferenceTemplateOperator(bpy.types.Operator, ExportHelper):
+    """将参考骨架的骨骼结构、IK链和约束导出为模板文件"""
+    bl_idname = "object.export_reference_template"
+    bl_label = "Export Reference Template"
 
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.Reference_Armature is not None
+
+    def execute(self, context):
+        try:
+            export_reference_template(context.scene.Reference_Armature, self.filepath)
+        except Exception as e:
+            self.report({'ERROR'}, f"Failed to export reference template: {e}")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Reference template exported to {self.filepath}")
         return {'FINISHED'}
 
 class BoneCTPreferences(bpy.types.AddonPreferences):
@@ -378,22 +1359,208 @@ class VIEW3D_PT_TransferConstraintsPanel(bpy.types.Panel):
         layout = self.layout
         
         col = layout.column()
-        col.prop(context.scene, "Reference_Armature", text="Reference Armature")
+        col.row().prop(context.scene, "Reference_Source", expand=True)
+        if context.scene.Reference_Source == 'TEMPLATE':
+            col.prop(context.scene, "Reference_Template_Path", text="Reference Template")
+        else:
+            col.prop(context.scene, "Reference_Armature", text="Reference Armature")
+            if context.scene.Reference_Armature:
+                col.operator("object.export_reference_template", text="Export Reference Template", icon='EXPORT')
         col.prop(context.scene, "Armature_to_Add_Constraints", text="Armature to Add Constraints")
         
         col.separator()
         
-        col.prop(context.scene, "Transfer_IK_Bones", text="Transfer IK Bones and Constraints")
-        col.prop(context.scene, "Transfer_Missing_Bones", text="Transfer Other Missing Bones and Constraints")
+        self.draw_scope(context, col)
+        
+        flags = col.column()
+        # 范围传递时范围内的骨骼和约束全部传递
+        flags.enabled = context.scene.Transfer_Scope == 'ALL'
+        flags.prop(context.scene, "Transfer_IK_Bones", text="Transfer IK Bones and Constraints")
+        flags.prop(context.scene, "Transfer_Missing_Bones", text="Transfer Other Missing Bones and Constraints")
+        col.prop(context.scene, "Incremental_Transfer", text="Incremental (Only Apply Changes)")
+        col.prop(context.scene, "Align_Created_Bones", text="Fit Created Bones to Target Proportions")
+        limb_row = col.row()
+        limb_row.enabled = context.scene.Align_Created_Bones
+        limb_row.prop(context.scene, "Align_Per_Limb_Scale", text="Scale Per Limb")
         
         # 检查是否选择了目标骨骼
-        reference_armature = context.scene.Reference_Armature
+        reference_available = has_reference(context.scene)
         target_armature = context.scene.Armature_to_Add_Constraints
         
-        if reference_armature and target_armature:
+        if modal_transfer_progress:
+            self.draw_modal_progress(col)
+        elif reference_available and target_armature:
             col.operator("object.transfer_constraints", text="Transfer Constraints")
+            col.operator("object.transfer_constraints_modal", text="Transfer Interactively (Esc to Cancel)")
         else:
             col.operator("object.transfer_constraints", text="Transfer Constraints", icon='LOCKED').enabled = False
+        
+        if reference_available:
+            col.operator("object.batch_transfer_constraints", text="Batch Transfer to Selected Armatures")
+        
+        self.draw_preview(context, layout)
+        self.draw_verification(context, layout)
+        self.draw_bone_mapping(context, layout)
+        self.draw_log_settings(context, layout)
+
+    MAX_LISTED_BONES = 100
+
+    def draw_scope(self, context, layout):
+        """绘制传递范围设置"""
+        scene = context.scene
+        layout.prop(scene, "Transfer_Scope", text="Scope")
+        if scene.Transfer_Scope == 'SELECTED':
+            layout.prop(scene, "Scope_Include_Children", text="Include Children")
+        elif scene.Transfer_Scope == 'IK_CHAIN':
+            if scene.Reference_Source == 'ARMATURE' and scene.Reference_Armature:
+                layout.prop_search(scene, "Scope_IK_Chain", scene.Reference_Armature.pose, "bones", text="IK End Bone")
+            else:
+                layout.prop(scene, "Scope_IK_Chain", text="IK End Bone")
+        elif scene.Transfer_Scope == 'COLLECTION':
+            layout.prop(scene, "Scope_Collections", text="Collections")
+        elif scene.Transfer_Scope == 'PATTERN':
+            layout.prop(scene, "Scope_Patterns", text="Patterns")
+
+    def draw_modal_progress(self, layout):
+        """绘制正在运行的模态传递的进度"""
+        progress = modal_transfer_progress
+        box = layout.box()
+        if progress['stage']:
+            box.label(text=f"Preparing transfer to {progress['target']}: {progress['stage']}...", icon='TIME')
+            box.label(text="Press Esc to cancel and roll back.")
+            return
+        total = progress['total']
+        percent = 100.0 * progress['done'] / total if total else 100.0
+        box.label(text=f"Transferring to {progress['target']}: {progress['done']}/{total} ({percent:.0f}%)", icon='TIME')
+        box.label(text="Press Esc to cancel and roll back.")
+
+    def draw_preview(self, context, layout):
+        """绘制传递预览；只读取缓存的预览，缓存未命中时安排在计时器中计算"""
+        scene = context.scene
+        box = layout.box()
+        row = box.row()
+        row.prop(scene, "Show_Transfer_Preview", text="Preview",
+                 icon='TRIA_DOWN' if scene.Show_Transfer_Preview else 'TRIA_RIGHT', emboss=False)
+        row.operator("object.refresh_transfer_preview", text="", icon='FILE_REFRESH')
+        target_armature = scene.Armature_to_Add_Constraints
+        if not scene.Show_Transfer_Preview or not has_reference(scene) or target_armature is None:
+            return
+        
+        preview = get_cached_preview(get_preview_key(scene), target_armature, get_preview_settings(scene))
+        if preview is None:
+            if not modal_transfer_progress:
+                request_scene_preview()
+            box.label(text="Computing preview...", icon='TIME')
+            return
+        if preview['error']:
+            box.label(text=preview['error'], icon='ERROR')
+            return
+        
+        self.draw_name_list(box, scene, "Show_Preview_Missing_Bones",
+                            f"Bones to create: {len(preview['missing_bones']) + len(preview['ik_targets'])}",
+                            preview['missing_bones'] + preview['ik_targets'], 'BONE_DATA')
+        if preview['updated_bones']:
+            box.label(text=f"Bones to update: {len(preview['updated_bones'])}")
+        self.draw_name_list(box, scene, "Show_Preview_Constrained_Bones",
+                            f"Constraints to add: {preview['constraints_added']}, update: {preview['constraints_updated']}, "
+                            f"remove: {preview['constraints_removed']}",
+                            preview['constrained_bones'], 'CONSTRAINT_BONE')
+        self.draw_name_list(box, scene, "Show_Preview_Unmapped",
+                            f"Unmapped subtargets: {len(preview['unmapped_subtargets'])}",
+                            preview['unmapped_subtargets'], 'UNLINKED')
+
+    def draw_verification(self, context, layout):
+        """绘制姿态等价验证的设置和最近一次验证的结果"""
+        scene = context.scene
+        box = layout.box()
+        box.prop(scene, "Show_Verification", text="Verification",
+                 icon='TRIA_DOWN' if scene.Show_Verification else 'TRIA_RIGHT', emboss=False)
+        if not scene.Show_Verification:
+            return
+        col = box.column()
+        col.prop(scene, "Verify_Use_Keyframes", text="Use Reference Keyframes")
+        col.prop(scene, "Verify_Poses", text="Keyframes" if scene.Verify_Use_Keyframes else "Poses")
+        row = col.row(align=True)
+        row.prop(scene, "Verify_Angle_Tolerance", text="Angle")
+        row.prop(scene, "Verify_Location_Tolerance", text="Location")
+        col.operator("object.verify_transfer", text="Verify Pose Equivalence", icon='CHECKMARK')
+
+        target_armature = scene.Armature_to_Add_Constraints
+        report = verification_reports.get(target_armature.name) if target_armature else None
+        if report is None:
+            return
+        if not report['bones']:
+            col.label(text=f"Passed: {report['poses']} poses, max {report['max_angle']:.3g} deg", icon='CHECKMARK')
+            return
+        lines = [f"{entry['bone']}: {entry['angle']:.3g} deg, {entry['location']:.3g}" for entry in report['bones']]
+        self.draw_name_list(col, scene, "Show_Verification_Bones", f"Deviating bones: {len(report['bones'])}",
+                            lines, 'ERROR')
+        constraints = [f"{entry['bone']}: {entry['constraint'] or entry['target_constraint']} ({entry['type']})"
+                       + ("" if entry['present'] else " missing") for entry in report['constraints']]
+        if constraints:
+            self.draw_name_list(col, scene, "Show_Verification_Constraints", f"Suspect constraints: {len(constraints)}",
+                                constraints, 'CONSTRAINT_BONE')
+
+    def draw_name_list(self, layout, scene, show_property, text, names, icon):
+        """绘制可展开的名称列表，最多列出 MAX_LISTED_BONES 个"""
+        show = getattr(scene, show_property)
+        layout.prop(scene, show_property, text=text, icon='DISCLOSURE_TRI_DOWN' if show else 'DISCLOSURE_TRI_RIGHT',
+                    emboss=False)
+        if not show or not names:
+            return
+        col = layout.column(align=True)
+        for name in names[:self.MAX_LISTED_BONES]:
+            col.label(text=name, icon=icon)
+        if len(names) > self.MAX_LISTED_BONES:
+            col.label(text=f"... and {len(names) - self.MAX_LISTED_BONES} more")
+
+    def draw_bone_mapping(self, context, layout):
+        """绘制骨骼映射检查区域；只读取缓存的映射结果，不在绘制时计算"""
+        scene = context.scene
+        box = layout.box()
+        row = box.row()
+        row.prop(scene, "Show_Bone_Mapping", text="Bone Mapping",
+                 icon='TRIA_DOWN' if scene.Show_Bone_Mapping else 'TRIA_RIGHT', emboss=False)
+        row.operator("object.refresh_bone_mapping", text="", icon='FILE_REFRESH')
+        if not scene.Show_Bone_Mapping:
+            return
+        
+        box.prop(scene, "Bone_Translation_Text", text="Translations")
+        box.prop(scene, "Bone_Alias_Text", text="Aliases")
+        
+        reference_key = get_reference_key(scene)
+        target_armature = scene.Armature_to_Add_Constraints
+        result = get_cached_bone_mapping(reference_key, target_armature) if reference_key and target_armature else None
+        if result is None:
+            box.label(text="Press refresh to compute the bone mapping.", icon='INFO')
+            return
+        
+        methods = list(result.matched_by.values())
+        box.label(text=f"Mapped: {len(result.mapping)} (exact {methods.count('EXACT')}, "
+                       f"normalized {methods.count('NORMALIZED')}, alias {methods.count('ALIAS')})")
+        box.label(text=f"Unmatched: {len(result.unmatched)}")
+        
+        renamed = [(source, target) for source, target in result.mapping.items() if result.matched_by[source] != 'EXACT']
+        col = box.column(align=True)
+        for source, target in renamed[:self.MAX_LISTED_BONES]:
+            col.label(text=f"{source} → {target}", icon='LINKED')
+        for source in result.unmatched[:self.MAX_LISTED_BONES]:
+            col.label(text=source, icon='UNLINKED')
+        hidden = max(0, len(renamed) - self.MAX_LISTED_BONES) + max(0, len(result.unmatched) - self.MAX_LISTED_BONES)
+        if hidden:
+            col.label(text=f"... and {hidden} more")
+
+    def draw_log_settings(self, context, layout):
+        """绘制日志设置区域"""
+        scene = context.scene
+        box = layout.box()
+        box.prop(scene, "Show_Log_Settings", text="Log",
+                 icon='TRIA_DOWN' if scene.Show_Log_Settings else 'TRIA_RIGHT', emboss=False)
+        if not scene.Show_Log_Settings:
+            return
+        box.prop(scene, "Log_Level", text="Level")
+        box.prop(scene, "Log_Text", text="Text")
+        box.prop(scene, "Log_File_Path", text="JSON File")
 
 def register_enum_properties():
     bpy.types.Scene.Reference_Armature = bpy.props.PointerProperty(
@@ -402,12 +1569,41 @@ def register_enum_properties():
         name="Reference Armature",
         description="The armature used as a reference for bone structure and constraints"
     )
+    bpy.types.Scene.Reference_Source = bpy.props.EnumProperty(
+        name="Reference Source",
+        description="Where the reference bone structure and constraints come from",
+        items=[
+            ('ARMATURE', "Armature", "Use a reference armature in this file"),
+            ('TEMPLATE', "Template", "Use an exported reference template file"),
+        ],
+        default='ARMATURE'
+    )
+    bpy.types.Scene.Reference_Template_Path = bpy.props.StringProperty(
+        name="Reference Template",
+        description="Reference template file exported by BoneCT",
+        subtype='FILE_PATH'
+    )
     bpy.types.Scene.Armature_to_Add_Constraints = bpy.props.PointerProperty(
         type=bpy.types.Object,
         poll=lambda self, obj: obj.type == 'ARMATURE',
         name="Armature to Add Constraints",
         description="The armature where constraints will be added"
     )
+    bpy.types.Scene.Bone_Translation_Text = bpy.props.PointerProperty(
+        type=bpy.types.Text,
+        name="Bone Name Translations",
+        description="Text with extra 'Japanese = English' bone name translations, added to the standard MMD dictionary"
+    )
+    bpy.types.Scene.Bone_Alias_Text = bpy.props.PointerProperty(
+        type=bpy.types.Text,
+        name="Bone Name Aliases",
+        description="Text with 'reference bone = target bone' aliases for bones whose names cannot be matched automatically"
+    )
+    bpy.types.Scene.Show_Bone_Mapping = bpy.props.BoolProperty(
+        name="Show Bone Mapping",
+        description="Show the bone name mapping between the reference and target armatures",
+        default=False
+    )
     bpy.types.Scene.Transfer_IK_Bones = bpy.props.BoolProperty(
         name="Transfer IK Bones and Constraints",
         description="Transfer IK bones and their constraints",
@@ -418,9 +1614,148 @@ def register_enum_properties():
         description="Transfer other missing bones and their constraints",
         default=False
     )
+    bpy.types.Scene.Show_Log_Settings = bpy.props.BoolProperty(
+        name="Show Log Settings",
+        description="Show the transfer log settings",
+        default=False
+    )
+    bpy.types.Scene.Log_Level = bpy.props.EnumProperty(
+        name="Log Level",
+        description="Minimum level of messages printed to the console and written to the log",
+        items=[
+            ('WARNING', "Warning", "Only warnings and errors"),
+            ('INFO', "Info", "Per-target summaries, warnings and errors"),
+            ('DEBUG', "Debug", "Verbose dumps of bone structures, mappings and filtered constraints"),
+        ],
+        default='WARNING'
+    )
+    bpy.types.Scene.Log_Text = bpy.props.PointerProperty(
+        type=bpy.types.Text,
+        name="Log Text",
+        description="Text datablock the transfer report is written to after each transfer"
+    )
+    bpy.types.Scene.Log_File_Path = bpy.props.StringProperty(
+        name="Log File",
+        description="JSON file the phase timings, counters and messages are written to after each transfer",
+        subtype='FILE_PATH'
+    )
+    bpy.types.Scene.Show_Transfer_Preview = bpy.props.BoolProperty(
+        name="Show Transfer Preview",
+        description="Show what a transfer with the current settings would change",
+        default=False
+    )
+    bpy.types.Scene.Show_Preview_Missing_Bones = bpy.props.BoolProperty(
+        name="Show Bones to Create",
+        description="List the bones a transfer would create",
+        default=False
+    )
+    bpy.types.Scene.Show_Preview_Constrained_Bones = bpy.props.BoolProperty(
+        name="Show Constrained Bones",
+        description="List the bones whose constraints a transfer would add or update",
+        default=False
+    )
+    bpy.types.Scene.Show_Preview_Unmapped = bpy.props.BoolProperty(
+        name="Show Unmapped Subtargets",
+        description="List the constraint subtargets that have no counterpart in the target armature",
+        default=False
+    )
+    bpy.types.Scene.Show_Verification = bpy.props.BoolProperty(
+        name="Show Verification",
+        description="Show the pose equivalence verification",
+        default=False
+    )
+    bpy.types.Scene.Show_Verification_Bones = bpy.props.BoolProperty(
+        name="Show Deviating Bones",
+        description="List the bones whose evaluated pose deviates from the reference",
+        default=False
+    )
+    bpy.types.Scene.Show_Verification_Constraints = bpy.props.BoolProperty(
+        name="Show Suspect Constraints",
+        description="List the constraints on bones where a deviation starts",
+        default=False
+    )
+    bpy.types.Scene.Verify_Poses = bpy.props.IntProperty(
+        name="Poses",
+        description="Number of sampled poses, or the maximum number of reference keyframes, to compare",
+        default=DEFAULT_POSES,
+        min=1,
+        max=10000
+    )
+    bpy.types.Scene.Verify_Use_Keyframes = bpy.props.BoolProperty(
+        name="Use Reference Keyframes",
+        description="Compare the poses keyed in the reference armature's action instead of random poses",
+        default=False
+    )
+    bpy.types.Scene.Verify_Angle_Tolerance = bpy.props.FloatProperty(
+        name="Angle Tolerance",
+        description="Largest rotation deviation from the reference, in degrees, that is not reported",
+        default=DEFAULT_ANGLE_TOLERANCE,
+        min=0.0
+    )
+    bpy.types.Scene.Verify_Location_Tolerance = bpy.props.FloatProperty(
+        name="Location Tolerance",
+        description="Largest location deviation from the reference, in reference units, that is not reported",
+        default=DEFAULT_LOCATION_TOLERANCE,
+        min=0.0
+    )
+    bpy.types.Scene.Transfer_Scope = bpy.props.EnumProperty(
+        name="Transfer Scope",
+        description="Which reference bones to transfer; only the scoped bones, the bones their constraints target "
+                    "and their parents are extracted, mapped and applied",
+        items=[
+            ('ALL', "Whole Armature", "Transfer according to the IK / missing bone options"),
+            ('SELECTED', "Selected Bones", "Selected bones of the reference armature (of the target armature "
+                                           "when using a template)"),
+            ('IK_CHAIN', "IK Chain", "The IK chain ending at the given bone"),
+            ('COLLECTION', "Bone Collections", "Bones in the given bone collections (bone groups before Blender 4.0), "
+                                               "separated by commas"),
+            ('PATTERN', "Name Patterns", "Bones whose names match the given wildcard patterns, separated by commas"),
+        ],
+        default='ALL'
+    )
+    bpy.types.Scene.Scope_Include_Children = bpy.props.BoolProperty(
+        name="Include Children",
+        description="Also transfer all descendants of the selected bones",
+        default=True
+    )
+    bpy.types.Scene.Scope_IK_Chain = bpy.props.StringProperty(
+        name="IK End Bone",
+        description="Reference bone carrying the IK constraint of the chain to transfer"
+    )
+    bpy.types.Scene.Scope_Collections = bpy.props.StringProperty(
+        name="Bone Collections",
+        description="Reference bone collections to transfer, separated by commas"
+    )
+    bpy.types.Scene.Scope_Patterns = bpy.props.StringProperty(
+        name="Name Patterns",
+        description="Wildcard patterns such as 'hair_*, *_L', separated by commas"
+    )
+    bpy.types.Scene.Align_Created_Bones = bpy.props.BoolProperty(
+        name="Align Created Bones",
+        description="Fit the reference to the target from the bones they share and place created bones relative to "
+                    "their nearest matched parent, so they follow the target's scale, proportions and rest pose",
+        default=True
+    )
+    bpy.types.Scene.Align_Per_Limb_Scale = bpy.props.BoolProperty(
+        name="Scale Per Limb",
+        description="Also scale created bones by the length ratio of the matched bones in their limb",
+        default=False
+    )
+    bpy.types.Scene.Incremental_Transfer = bpy.props.BoolProperty(
+        name="Incremental Transfer",
+        description="Only apply what changed since the last transfer: add missing constraints, update changed ones "
+                    "and remove stale constraints previously added by BoneCT, instead of adding every constraint again",
+        default=True
+    )
 
 classes = (
     OBJECT_OT_TransferConstraintsOperator,
+    OBJECT_OT_ModalTransferConstraintsOperator,
+    OBJECT_OT_BatchTransferConstraintsOperator,
+    OBJECT_OT_ExportReferenceTemplateOperator,
+    OBJECT_OT_RefreshBoneMappingOperator,
+    OBJECT_OT_RefreshTransferPreviewOperator,
+    OBJECT_OT_VerifyTransferOperator,
     BoneCTPreferences,
     VIEW3D_PT_TransferConstraintsPanel,
 )
@@ -429,14 +1764,46 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     register_enum_properties()
+    register_handlers(reschedule_scene_preview)
 
 def unregister():
+    unregister_handlers()
+    if bpy.app.timers.is_registered(update_scene_preview):
+        bpy.app.timers.unregister(update_scene_preview)
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.Reference_Armature
+    del bpy.types.Scene.Reference_Source
+    del bpy.types.Scene.Reference_Template_Path
     del bpy.types.Scene.Armature_to_Add_Constraints
+    del bpy.types.Scene.Bone_Translation_Text
+    del bpy.types.Scene.Bone_Alias_Text
+    del bpy.types.Scene.Show_Bone_Mapping
     del bpy.types.Scene.Transfer_IK_Bones
     del bpy.types.Scene.Transfer_Missing_Bones
+    del bpy.types.Scene.Incremental_Transfer
+    del bpy.types.Scene.Align_Created_Bones
+    del bpy.types.Scene.Align_Per_Limb_Scale
+    del bpy.types.Scene.Transfer_Scope
+    del bpy.types.Scene.Show_Transfer_Preview
+    del bpy.types.Scene.Show_Preview_Missing_Bones
+    del bpy.types.Scene.Show_Preview_Constrained_Bones
+    del bpy.types.Scene.Show_Preview_Unmapped
+    del bpy.types.Scene.Show_Verification
+    del bpy.types.Scene.Show_Verification_Bones
+    del bpy.types.Scene.Show_Verification_Constraints
+    del bpy.types.Scene.Verify_Poses
+    del bpy.types.Scene.Verify_Use_Keyframes
+    del bpy.types.Scene.Verify_Angle_Tolerance
+    del bpy.types.Scene.Verify_Location_Tolerance
+    del bpy.types.Scene.Scope_Include_Children
+    del bpy.types.Scene.Scope_IK_Chain
+    del bpy.types.Scene.Scope_Collections
+    del bpy.types.Scene.Scope_Patterns
+    del bpy.types.Scene.Show_Log_Settings
+    del bpy.types.Scene.Log_Level
+    del bpy.types.Scene.Log_Text
+    del bpy.types.Scene.Log_File_Path
 
 if __name__ == "__main__":
     register()
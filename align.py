@@ -0,0 +1,225 @@
+"""骨架对齐
+
+用参考骨架与目标骨架中对应骨骼的头和尾，以 NumPy 最小二乘（Umeyama 方法）一次求出相似变换（缩放、旋转、平移），
+可选再按肢体求缩放。缺失的骨骼相对最近的已对应祖先骨骼放置：祖先在目标骨架中的方向与参考不同时（如 A 姿势与 T 姿势），
+子骨骼随之旋转；IK目标骨骼的长度按IK链长度确定。
+由 BoneCT 创建的骨骼不参与拟合，也不作为放置的锚点。
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .bulk import BoneArrays, read_bone_arrays, rest_matrices_to_rolls, rolls_to_rest_matrices
+from .incremental import BONE_TAG
+
+# scale: 整体缩放；rotation: 3x3 旋转矩阵；translation: 平移；residual: 拟合的均方根误差；matched: 参与拟合的骨骼数
+Alignment = namedtuple('Alignment', ('scale', 'rotation', 'translation', 'residual', 'matched'))
+
+# 按肢体缩放相对整体缩放的范围，避免个别比例异常的骨骼使整条肢体变形
+LIMB_SCALE_RANGE = (0.5, 2.0)
+# IK目标骨骼长度与IK链长度之比
+IK_TARGET_LENGTH_RATIO = 0.2
+
+_EPSILON = 1e-9
+
+
+def fit_similarity(source, target):
+    """求缩放 s、旋转 R 和平移 t，使 sum |s R source + t - target|^2 最小，返回 Alignment
+
+    点数不足或参考点共线（旋转不确定）时不旋转，只求缩放和平移。
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    count = len(source)
+    if not count:
+        return Alignment(1.0, np.eye(3), np.zeros(3), 0.0, 0)
+    source_mean = source.mean(axis=0)
+    target_mean = target.mean(axis=0)
+    x = source - source_mean
+    y = target - target_mean
+    source_var = (x * x).sum() / count
+    if source_var < _EPSILON:
+        return Alignment(1.0, np.eye(3), target_mean - source_mean, float(np.sqrt(((y * y).sum(axis=1)).mean())), count)
+
+    spread = np.linalg.svd(x, compute_uv=False)
+    if count < 3 or spread[1] < 1e-6 * spread[0]:
+        scale = float(np.sqrt((y * y).sum() / count / source_var))
+        rotation = np.eye(3)
+    else:
+        u, d, vt = np.linalg.svd(y.T @ x / count)
+        # 保证为旋转而非镜像
+        sign = np.ones(3)
+        if np.linalg.det(u) * np.linalg.det(vt) < 0:
+            sign[2] = -1.0
+        rotation = (u * sign) @ vt
+        scale = float((d * sign).sum() / source_var)
+    translation = target_mean - scale * rotation @ source_mean
+    residual = float(np.sqrt((((scale * source @ rotation.T + translation) - target) ** 2).sum(axis=1).mean()))
+    return Alignment(scale, rotation, translation, residual, count)
+
+
+def limb_ids(hierarchy):
+    """把骨骼划分为肢体，返回每根骨骼所属肢体的编号（肢体起点骨骼的下标）
+
+    肢体沿子树最大的子骨骼延续（如 上臂-前臂-手），其他子骨骼（如扭转骨骼、手指）各自开始新的肢体。
+    """
+    count = len(hierarchy.names)
+    parents = hierarchy.parents.tolist()
+    order = hierarchy.order.tolist()
+    sizes = [1] * count
+    for i in reversed(order):
+        if parents[i] >= 0:
+            sizes[parents[i]] += sizes[i]
+    main_child = [max(children, key=sizes.__getitem__) if children else -1 for children in hierarchy.children]
+    limbs = list(range(count))
+    for i in order:
+        parent = parents[i]
+        if parent >= 0 and main_child[parent] == i:
+            limbs[i] = limbs[parent]
+    return np.asarray(limbs, dtype=np.int64)
+
+
+def nearest_anchors(hierarchy, is_anchor):
+    """返回每根骨骼最近的锚点祖先（不含自身）的下标，没有时为 -1"""
+    parents = hierarchy.parents.tolist()
+    anchors = [-1] * len(parents)
+    for i in hierarchy.order.tolist():
+        parent = parents[i]
+        if parent >= 0:
+            anchors[i] = parent if is_anchor[parent] else anchors[parent]
+    return np.asarray(anchors, dtype=np.int64)
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=1)
+    return vectors / np.maximum(norms, _EPSILON)[:, None], norms
+
+
+def minimal_rotations(source, target):
+    """批量求把 source 方向转到 target 方向的最小旋转；长度为 0 或方向相反时返回单位矩阵"""
+    a, a_norms = _unit(source)
+    b, b_norms = _unit(target)
+    v = np.cross(a, b)
+    c = (a * b).sum(axis=1)
+    skew = np.zeros((len(v), 3, 3))
+    skew[:, 0, 1], skew[:, 0, 2] = -v[:, 2], v[:, 1]
+    skew[:, 1, 0], skew[:, 1, 2] = v[:, 2], -v[:, 0]
+    skew[:, 2, 0], skew[:, 2, 1] = -v[:, 1], v[:, 0]
+    valid = (a_norms > _EPSILON) & (b_norms > _EPSILON) & (c > -1.0 + 1e-6)
+    factor = np.where(valid, 1.0 / np.where(valid, 1.0 + c, 1.0), 0.0)
+    rotations = np.eye(3) + skew * valid[:, None, None] + np.matmul(skew, skew) * factor[:, None, None]
+    return rotations
+
+
+def align_bone_arrays(reference_arrays, hierarchy, target_armature, bone_mapping, per_limb_scale=False):
+    """把参考骨骼的静止姿态几何对齐到目标骨架，返回 (对齐后的 BoneArrays, Alignment)
+
+    对应的骨骼（不含 BoneCT 创建的骨骼）为锚点；其他骨骼相对最近的锚点祖先放置，
+    按整体相似变换缩放，并随锚点骨骼在两个骨架中的方向差旋转；没有锚点祖先的骨骼直接使用整体变换。
+    per_limb_scale 为 True 时再乘以所在肢体中锚点骨骼的长度比。
+    """
+    names = reference_arrays.names
+    target_arrays = read_bone_arrays(target_armature)
+    target_index = {name: i for i, name in enumerate(target_arrays.names)}
+    target_bones = target_armature.data.bones
+
+    # 锚点：参考骨骼下标及其在目标骨架中对应骨骼的下标
+    anchor_rows = []
+    anchor_targets = []
+    for i, name in enumerate(names):
+        target_name = bone_mapping.get(name)
+        if target_name is not None and target_name in target_index and target_bones[target_name].get(BONE_TAG) is None:
+            anchor_rows.append(i)
+            anchor_targets.append(target_index[target_name])
+    anchor_rows = np.asarray(anchor_rows, dtype=np.int64)
+    anchor_targets = np.asarray(anchor_targets, dtype=np.int64)
+
+    reference_heads = reference_arrays.heads.astype(np.float64)
+    reference_tails = reference_arrays.tails.astype(np.float64)
+    matched_heads = target_arrays.heads[anchor_targets].astype(np.float64)
+    matched_tails = target_arrays.tails[anchor_targets].astype(np.float64)
+    alignment = fit_similarity(
+        np.vstack((reference_heads[anchor_rows], reference_tails[anchor_rows])),
+        np.vstack((matched_heads, matched_tails)),
+    )
+    alignment = alignment._replace(matched=len(anchor_rows))
+    scale, rotation = alignment.scale, alignment.rotation
+
+    count = len(names)
+    is_anchor = np.zeros(count, dtype=bool)
+    is_anchor[anchor_rows] = True
+    anchors = nearest_anchors(hierarchy, is_anchor)
+
+    # 每根骨骼的缩放
+    bone_scales = np.full(count, scale)
+    if per_limb_scale and len(anchor_rows):
+        limbs = limb_ids(hierarchy)
+        _, reference_lengths = _unit(reference_tails[anchor_rows] - reference_heads[anchor_rows])
+        _, target_lengths = _unit(matched_tails - matched_heads)
+        usable = reference_lengths > _EPSILON
+        anchor_limbs = limbs[anchor_rows][usable]
+        reference_sum = np.bincount(anchor_limbs, weights=scale * reference_lengths[usable], minlength=count)
+        target_sum = np.bincount(anchor_limbs, weights=target_lengths[usable], minlength=count)
+        has_ratio = reference_sum > _EPSILON
+        limb_scales = np.ones(count)
+        limb_scales[has_ratio] = np.clip(target_sum[has_ratio] / reference_sum[has_ratio], *LIMB_SCALE_RANGE)
+        # 肢体中没有锚点时使用最近锚点所在肢体的比例
+        ratios = np.where(has_ratio[limbs], limb_scales[limbs], 1.0)
+        inherit = ~has_ratio[limbs] & (anchors >= 0)
+        anchor_limbs = limbs[anchors[inherit]]
+        ratios[inherit] = np.where(has_ratio[anchor_limbs], limb_scales[anchor_limbs], 1.0)
+        bone_scales *= ratios
+
+    # 以锚点为原点的局部变换：锚点头部对齐到目标骨骼的头部，并按锚点骨骼的方向差旋转
+    anchor_rotation = np.tile(rotation, (count, 1, 1))
+    anchor_origin = np.zeros((count, 3))
+    anchor_position = np.tile(alignment.translation, (count, 1))
+    if len(anchor_rows):
+        target_row = np.full(count, -1, dtype=np.int64)
+        target_row[anchor_rows] = np.arange(len(anchor_rows))
+        rotated = (reference_tails[anchor_rows] - reference_heads[anchor_rows]) @ rotation.T
+        pose_rotations = minimal_rotations(rotated, matched_tails - matched_heads)
+        anchored = anchors >= 0
+        rows = target_row[anchors[anchored]]
+        anchor_rotation[anchored] = np.matmul(pose_rotations[rows], rotation)
+        anchor_origin[anchored] = reference_heads[anchors[anchored]]
+        anchor_position[anchored] = matched_heads[rows]
+
+    def place(points):
+        local = np.einsum('nij,nj->ni', anchor_rotation, points - anchor_origin)
+        return anchor_position + bone_scales[:, None] * local
+
+    heads = place(reference_heads)
+    tails = place(reference_tails)
+    matrices = np.matmul(anchor_rotation, rolls_to_rest_matrices(reference_heads, reference_tails, reference_arrays.rolls))
+    rolls = rest_matrices_to_rolls(heads, tails, matrices)
+    aligned = BoneArrays(
+        names, heads.astype(np.float32), tails.astype(np.float32), rolls.astype(np.float32),
+        reference_arrays.parents, reference_arrays.external_parents,
+    )
+    return aligned, alignment
+
+
+def ik_target_lengths(arrays, hierarchy, constraints, ik_end_bones):
+    """按IK链长度（末端骨骼及 chain_count 范围内祖先骨骼的长度之和）计算每个IK链末端骨骼的IK目标骨骼长度
+
+    返回按 arrays 下标的数组，非IK链末端骨骼为 0。
+    """
+    _, bone_lengths = _unit((arrays.tails - arrays.heads).astype(np.float64))
+    lengths = np.zeros(len(arrays.names))
+    for name in ik_end_bones:
+        i = hierarchy.index.get(name)
+        if i is None:
+            continue
+        chain_length = 0.0
+        for record in constraints.get(name, ()):
+            if record.type != 'IK':
+                continue
+            chain_count = dict(zip(record.fields, record.values)).get('chain_count', 0)
+            chain = (i,) + hierarchy.ancestors(i)
+            if chain_count:
+                chain = chain[:chain_count]
+            chain_length = max(chain_length, float(bone_lengths[list(chain)].sum()))
+        lengths[i] = chain_length * IK_TARGET_LENGTH_RATIO
+    return lengths
@@ -0,0 +1,276 @@
+"""BoneCT 基准测试
+
+用法：
+    python benchmarks/run.py [--scale small|mmd|large] [--bones N] [--depth N] [--ik-chains N]
+                             [--constraints-per-bone X] [--repeat N] [--save-baseline | --check]
+    blender -b --factory-startup --python benchmarks/run.py -- [相同参数]
+
+不在 Blender 中运行时使用 benchmarks/standin 中的 bpy / mathutils 替身，无需安装 Blender。
+每个场景按 Transfer Constraints 操作符的流程运行，记录各阶段耗时（与 TransferLog 的阶段一致）、
+总耗时、模式切换次数和 tracemalloc 峰值内存；耗时取多次运行的中位数。基线按运行环境（替身或 Blender 版本）
+和规模保存在 baseline.json 中；--check 与基线比较，任一阶段变慢超过容差、模式切换增多或峰值内存超过容差时
+以非零状态退出。阶段变慢的幅度小于该场景基线总耗时的 --min-share 时视为计时噪声，不算回归；
+每次运行前后还计时一段固定的纯 Python 校准负载；校准耗时比基线长（机器整体变慢）时按比例放宽基线，
+校准本身也有噪声，所以不会因为校准偏快而收紧基线。
+基线中没有的新阶段不参与比较，也从总耗时中扣除，直到用 --save-baseline 更新基线。
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+try:
+    import bpy
+    STANDIN = False
+except ImportError:
+    sys.path.insert(0, os.path.join(BENCHMARK_DIR, 'standin'))
+    import bpy
+    STANDIN = True
+
+sys.path.insert(0, BENCHMARK_DIR)
+from synthetic import SCALES, make_armatures  # noqa: E402
+
+ADDON_NAME = 'bonect_benchmark'
+
+SCENARIOS = ('transfer', 'rerun', 'template')
+
+
+def load_addon():
+    """以独立的包名导入仓库中的插件，不与已安装的 BoneCT 冲突，也不注册界面类"""
+    addon = sys.modules.get(ADDON_NAME)
+    if addon is None:
+        spec = importlib.util.spec_from_file_location(
+            ADDON_NAME, os.path.join(ROOT, '__init__.py'), submodule_search_locations=[ROOT]
+        )
+        addon = importlib.util.module_from_spec(spec)
+        sys.modules[ADDON_NAME] = addon
+        spec.loader.exec_module(addon)
+    return addon
+
+
+def backend_name():
+    return 'standin' if STANDIN else f"blender-{bpy.app.version_string.split()[0]}"
+
+
+def clear_caches():
+    """清空插件的模块级缓存，使每次运行都从冷状态开始"""
+    sys.modules[f'{ADDON_NAME}.mapping'].clear_mapping_cache()
+    sys.modules[f'{ADDON_NAME}.template'].clear_template_cache()
+    sys.modules[f'{ADDON_NAME}.codec'].clear_schema_cache()
+
+
+def reset_scene():
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+
+
+def run_scenario(addon, scenario, scale, seed, template_path, trace_memory=False):
+    """运行一个场景，返回 (TransferLog, 峰值内存字节数)；不统计内存时峰值为 None"""
+    reset_scene()
+    clear_caches()
+    reference, target = make_armatures(scale, seed)
+    # 只统计传递本身的内存，不含生成合成骨架
+    if trace_memory:
+        tracemalloc.start()
+    log = addon.TransferLog('ERROR', echo=False)
+    if scenario == 'template':
+        addon.export_reference_template(reference, template_path)
+        clear_caches()
+        with log.phase('extraction'):
+            reference_data = addon.load_template(template_path)
+    else:
+        reference_data = addon.extract_reference_data(reference, log)
+
+    if scenario == 'rerun':
+        # 先完成一次传递，只统计对已是最新的目标骨架的再次传递
+        addon.transfer_to_target(reference_data, target, True, True, incremental=True)
+        log = addon.TransferLog('ERROR', echo=False)
+        reference_data = addon.extract_reference_data(reference, log)
+    addon.transfer_to_target(reference_data, target, True, True, incremental=True, log=log)
+    if not trace_memory:
+        return log, None
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return log, peak
+
+
+def calibrate():
+    """计时一段固定的纯 Python 负载（字典、列表和浮点运算，与插件的主要开销类似），返回秒数"""
+    start = time.perf_counter()
+    table = {}
+    for i in range(20000):
+        key = f"bone_{i % 500}"
+        values = table.setdefault(key, [])
+        values.append(i * 0.5)
+        if len(values) > 8:
+            table[key] = [sum(values) / len(values)]
+    return time.perf_counter() - start
+
+
+def measure(addon, scenario, scale, seed, repeat, template_path):
+    """多次运行取各阶段耗时的中位数，再单独运行一次统计峰值内存（tracemalloc 会拖慢计时）"""
+    phases = {}
+    totals = []
+    calibrations = []
+    mode_switches = 0
+    for _ in range(repeat):
+        calibrations.append(calibrate())
+        log, _ = run_scenario(addon, scenario, scale, seed, template_path)
+        calibrations.append(calibrate())
+        # 各阶段互不嵌套，总耗时即各阶段之和（不含生成合成骨架的时间）
+        totals.append(sum(log.timings.values()))
+        for name, seconds in log.timings.items():
+            phases.setdefault(name, []).append(seconds)
+        mode_switches = log.counters['mode_switches']
+
+    _, peak = run_scenario(addon, scenario, scale, seed, template_path, trace_memory=True)
+
+    return {
+        'phases_ms': {name: round(statistics.median(seconds) * 1000.0, 3) for name, seconds in phases.items()},
+        'total_ms': round(statistics.median(totals) * 1000.0, 3),
+        'calibration_ms': round(statistics.median(calibrations) * 1000.0, 3),
+        'mode_switches': mode_switches,
+        'peak_kib': round(peak / 1024.0, 1),
+    }
+
+
+def compare(result, baseline, tolerance, min_share, min_kib):
+    """返回相对基线的回归列表
+
+    阶段变慢超过容差比例，且变慢的幅度超过该场景基线总耗时的 min_share 时算作回归；
+    只占总耗时很小一部分的阶段即使耗时翻倍，也多半是计时噪声。
+    """
+    regressions = []
+    for scenario, current in result.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        # 机器整体变慢时按校准负载的耗时之比放宽基线；旧基线没有校准耗时时不换算
+        speed = 1.0
+        if base.get('calibration_ms') and current.get('calibration_ms'):
+            speed = max(1.0, current['calibration_ms'] / base['calibration_ms'])
+        untracked = [phase for phase in current['phases_ms'] if phase not in base['phases_ms']]
+        total = current['total_ms'] - sum(current['phases_ms'][phase] for phase in untracked)
+        timings = dict(current['phases_ms'], total=total)
+        base_timings = dict(base['phases_ms'], total=base['total_ms'])
+        floor = base['total_ms'] * speed * min_share
+        for phase, value in timings.items():
+            reference = base_timings.get(phase)
+            if reference is None:
+                continue
+            reference *= speed
+            if value > reference * tolerance and value - reference > floor:
+                regressions.append(f"{scenario}.{phase}: {value:.1f} ms (baseline {reference:.1f} ms)")
+        if current['mode_switches'] > base['mode_switches']:
+            regressions.append(f"{scenario}.mode_switches: {current['mode_switches']} (baseline {base['mode_switches']})")
+        if current['peak_kib'] > base['peak_kib'] * tolerance and current['peak_kib'] - base['peak_kib'] > min_kib:
+            regressions.append(f"{scenario}.peak: {current['peak_kib']:.0f} KiB (baseline {base['peak_kib']:.0f} KiB)")
+    return regressions
+
+
+def new_phases(result, baseline):
+    """返回基线中没有的阶段（如新增的阶段），格式为 场景.阶段"""
+    return [
+        f"{scenario}.{phase}"
+        for scenario, current in result.items() if scenario in baseline
+        for phase in current['phases_ms'] if phase not in baseline[scenario]['phases_ms']
+    ]
+
+
+def print_result(scale_key, result):
+    print(f"BoneCT benchmark [{backend_name()}] {scale_key}")
+    for scenario, values in result.items():
+        phases = ', '.join(f"{name} {ms:.1f}" for name, ms in values['phases_ms'].items())
+        print(f"  {scenario:<9} total {values['total_ms']:8.1f} ms | mode switches {values['mode_switches']} | "
+              f"peak {values['peak_kib']:8.0f} KiB | {phases}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="BoneCT benchmark")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='mmd')
+    parser.add_argument('--bones', type=int, help="Override the number of bones")
+    parser.add_argument('--depth', type=int, help="Override the maximum hierarchy depth")
+    parser.add_argument('--ik-chains', type=int, help="Override the number of IK chains")
+    parser.add_argument('--constraints-per-bone', type=float, help="Override the average number of constraints per bone")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help="Scenario to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per scenario; timings are the median")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the baseline")
+    parser.add_argument('--check', action='store_true', help="Exit with status 1 on regressions against the baseline")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="Allowed slowdown / memory growth ratio")
+    parser.add_argument('--min-share', type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this share of the scenario's baseline total")
+    parser.add_argument('--min-kib', type=float, default=256.0, help="Ignore memory growth smaller than this")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    if argv is None:
+        # 在 Blender 中运行时，脚本参数位于 "--" 之后
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    args = parse_args(argv)
+
+    scale = SCALES[args.scale]
+    overrides = {
+        'bones': args.bones,
+        'depth': args.depth,
+        'ik_chains': args.ik_chains,
+        'constraints_per_bone': args.constraints_per_bone,
+    }
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    scale = scale._replace(**overrides)
+    scale_key = args.scale if not overrides else '-'.join(f"{name}={value}" for name, value in scale._asdict().items())
+
+    addon = load_addon()
+    with tempfile.TemporaryDirectory() as directory:
+        template_path = os.path.join(directory, 'reference.json')
+        result = {
+            scenario: measure(addon, scenario, scale, args.seed, args.repeat, template_path)
+            for scenario in (args.scenario or SCENARIOS)
+        }
+    print_result(scale_key, result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'backend': backend_name(), 'scale': scale_key, 'results': result}, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines.setdefault(backend_name(), {}).setdefault(scale_key, {}).update(result)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = baselines.get(backend_name(), {}).get(scale_key)
+    if baseline is None:
+        print("No baseline for this backend and scale.")
+        return 0
+    untracked = new_phases(result, baseline)
+    if untracked:
+        print(f"Not in the baseline, not compared: {', '.join(untracked)}")
+    regressions = compare(result, baseline, args.tolerance, args.min_share, args.min_kib)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
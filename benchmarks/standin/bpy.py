@@ -0,0 +1,1327 @@
+"""bpy 的进程内轻量替身
+
+只实现 BoneCT 与基准测试会用到的那一小部分 API：骨架数据、编辑骨骼、姿态骨骼、
+约束（带 RNA 属性描述）、模式切换、depsgraph 处理器和少量 UI 注册接口。
+所有会产生开销的调用都记录在 STATS 中，供基准测试统计。
+"""
+
+import math
+import sys
+import types as _pytypes
+
+from mathutils import Matrix, Vector, mat3_to_roll, vec_roll_to_mat3
+
+STATS = {
+    'mode_switches': 0,
+    'edit_bones_rebuilt': 0,
+    'relations_tagged': 0,
+    'relations_updates': 0,
+    'evaluations': 0,
+    'rna_updates': 0,
+}
+
+
+def reset_stats():
+    for key in STATS:
+        STATS[key] = 0
+
+
+# ---------------------------------------------------------------------------
+# RNA 描述
+# ---------------------------------------------------------------------------
+
+class _EnumItem:
+    __slots__ = ("identifier", "name", "value")
+
+    def __init__(self, identifier, value):
+        self.identifier = identifier
+        self.name = identifier.replace("_", " ").title()
+        self.value = value
+
+
+class _FixedType:
+    __slots__ = ("identifier",)
+
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+
+class Property:
+    def __init__(self, identifier, type, default=None, readonly=False, fixed_type=None,
+                 enum=(), array_length=0, subtype='NONE'):
+        self.identifier = identifier
+        self.type = type
+        self.default = default
+        self.is_readonly = readonly
+        self.fixed_type = _FixedType(fixed_type) if fixed_type else None
+        self.enum_items = [_EnumItem(e, i) for i, e in enumerate(enum)]
+        self.array_length = array_length
+        self.subtype = subtype
+        self.is_enum_flag = False
+
+    def __repr__(self):
+        return f"<Property {self.identifier} {self.type}>"
+
+
+class _PropertyCollection:
+    def __init__(self, props):
+        self._props = {p.identifier: p for p in props}
+
+    def __iter__(self):
+        return iter(self._props.values())
+
+    def __len__(self):
+        return len(self._props)
+
+    def __getitem__(self, key):
+        return self._props[key]
+
+    def __contains__(self, key):
+        return key in self._props
+
+    def get(self, key, default=None):
+        return self._props.get(key, default)
+
+    def keys(self):
+        return self._props.keys()
+
+
+class Struct_RNA:
+    def __init__(self, identifier, props):
+        self.identifier = identifier
+        self.properties = _PropertyCollection(
+            [Property('rna_type', 'POINTER', readonly=True, fixed_type='Struct')] + list(props)
+        )
+
+
+class _RNAStruct:
+    """带属性描述的数据块基类：校验只读属性、枚举和指针类型"""
+
+    _rna = None
+
+    def __init__(self):
+        values = {}
+        for prop in self._rna.properties:
+            if prop.identifier == 'rna_type':
+                continue
+            if prop.type == 'COLLECTION':
+                values[prop.identifier] = _StructCollection(_STRUCTS[prop.fixed_type.identifier])
+            elif prop.array_length and prop.subtype == 'MATRIX':
+                values[prop.identifier] = Matrix.Identity(4)
+            elif prop.array_length:
+                values[prop.identifier] = list(prop.default or [0.0] * prop.array_length)
+            else:
+                values[prop.identifier] = prop.default
+        object.__setattr__(self, '_values', values)
+
+    @property
+    def rna_type(self):
+        return self._rna
+
+    @property
+    def bl_rna(self):
+        return self._rna
+
+    def __dir__(self):
+        return ['rna_type', 'bl_rna'] + list(self._values)
+
+    def __getattr__(self, name):
+        values = object.__getattribute__(self, '_values')
+        if name in values:
+            return values[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __setattr__(self, name, value):
+        prop = self._rna.properties.get(name)
+        if prop is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        if prop.is_readonly or prop.type == 'COLLECTION':
+            raise AttributeError(f"bpy_struct: attribute \"{name}\" from \"{self._rna.identifier}\" is read-only")
+        if prop.type == 'ENUM':
+            if value not in {item.identifier for item in prop.enum_items}:
+                raise TypeError(f"bpy_struct: item.attr = val: enum \"{value}\" not found in {[e.identifier for e in prop.enum_items]}")
+        elif prop.type == 'POINTER':
+            if value is not None and type(value).__name__ != prop.fixed_type.identifier:
+                raise TypeError(f"bpy_struct: item.attr = val: {self._rna.identifier}.{name} expected a {prop.fixed_type.identifier} type, not {type(value).__name__}")
+            if name in {'target', 'pole_target', 'space_object', 'action'}:
+                STATS['relations_tagged'] += 1
+        elif prop.type == 'STRING':
+            if not isinstance(value, str):
+                raise TypeError(f"bpy_struct: item.attr = val: {self._rna.identifier}.{name} expected a string type")
+            if name.endswith('subtarget'):
+                STATS['relations_tagged'] += 1
+        elif prop.array_length and prop.subtype == 'MATRIX':
+            value = Matrix(value) if isinstance(value, Matrix) else Matrix([value[i:i + 4] for i in range(0, 16, 4)])
+        elif prop.array_length:
+            value = list(value)
+        elif prop.type == 'FLOAT':
+            value = float(value)
+        elif prop.type == 'INT':
+            value = int(value)
+        elif prop.type == 'BOOLEAN':
+            value = bool(value)
+        self._values[name] = value
+        STATS['rna_updates'] += 1
+
+
+class _StructCollection:
+    def __init__(self, struct_type):
+        self._type = struct_type
+        self._items = []
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def new(self):
+        item = self._type()
+        self._items.append(item)
+        return item
+
+    def remove(self, item):
+        self._items.remove(item)
+
+    def clear(self):
+        self._items.clear()
+
+
+def _P(identifier, type, default=None, **kwargs):
+    return Property(identifier, type, default, **kwargs)
+
+
+_SPACES = ('WORLD', 'CUSTOM', 'POSE', 'LOCAL_WITH_PARENT', 'LOCAL', 'LOCAL_OWNER_ORIENT')
+_EULER = ('AUTO', 'XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX')
+_CONSTRAINT_TYPES = (
+    'IK', 'COPY_LOCATION', 'COPY_ROTATION', 'COPY_SCALE', 'DAMPED_TRACK',
+    'LIMIT_ROTATION', 'LIMIT_LOCATION', 'CHILD_OF', 'ARMATURE', 'ACTION',
+)
+
+
+def _xyz(prefix, default):
+    return [_P(f'{prefix}_{axis}', 'BOOLEAN', default) for axis in 'xyz']
+
+
+_COMMON = [
+    _P('name', 'STRING', ''),
+    _P('type', 'ENUM', 'IK', readonly=True, enum=_CONSTRAINT_TYPES),
+    _P('mute', 'BOOLEAN', False),
+    _P('show_expanded', 'BOOLEAN', True),
+    _P('active', 'BOOLEAN', False),
+    _P('is_valid', 'BOOLEAN', True, readonly=True),
+    _P('error_location', 'FLOAT', 0.0, readonly=True),
+    _P('error_rotation', 'FLOAT', 0.0, readonly=True),
+    _P('influence', 'FLOAT', 1.0),
+    _P('owner_space', 'ENUM', 'WORLD', enum=_SPACES),
+    _P('target_space', 'ENUM', 'WORLD', enum=_SPACES),
+    _P('space_object', 'POINTER', fixed_type='Object'),
+    _P('space_subtarget', 'STRING', ''),
+]
+_TARGET = [_P('target', 'POINTER', fixed_type='Object'), _P('subtarget', 'STRING', '')]
+
+_CONSTRAINT_SCHEMAS = {
+    'IK': ('KinematicConstraint', _TARGET + [
+        _P('pole_target', 'POINTER', fixed_type='Object'),
+        _P('pole_subtarget', 'STRING', ''),
+        _P('pole_angle', 'FLOAT', 0.0),
+        _P('chain_count', 'INT', 0),
+        _P('iterations', 'INT', 500),
+        _P('use_stretch', 'BOOLEAN', True),
+        _P('use_tail', 'BOOLEAN', True),
+        _P('use_location', 'BOOLEAN', True),
+        _P('use_rotation', 'BOOLEAN', False),
+        _P('weight', 'FLOAT', 1.0),
+        _P('orient_weight', 'FLOAT', 1.0),
+        _P('ik_type', 'ENUM', 'COPY_POSE', enum=('COPY_POSE', 'DISTANCE')),
+    ]),
+    'COPY_LOCATION': ('CopyLocationConstraint', _TARGET + _xyz('use', True) + _xyz('invert', False) + [
+        _P('use_offset', 'BOOLEAN', False),
+        _P('head_tail', 'FLOAT', 0.0),
+        _P('use_bbone_shape', 'BOOLEAN', False),
+    ]),
+    'COPY_ROTATION': ('CopyRotationConstraint', _TARGET + _xyz('use', True) + _xyz('invert', False) + [
+        _P('use_offset', 'BOOLEAN', False),
+        _P('mix_mode', 'ENUM', 'REPLACE', enum=('REPLACE', 'ADD', 'BEFORE', 'AFTER', 'OFFSET')),
+        _P('euler_order', 'ENUM', 'AUTO', enum=_EULER),
+    ]),
+    'COPY_SCALE': ('CopyScaleConstraint', _TARGET + _xyz('use', True) + [
+        _P('use_offset', 'BOOLEAN', False),
+        _P('use_add', 'BOOLEAN', False),
+        _P('use_make_uniform', 'BOOLEAN', False),
+        _P('power', 'FLOAT', 1.0),
+    ]),
+    'DAMPED_TRACK': ('DampedTrackConstraint', _TARGET + [
+        _P('track_axis', 'ENUM', 'TRACK_Y', enum=(
+            'TRACK_X', 'TRACK_Y', 'TRACK_Z', 'TRACK_NEGATIVE_X', 'TRACK_NEGATIVE_Y', 'TRACK_NEGATIVE_Z')),
+        _P('head_tail', 'FLOAT', 0.0),
+    ]),
+    'LIMIT_ROTATION': ('LimitRotationConstraint', _xyz('use_limit', False) + [
+        _P(f'{bound}_{axis}', 'FLOAT', 0.0) for bound in ('min', 'max') for axis in 'xyz'
+    ] + [
+        _P('use_transform_limit', 'BOOLEAN', False),
+        _P('euler_order', 'ENUM', 'AUTO', enum=_EULER),
+    ]),
+    'LIMIT_LOCATION': ('LimitLocationConstraint', [
+        _P(f'use_{bound}_{axis}', 'BOOLEAN', False) for bound in ('min', 'max') for axis in 'xyz'
+    ] + [
+        _P(f'{bound}_{axis}', 'FLOAT', 0.0) for bound in ('min', 'max') for axis in 'xyz'
+    ] + [_P('use_transform_limit', 'BOOLEAN', False)]),
+    'CHILD_OF': ('ChildOfConstraint', _TARGET + _xyz('use_location', True) + _xyz('use_rotation', True)
+                 + _xyz('use_scale', True) + [
+        _P('inverse_matrix', 'FLOAT', array_length=16, subtype='MATRIX'),
+        _P('set_inverse_pending', 'BOOLEAN', False),
+    ]),
+    'ARMATURE': ('ArmatureConstraint', [
+        _P('targets', 'COLLECTION', fixed_type='ConstraintTarget'),
+        _P('use_deform_preserve_volume', 'BOOLEAN', False),
+        _P('use_bone_envelopes', 'BOOLEAN', False),
+        _P('use_current_location', 'BOOLEAN', False),
+    ]),
+    'ACTION': ('ActionConstraint', _TARGET + [
+        _P('action', 'POINTER', fixed_type='Action'),
+        _P('transform_channel', 'ENUM', 'ROTATION_X', enum=(
+            'LOCATION_X', 'LOCATION_Y', 'LOCATION_Z', 'ROTATION_X', 'ROTATION_Y', 'ROTATION_Z',
+            'SCALE_X', 'SCALE_Y', 'SCALE_Z')),
+        _P('frame_start', 'INT', 0),
+        _P('frame_end', 'INT', 1),
+        _P('min', 'FLOAT', 0.0),
+        _P('max', 'FLOAT', 0.0),
+        _P('mix_mode', 'ENUM', 'AFTER_FULL', enum=('BEFORE_FULL', 'BEFORE', 'BEFORE_SPLIT', 'AFTER_FULL', 'AFTER', 'AFTER_SPLIT')),
+        _P('use_eval_time', 'BOOLEAN', False),
+        _P('eval_time', 'FLOAT', 0.0),
+        _P('use_bone_object_action', 'BOOLEAN', False),
+    ]),
+}
+
+_STRUCTS = {}
+
+
+class ConstraintTarget(_RNAStruct):
+    _rna = Struct_RNA('ConstraintTarget', [
+        _P('target', 'POINTER', fixed_type='Object'),
+        _P('subtarget', 'STRING', ''),
+        _P('weight', 'FLOAT', 0.0),
+    ])
+
+
+_STRUCTS['ConstraintTarget'] = ConstraintTarget
+
+
+class Constraint(_RNAStruct):
+    pass
+
+
+_CONSTRAINT_CLASSES = {}
+for _type, (_identifier, _props) in _CONSTRAINT_SCHEMAS.items():
+    _cls = type(_identifier, (Constraint,), {'_rna': Struct_RNA(_identifier, _COMMON + _props)})
+    _CONSTRAINT_CLASSES[_type] = _cls
+    _STRUCTS[_identifier] = _cls
+
+
+def _new_constraint(c_type):
+    if c_type not in _CONSTRAINT_CLASSES:
+        raise TypeError(f"ConstraintsOfPoseBone.new(): error with keyword argument \"type\" - enum \"{c_type}\" not found")
+    constraint = _CONSTRAINT_CLASSES[c_type]()
+    constraint._values['type'] = c_type
+    constraint._values['name'] = _CONSTRAINT_SCHEMAS[c_type][0].replace('Constraint', '')
+    return constraint
+
+
+# ---------------------------------------------------------------------------
+# ID 数据块与集合
+# ---------------------------------------------------------------------------
+
+class _NamedCollection:
+    """按名字索引的集合，支持 foreach_get / foreach_set"""
+
+    def __init__(self):
+        self._items = {}
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self._items.values())[key]
+        return self._items[key]
+
+    def get(self, name, default=None):
+        return self._items.get(name, default)
+
+    def keys(self):
+        return list(self._items.keys())
+
+    def values(self):
+        return list(self._items.values())
+
+    def items(self):
+        return list(self._items.items())
+
+    def _unique_name(self, name):
+        if name not in self._items:
+            return name
+        index = 1
+        while f"{name}.{index:03d}" in self._items:
+            index += 1
+        return f"{name}.{index:03d}"
+
+    def _add(self, item):
+        item.name = self._unique_name(item.name)
+        self._items[item.name] = item
+        item._collection = self
+        return item
+
+    def _rename(self, item, new_name):
+        if item.name in self._items and self._items[item.name] is item:
+            del self._items[item.name]
+        new_name = self._unique_name(new_name)
+        object.__setattr__(item, '_name', new_name)
+        self._items[new_name] = item
+
+    def foreach_get(self, attr, seq):
+        i = 0
+        for item in self._items.values():
+            value = getattr(item, attr)
+            if isinstance(value, Matrix):
+                # 与 RNA 一致：矩阵按列主序展开
+                for col in range(4):
+                    for row in range(4):
+                        seq[i] = value._m[row][col]
+                        i += 1
+            elif isinstance(value, (Vector, list, tuple)):
+                for v in value:
+                    seq[i] = v
+                    i += 1
+            else:
+                seq[i] = value
+                i += 1
+
+    def foreach_set(self, attr, seq):
+        items = list(self._items.values())
+        if not items:
+            return
+        sample = getattr(items[0], attr)
+        width = len(sample) if isinstance(sample, (Vector, list, tuple)) else 1
+        for index, item in enumerate(items):
+            if width == 1:
+                setattr(item, attr, seq[index])
+            else:
+                setattr(item, attr, Vector(seq[index * width:(index + 1) * width]))
+
+
+class _Named:
+    _collection = None
+
+    def _get_name(self):
+        return self._name
+
+    def _set_name(self, value):
+        if self._collection is not None:
+            self._collection._rename(self, value)
+        else:
+            object.__setattr__(self, '_name', value)
+
+    name = property(_get_name, _set_name)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} '{self.name}'>"
+
+
+class ID(_Named):
+    def __init__(self, name):
+        self._name = name
+        self._custom = {}
+        self.users = 0
+
+    def __getitem__(self, key):
+        return self._custom[key]
+
+    def __setitem__(self, key, value):
+        self._custom[key] = value
+
+    def __contains__(self, key):
+        return key in self._custom
+
+    def get(self, key, default=None):
+        return self._custom.get(key, default)
+
+    def keys(self):
+        return self._custom.keys()
+
+    def pop(self, key, *default):
+        return self._custom.pop(key, *default)
+
+    def update_tag(self, refresh=None):
+        STATS['relations_tagged'] += 1
+
+
+class Action(ID):
+    pass
+
+
+class Text(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self._body = ""
+
+    def clear(self):
+        self._body = ""
+
+    def write(self, text):
+        self._body += text
+
+    def from_string(self, text):
+        self._body = text
+
+    def as_string(self):
+        return self._body
+
+
+class BoneCollection(_Named):
+    def __init__(self, name):
+        self._name = name
+        self.bones = []
+        self.is_visible = True
+
+    def assign(self, bone):
+        if bone not in self.bones:
+            self.bones.append(bone)
+
+
+class _BoneCollections(_NamedCollection):
+    def new(self, name):
+        return self._add(BoneCollection(name))
+
+
+class Bone(_Named):
+    def __init__(self, name):
+        self._name = name
+        self.parent = None
+        self.children = []
+        self.head_local = Vector((0.0, 0.0, 0.0))
+        self.tail_local = Vector((0.0, 1.0, 0.0))
+        self.matrix_local = Matrix.Identity(4)
+        self.use_connect = False
+        self.use_deform = True
+        self.select = False
+        self.hide = False
+        self.collections = []
+        self._custom = {}
+
+    def __getitem__(self, key):
+        return self._custom[key]
+
+    def __setitem__(self, key, value):
+        self._custom[key] = value
+
+    def get(self, key, default=None):
+        return self._custom.get(key, default)
+
+    @property
+    def length(self):
+        return (self.tail_local - self.head_local).length
+
+    @property
+    def head(self):
+        return self.head_local.copy()
+
+    @property
+    def tail(self):
+        return self.tail_local.copy()
+
+    def parent_recursive_iter(self):
+        bone = self.parent
+        while bone:
+            yield bone
+            bone = bone.parent
+
+    @property
+    def parent_recursive(self):
+        return list(self.parent_recursive_iter())
+
+    @staticmethod
+    def AxisRollFromMatrix(matrix, axis=(0.0, 0.0, 0.0)):
+        mat3 = Matrix(matrix).to_3x3() if len(matrix) == 4 else Matrix(matrix)
+        vec = Vector(row[1] for row in mat3._m)
+        if Vector(axis).length > 0.0:
+            vec = Vector(axis)
+        return vec.normalized(), mat3_to_roll(vec, mat3)
+
+    @staticmethod
+    def MatrixFromAxisRoll(axis, roll):
+        return vec_roll_to_mat3(axis, roll)
+
+
+class EditBone(_Named):
+    def __init__(self, name):
+        self._name = name
+        self.parent = None
+        self.head = Vector((0.0, 0.0, 0.0))
+        self.tail = Vector((0.0, 0.0, 0.0))
+        self.roll = 0.0
+        self.use_connect = False
+        self.use_deform = True
+        self.select = False
+        self._custom = {}
+        self._collections = []
+
+    def __setattr__(self, name, value):
+        if name in ('head', 'tail'):
+            value = Vector(value)
+        elif name == 'roll':
+            value = float(value)
+        object.__setattr__(self, name, value)
+
+    def __getitem__(self, key):
+        return self._custom[key]
+
+    def __setitem__(self, key, value):
+        self._custom[key] = value
+
+    @property
+    def length(self):
+        return (self.tail - self.head).length
+
+    @property
+    def children(self):
+        return [eb for eb in self._collection if eb.parent is self]
+
+
+class _EditBones(_NamedCollection):
+    def __init__(self, armature):
+        super().__init__()
+        self._armature = armature
+
+    def new(self, name):
+        if not self._armature.is_editmode:
+            raise RuntimeError("EditBones.new(): armature is not in edit mode")
+        return self._add(EditBone(name))
+
+    def remove(self, bone):
+        for child in list(self):
+            if child.parent is bone:
+                child.parent = bone.parent
+        del self._items[bone.name]
+
+    def foreach_get(self, attr, seq):
+        super().foreach_get(attr, seq)
+
+    def foreach_set(self, attr, seq):
+        super().foreach_set(attr, seq)
+
+
+class _Bones(_NamedCollection):
+    pass
+
+
+class Armature(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.bones = _Bones()
+        self.edit_bones = _EditBones(self)
+        self.collections = _BoneCollections()
+        self.is_editmode = False
+
+    # 进入/退出编辑模式时同步骨骼数据
+    def _enter_edit(self):
+        STATS['edit_bones_rebuilt'] += 1
+        self.is_editmode = True
+        edit_bones = _EditBones(self)
+        mapping = {}
+        for bone in self.bones:
+            eb = edit_bones._add(EditBone(bone.name))
+            eb.head = bone.head_local.copy()
+            eb.tail = bone.tail_local.copy()
+            eb.roll = mat3_to_roll(bone.tail_local - bone.head_local, bone.matrix_local.to_3x3())
+            eb.use_connect = bone.use_connect
+            eb.use_deform = bone.use_deform
+            eb._custom = dict(bone._custom)
+            eb._collections = list(bone.collections)
+            mapping[bone.name] = eb
+        for bone in self.bones:
+            if bone.parent:
+                mapping[bone.name].parent = mapping[bone.parent.name]
+        self.edit_bones = edit_bones
+
+    def _exit_edit(self):
+        STATS['edit_bones_rebuilt'] += 1
+        old = {bone.name: bone for bone in self.bones}
+        bones = _Bones()
+        for eb in self.edit_bones:
+            if (eb.tail - eb.head).length <= 1e-6:
+                # Blender 会在退出编辑模式时删除长度为零的骨骼
+                continue
+            bone = old.get(eb.name) or Bone(eb.name)
+            bone._collection = None
+            bone._name = eb.name
+            bone.head_local = eb.head.copy()
+            bone.tail_local = eb.tail.copy()
+            mat = vec_roll_to_mat3(eb.tail - eb.head, eb.roll).to_4x4()
+            mat.translation = eb.head
+            bone.matrix_local = mat
+            bone.use_connect = eb.use_connect
+            bone.use_deform = eb.use_deform
+            bone._custom = dict(eb._custom)
+            bone.collections = list(eb._collections)
+            bone.children = []
+            bones._add(bone)
+        for eb in self.edit_bones:
+            if eb.name not in bones:
+                continue
+            parent = eb.parent
+            while parent is not None and parent.name not in bones:
+                parent = parent.parent
+            bone = bones[eb.name]
+            bone.parent = bones[parent.name] if parent is not None else None
+            if bone.parent:
+                bone.parent.children.append(bone)
+        self.bones = bones
+        self.edit_bones = _EditBones(self)
+        self.is_editmode = False
+
+
+class PoseBone(_Named):
+    def __init__(self, bone):
+        self._name = bone.name
+        self.bone = bone
+        self.parent = None
+        self.constraints = _Constraints(self)
+        self.location = Vector((0.0, 0.0, 0.0))
+        self._rotation_mode = 'QUATERNION'
+        self.rotation_quaternion = [1.0, 0.0, 0.0, 0.0]
+        self.rotation_euler = Vector((0.0, 0.0, 0.0))
+        self.rotation_axis_angle = [0.0, 0.0, 1.0, 0.0]
+        self.scale = Vector((1.0, 1.0, 1.0))
+        self.matrix = bone.matrix_local.copy()
+        self._custom = {}
+
+    def __getitem__(self, key):
+        return self._custom[key]
+
+    def __setitem__(self, key, value):
+        self._custom[key] = value
+
+    def __delitem__(self, key):
+        del self._custom[key]
+
+    def __contains__(self, key):
+        return key in self._custom
+
+    def get(self, key, default=None):
+        return self._custom.get(key, default)
+
+    @property
+    def rotation_mode(self):
+        return self._rotation_mode
+
+    @rotation_mode.setter
+    def rotation_mode(self, mode):
+        # 与 Blender 一致：切换旋转模式时把当前旋转换算到新模式的值（欧拉角只按 XYZ 顺序处理）
+        quat = self._quaternion()
+        self._rotation_mode = mode
+        if mode == 'QUATERNION':
+            self.rotation_quaternion = list(quat)
+        elif mode == 'AXIS_ANGLE':
+            self.rotation_axis_angle = list(_quat_to_axis_angle(quat))
+        else:
+            self.rotation_euler = Vector(_quat_to_euler(quat))
+
+    def _quaternion(self):
+        if self._rotation_mode == 'QUATERNION':
+            return tuple(self.rotation_quaternion)
+        if self._rotation_mode == 'AXIS_ANGLE':
+            return _axis_angle_to_quat(self.rotation_axis_angle)
+        return _euler_to_quat(self.rotation_euler)
+
+    @property
+    def children(self):
+        return [pb for pb in self._collection if pb.parent is self]
+
+    @property
+    def head(self):
+        return self.matrix.translation
+
+    @property
+    def matrix_basis(self):
+        w, x, y, z = self._quaternion()
+        rot = [
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ]
+        m = Matrix.Identity(4)
+        for r in range(3):
+            for c in range(3):
+                m._m[r][c] = rot[r][c] * self.scale[c]
+            m._m[r][3] = self.location[r]
+        return m
+
+
+def _euler_to_quat(euler):
+    ex, ey, ez = (a * 0.5 for a in euler)
+    cx, sx = math.cos(ex), math.sin(ex)
+    cy, sy = math.cos(ey), math.sin(ey)
+    cz, sz = math.cos(ez), math.sin(ez)
+    return (
+        cx * cy * cz + sx * sy * sz,
+        sx * cy * cz - cx * sy * sz,
+        cx * sy * cz + sx * cy * sz,
+        cx * cy * sz - sx * sy * cz,
+    )
+
+
+def _quat_to_euler(quat):
+    w, x, y, z = quat
+    return (
+        math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y)),
+        math.asin(max(-1.0, min(1.0, 2 * (w * y - z * x)))),
+        math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z)),
+    )
+
+
+def _axis_angle_to_quat(axis_angle):
+    angle, x, y, z = axis_angle
+    norm = math.sqrt(x * x + y * y + z * z) or 1.0
+    s = math.sin(angle * 0.5) / norm
+    return (math.cos(angle * 0.5), x * s, y * s, z * s)
+
+
+def _quat_to_axis_angle(quat):
+    w, x, y, z = quat
+    norm = math.sqrt(x * x + y * y + z * z)
+    if norm < 1e-12:
+        return (0.0, 0.0, 1.0, 0.0)
+    return (2 * math.atan2(norm, w), x / norm, y / norm, z / norm)
+
+
+class _Constraints:
+    def __init__(self, owner):
+        self._owner = owner
+        self._items = []
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._items[key]
+        for c in self._items:
+            if c.name == key:
+                return c
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        for c in self._items:
+            if c.name == key:
+                return c
+        return default
+
+    def new(self, type):
+        constraint = _new_constraint(type)
+        names = {c.name for c in self._items}
+        base = constraint.name
+        index = 0
+        while constraint.name in names:
+            index += 1
+            constraint._values['name'] = f"{base}.{index:03d}"
+        self._items.append(constraint)
+        STATS['relations_tagged'] += 1
+        return constraint
+
+    def remove(self, constraint):
+        self._items.remove(constraint)
+        STATS['relations_tagged'] += 1
+
+    def clear(self):
+        self._items.clear()
+
+    def move(self, from_index, to_index):
+        item = self._items.pop(from_index)
+        self._items.insert(to_index, item)
+
+
+class _PoseBones(_NamedCollection):
+    pass
+
+
+class Pose:
+    def __init__(self, obj):
+        self.id_data = obj
+        self.bones = _PoseBones()
+
+    def _sync(self, armature):
+        old = {pb.name: pb for pb in self.bones}
+        bones = _PoseBones()
+        for bone in armature.bones:
+            pb = old.get(bone.name) or PoseBone(bone)
+            pb._collection = None
+            pb.bone = bone
+            bones._add(pb)
+        for pb in bones:
+            pb.parent = bones[pb.bone.parent.name] if pb.bone.parent else None
+        self.bones = bones
+        _evaluate_pose(self)
+
+
+def _evaluate_pose(pose):
+    """简单的前向运动学求值（不计算约束），得到骨架空间下的 pose_bone.matrix"""
+    for pb in pose.bones:
+        pb._evaluated = False
+    for pb in pose.bones:
+        _evaluate_pose_bone(pb)
+
+
+def _evaluate_pose_bone(pb):
+    if getattr(pb, '_evaluated', False):
+        return pb.matrix
+    rest = pb.bone.matrix_local
+    if pb.parent:
+        parent_matrix = _evaluate_pose_bone(pb.parent)
+        parent_rest = pb.parent.bone.matrix_local
+        pb.matrix = parent_matrix @ (parent_rest.inverted() @ rest) @ pb.matrix_basis
+    else:
+        pb.matrix = rest @ pb.matrix_basis
+    pb._evaluated = True
+    return pb.matrix
+
+
+class Object(ID):
+    def __init__(self, name, data=None):
+        super().__init__(name)
+        self.data = data
+        self.type = 'ARMATURE' if isinstance(data, Armature) else ('EMPTY' if data is None else 'MESH')
+        self.mode = 'OBJECT'
+        self.matrix_world = Matrix.Identity(4)
+        self.location = Vector((0.0, 0.0, 0.0))
+        self.animation_data = None
+        self._select = False
+        self.pose = Pose(self) if self.type == 'ARMATURE' else None
+        if self.pose is not None:
+            self.pose._sync(data)
+
+    def select_get(self):
+        return self._select
+
+    def select_set(self, state):
+        self._select = bool(state)
+
+    def hide_get(self):
+        return False
+
+    def evaluated_get(self, depsgraph):
+        return self
+
+
+class _IDCollection(_NamedCollection):
+    def __init__(self, id_type):
+        super().__init__()
+        self._id_type = id_type
+
+    def new(self, name, *args):
+        return self._add(self._id_type(name, *args))
+
+    def remove(self, item, do_unlink=True):
+        del self._items[item.name]
+
+
+class BlendData:
+    def __init__(self):
+        self.objects = _IDCollection(Object)
+        self.armatures = _IDCollection(Armature)
+        self.actions = _IDCollection(Action)
+        self.texts = _IDCollection(Text)
+        self.filepath = ""
+
+    def clear(self):
+        self.__init__()
+
+
+data = BlendData()
+
+
+# ---------------------------------------------------------------------------
+# 上下文、模式切换和 depsgraph
+# ---------------------------------------------------------------------------
+
+class _ViewLayerObjects:
+    def __init__(self):
+        self.active = None
+
+    def __iter__(self):
+        return iter(data.objects)
+
+
+class ViewLayer:
+    def __init__(self):
+        self.objects = _ViewLayerObjects()
+
+    def update(self):
+        _evaluate_depsgraph()
+
+
+class Depsgraph:
+    def update(self):
+        _evaluate_depsgraph()
+
+    @property
+    def objects(self):
+        return list(data.objects)
+
+    def id_type_updated(self, id_type):
+        return True
+
+    @property
+    def updates(self):
+        return []
+
+
+class _CollectionObjects:
+    def __init__(self):
+        self._objects = []
+
+    def __iter__(self):
+        return iter(self._objects)
+
+    def __len__(self):
+        return len(self._objects)
+
+    def link(self, obj):
+        self._objects.append(obj)
+
+    def unlink(self, obj):
+        self._objects.remove(obj)
+
+
+class Collection(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.objects = _CollectionObjects()
+
+
+class Scene(ID):
+    def __init__(self, name="Scene"):
+        super().__init__(name)
+        self.collection = Collection("Scene Collection")
+        self.frame_current = 1
+        self.frame_start = 1
+        self.frame_end = 250
+
+    def frame_set(self, frame, subframe=0.0):
+        self.frame_current = frame
+        _evaluate_depsgraph()
+
+
+class _Timers:
+    def __init__(self):
+        self._timers = []
+
+    def register(self, function, first_interval=0.0, persistent=False):
+        self._timers.append(function)
+
+    def unregister(self, function):
+        self._timers.remove(function)
+
+    def is_registered(self, function):
+        return function in self._timers
+
+
+class _Handlers:
+    def __init__(self):
+        self.depsgraph_update_pre = []
+        self.depsgraph_update_post = []
+        self.load_post = []
+        self.frame_change_post = []
+
+    @staticmethod
+    def persistent(func):
+        return func
+
+
+class _App:
+    def __init__(self):
+        self.handlers = _Handlers()
+        self.timers = _Timers()
+        self.version = (4, 1, 0)
+        self.version_string = "4.1.0 (stand-in)"
+        self.background = True
+        self.binary_path = sys.executable
+
+
+app = _App()
+
+
+class _Event:
+    def __init__(self, type='TIMER', value='NOTHING'):
+        self.type = type
+        self.value = value
+
+
+class WindowManager:
+    def __init__(self):
+        self.progress = None
+        self.windows = []
+
+    def progress_begin(self, min_value, max_value):
+        self.progress = min_value
+
+    def progress_update(self, value):
+        self.progress = value
+
+    def progress_end(self):
+        self.progress = None
+
+    def event_timer_add(self, time_step, window=None):
+        return object()
+
+    def event_timer_remove(self, timer):
+        pass
+
+    def modal_handler_add(self, operator):
+        return True
+
+
+class Context:
+    def __init__(self):
+        self.scene = Scene()
+        self.view_layer = ViewLayer()
+        self.window_manager = WindowManager()
+        self.window = None
+        self.area = None
+        self.region = None
+
+    @property
+    def object(self):
+        return self.view_layer.objects.active
+
+    active_object = object
+
+    @property
+    def mode(self):
+        obj = self.object
+        if obj is None or obj.mode == 'OBJECT':
+            return 'OBJECT'
+        return {'EDIT': 'EDIT_ARMATURE', 'POSE': 'POSE'}.get(obj.mode, obj.mode)
+
+    @property
+    def selected_objects(self):
+        return [obj for obj in data.objects if obj.select_get()]
+
+    def evaluated_depsgraph_get(self):
+        return Depsgraph()
+
+
+context = Context()
+
+
+def _evaluate_depsgraph():
+    STATS['evaluations'] += 1
+    for obj in data.objects:
+        if obj.type == 'ARMATURE' and not obj.data.is_editmode:
+            _evaluate_pose(obj.pose)
+    depsgraph = Depsgraph()
+    for handler in list(app.handlers.depsgraph_update_post):
+        handler(context.scene, depsgraph)
+
+
+class _Operator:
+    def __init__(self, func, poll=None):
+        self._func = func
+        self._poll = poll
+
+    def __call__(self, *args, **kwargs):
+        return self._func(*args, **kwargs)
+
+    def poll(self):
+        return self._poll() if self._poll else True
+
+
+def _mode_set(mode='OBJECT', toggle=False):
+    obj = context.view_layer.objects.active
+    if obj is None:
+        raise RuntimeError("Operator bpy.ops.object.mode_set.poll() failed, context is incorrect")
+    if obj.mode == mode:
+        return {'FINISHED'}
+    if mode == 'EDIT' and obj.type != 'ARMATURE':
+        raise TypeError("mode_set(): enum \"EDIT\" not supported for this object")
+    STATS['mode_switches'] += 1
+    if obj.type == 'ARMATURE':
+        if obj.mode == 'EDIT':
+            obj.data._exit_edit()
+            obj.pose._sync(obj.data)
+            STATS['relations_updates'] += 1
+        if mode == 'EDIT':
+            obj.data._enter_edit()
+    obj.mode = mode
+    return {'FINISHED'}
+
+
+def _relations_update():
+    STATS['relations_updates'] += 1
+    return {'FINISHED'}
+
+
+ops = _pytypes.SimpleNamespace(
+    object=_pytypes.SimpleNamespace(
+        mode_set=_Operator(_mode_set, poll=lambda: context.view_layer.objects.active is not None),
+    ),
+    wm=_pytypes.SimpleNamespace(
+        read_factory_settings=_Operator(lambda **kwargs: reset() or {'FINISHED'}),
+        save_mainfile=_Operator(lambda **kwargs: {'FINISHED'}),
+        open_mainfile=_Operator(lambda **kwargs: {'FINISHED'}),
+    ),
+)
+
+
+# ---------------------------------------------------------------------------
+# 属性与类注册
+# ---------------------------------------------------------------------------
+
+class _PropDef:
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        self.kwargs = kwargs
+        self.attr = None
+
+    def __set_name__(self, owner, name):
+        self.attr = name
+
+    def default(self):
+        if 'default' in self.kwargs:
+            return self.kwargs['default']
+        return {'BOOL': False, 'INT': 0, 'FLOAT': 0.0, 'STRING': '', 'ENUM': None}.get(self.kind)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        store = instance.__dict__.setdefault('_bonect_props', {})
+        if self not in store:
+            if self.kind == 'COLLECTION':
+                store[self] = _StructCollection(self.kwargs['type'])
+            elif self.kind == 'ENUM' and 'default' not in self.kwargs:
+                items = self.kwargs.get('items')
+                store[self] = items[0][0] if isinstance(items, (list, tuple)) and items else None
+            else:
+                store[self] = self.default()
+        return store[self]
+
+    def __set__(self, instance, value):
+        instance.__dict__.setdefault('_bonect_props', {})[self] = value
+        update = self.kwargs.get('update')
+        if update is not None:
+            update(instance, context)
+
+
+def _prop(kind):
+    def factory(**kwargs):
+        return _PropDef(kind, **kwargs)
+    return factory
+
+
+props = _pytypes.SimpleNamespace(
+    BoolProperty=_prop('BOOL'),
+    IntProperty=_prop('INT'),
+    FloatProperty=_prop('FLOAT'),
+    StringProperty=_prop('STRING'),
+    EnumProperty=_prop('ENUM'),
+    PointerProperty=_prop('POINTER'),
+    CollectionProperty=_prop('COLLECTION'),
+    FloatVectorProperty=_prop('FLOAT'),
+    IntVectorProperty=_prop('INT'),
+)
+
+
+class _Registrable:
+    bl_rna = None
+
+    def report(self, level, message):
+        self.__dict__.setdefault('reports', []).append((set(level), message))
+
+
+class Operator(_Registrable):
+    pass
+
+
+class Panel(_Registrable):
+    pass
+
+
+class UIList(_Registrable):
+    pass
+
+
+class AddonPreferences(_Registrable):
+    pass
+
+
+class PropertyGroup(_Registrable):
+    pass
+
+
+_registered = []
+
+
+def _register_class(cls):
+    for name, value in list(getattr(cls, '__annotations__', {}).items()):
+        if isinstance(value, _PropDef):
+            value.attr = name
+            setattr(cls, name, value)
+    _registered.append(cls)
+
+
+def _unregister_class(cls):
+    _registered.remove(cls)
+
+
+utils = _pytypes.SimpleNamespace(register_class=_register_class, unregister_class=_unregister_class)
+path = _pytypes.SimpleNamespace(abspath=lambda p: p)
+
+types = _pytypes.SimpleNamespace(
+    Object=Object,
+    Armature=Armature,
+    Action=Action,
+    Text=Text,
+    Bone=Bone,
+    EditBone=EditBone,
+    PoseBone=PoseBone,
+    Constraint=Constraint,
+    Scene=Scene,
+    Collection=Collection,
+    Context=Context,
+    Operator=Operator,
+    Panel=Panel,
+    UIList=UIList,
+    AddonPreferences=AddonPreferences,
+    PropertyGroup=PropertyGroup,
+    Depsgraph=Depsgraph,
+    **_STRUCTS,
+)
+
+
+# ---------------------------------------------------------------------------
+# 重置
+# ---------------------------------------------------------------------------
+
+def reset():
+    """清空所有数据块、上下文和统计"""
+    global context
+    data.clear()
+    reset_stats()
+    scene_props = context.scene.__dict__.get('_bonect_props', {})
+    context = Context()
+    context.scene.__dict__['_bonect_props'] = {k: v for k, v in scene_props.items() if not isinstance(v, ID)}
+    app.handlers.depsgraph_update_post.clear()
+    this = sys.modules[__name__]
+    this.context = context
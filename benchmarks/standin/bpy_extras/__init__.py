@@ -0,0 +1 @@
+"""bpy_extras 的轻量替身"""
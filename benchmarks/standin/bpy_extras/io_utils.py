@@ -0,0 +1,19 @@
+"""bpy_extras.io_utils 的轻量替身"""
+
+import bpy
+
+
+class ExportHelper:
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH')
+    filepath = ""
+
+    def invoke(self, context, event):
+        return {'RUNNING_MODAL'}
+
+
+class ImportHelper:
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH')
+    filepath = ""
+
+    def invoke(self, context, event):
+        return {'RUNNING_MODAL'}
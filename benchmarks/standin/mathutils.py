@@ -0,0 +1,220 @@
+"""mathutils 的轻量替身，仅实现 BoneCT 与基准测试用到的部分"""
+
+import math
+
+
+class Vector:
+    __slots__ = ("_v",)
+
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._v = [float(v) for v in values]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, index):
+        return self._v[index]
+
+    def __setitem__(self, index, value):
+        self._v[index] = float(value)
+
+    def __repr__(self):
+        return f"Vector(({', '.join(f'{v:.4f}' for v in self._v)}))"
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self._v == other._v
+
+    __hash__ = None
+
+    def _axis(index):
+        return property(
+            lambda self: self._v[index],
+            lambda self, value: self._v.__setitem__(index, float(value)),
+        )
+
+    x = _axis(0)
+    y = _axis(1)
+    z = _axis(2)
+    del _axis
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self._v, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self._v, other))
+
+    def __neg__(self):
+        return Vector(-a for a in self._v)
+
+    def __mul__(self, scalar):
+        if isinstance(scalar, Vector):
+            return Vector(a * b for a, b in zip(self._v, scalar))
+        return Vector(a * scalar for a in self._v)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector(a / scalar for a in self._v)
+
+    def __matmul__(self, other):
+        return self.dot(other)
+
+    def copy(self):
+        return Vector(self._v)
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._v, other))
+
+    def cross(self, other):
+        ax, ay, az = self._v
+        bx, by, bz = other
+        return Vector((ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx))
+
+    @property
+    def length(self):
+        return math.sqrt(self.dot(self))
+
+    def normalized(self):
+        length = self.length
+        return self.copy() if length == 0.0 else self / length
+
+    def to_tuple(self, precision=-1):
+        if precision < 0:
+            return tuple(self._v)
+        return tuple(round(v, precision) for v in self._v)
+
+
+class Matrix:
+    __slots__ = ("_m",)
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = Matrix.Identity(4)._m
+        self._m = [[float(v) for v in row] for row in rows]
+
+    @classmethod
+    def Identity(cls, size):
+        return cls([[1.0 if r == c else 0.0 for c in range(size)] for r in range(size)])
+
+    @classmethod
+    def Translation(cls, vector):
+        m = cls.Identity(4)
+        for i in range(3):
+            m._m[i][3] = float(vector[i])
+        return m
+
+    def __len__(self):
+        return len(self._m)
+
+    def __iter__(self):
+        return iter(Vector(row) for row in self._m)
+
+    def __getitem__(self, index):
+        return Vector(self._m[index])
+
+    def __repr__(self):
+        return f"Matrix({self._m})"
+
+    def __eq__(self, other):
+        return isinstance(other, Matrix) and self._m == other._m
+
+    __hash__ = None
+
+    def copy(self):
+        return Matrix(self._m)
+
+    def __matmul__(self, other):
+        size = len(self._m)
+        if isinstance(other, Matrix):
+            cols = list(zip(*other._m))
+            return Matrix([[sum(a * b for a, b in zip(row, col)) for col in cols] for row in self._m])
+        values = list(other)
+        if size == 4 and len(values) == 3:
+            values.append(1.0)
+            return Vector(sum(a * b for a, b in zip(row, values)) for row in self._m[:3])
+        return Vector(sum(a * b for a, b in zip(row, values)) for row in self._m)
+
+    def to_3x3(self):
+        return Matrix([row[:3] for row in self._m[:3]])
+
+    def to_4x4(self):
+        m = Matrix.Identity(4)
+        n = len(self._m)
+        for r in range(min(n, 4)):
+            for c in range(min(n, 4)):
+                m._m[r][c] = self._m[r][c]
+        return m
+
+    def transposed(self):
+        return Matrix([list(col) for col in zip(*self._m)])
+
+    def inverted(self):
+        n = len(self._m)
+        a = [row[:] + [1.0 if i == r else 0.0 for i in range(n)] for r, row in enumerate(self._m)]
+        for col in range(n):
+            pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+            if abs(a[pivot][col]) < 1e-12:
+                raise ValueError("matrix does not have an inverse")
+            a[col], a[pivot] = a[pivot], a[col]
+            p = a[col][col]
+            a[col] = [v / p for v in a[col]]
+            for r in range(n):
+                if r != col and a[r][col] != 0.0:
+                    f = a[r][col]
+                    a[r] = [v - f * w for v, w in zip(a[r], a[col])]
+        return Matrix([row[n:] for row in a])
+
+    @property
+    def translation(self):
+        return Vector(row[3] for row in self._m[:3])
+
+    @translation.setter
+    def translation(self, vector):
+        for i in range(3):
+            self._m[i][3] = float(vector[i])
+
+    def flat(self):
+        return [v for row in self._m for v in row]
+
+
+def vec_roll_to_mat3(vec, roll):
+    """与 Blender 的 vec_roll_to_mat3 相同的算法，返回按行存储的 3x3 矩阵"""
+    length = math.sqrt(sum(v * v for v in vec))
+    if length == 0.0:
+        x, y, z = 0.0, 1.0, 0.0
+    else:
+        x, y, z = (v / length for v in vec)
+    theta = 1.0 + y
+    theta_alt = x * x + z * z
+    if theta > 6.1e-3 or theta_alt > 2.5e-4 * 2.5e-4:
+        if theta <= 6.1e-3:
+            theta = theta_alt * 0.5 + theta_alt * theta_alt * 0.125
+        b = [
+            [1.0 - x * x / theta, x, -x * z / theta],
+            [-x, y, -z],
+            [-x * z / theta, z, 1.0 - z * z / theta],
+        ]
+    else:
+        b = [[-1.0, 0.0, 0.0], [0.0, -1.0, 0.0], [0.0, 0.0, 1.0]]
+    r = _axis_angle_to_mat3((x, y, z), roll)
+    return (Matrix(r) @ Matrix(b))
+
+
+def mat3_to_roll(vec, mat3):
+    """由骨骼方向与 3x3 矩阵求 roll，与 Blender 的 mat3_vec_to_roll 一致"""
+    rollmat = vec_roll_to_mat3(vec, 0.0).inverted() @ mat3
+    return math.atan2(rollmat._m[0][2], rollmat._m[2][2])
+
+
+def _axis_angle_to_mat3(axis, angle):
+    x, y, z = axis
+    c, s = math.cos(angle), math.sin(angle)
+    t = 1.0 - c
+    return [
+        [t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+        [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+        [t * x * z - s * y, t * y * z + s * x, t * z * z + c],
+    ]
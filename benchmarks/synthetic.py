@@ -0,0 +1,112 @@
+"""合成骨架
+
+按给定规模生成 MMD 风格的参考骨架和目标骨架：骨骼数量、层级深度、IK 链数量和每根骨骼的约束数量均可配置。
+只使用 bpy 的公开 API，既可在替身环境中运行，也可在真实的 Blender 中运行。
+"""
+
+import math
+import random
+from collections import namedtuple
+
+import bpy
+
+# target_fraction: 目标骨架包含的参考骨骼比例（按创建顺序取前一部分，父骨骼总在其中）
+Scale = namedtuple('Scale', ('bones', 'depth', 'ik_chains', 'constraints_per_bone', 'target_fraction'))
+
+SCALES = {
+    'small': Scale(200, 12, 4, 0.5, 0.7),
+    'mmd': Scale(800, 20, 8, 1.0, 0.6),
+    'large': Scale(3000, 30, 16, 1.5, 0.6),
+}
+
+CONSTRAINT_TYPES = ('COPY_LOCATION', 'COPY_ROTATION', 'COPY_SCALE', 'DAMPED_TRACK', 'LIMIT_ROTATION')
+
+# 生成链状层级时沿用上一根骨骼作为父骨骼的概率
+_CHAIN_PROBABILITY = 0.7
+
+
+def generate_bones(scale, seed=0):
+    """生成骨骼数据 [(名称, 头, 尾, roll, 父骨骼下标)]，父骨骼总在子骨骼之前，层级深度不超过 scale.depth"""
+    rng = random.Random(seed)
+    bones = []
+    depths = []
+    # 深度未达上限、可以作为父骨骼的骨骼
+    eligible = []
+    for i in range(scale.bones):
+        if not bones:
+            parent = -1
+        elif depths[-1] < scale.depth - 1 and rng.random() < _CHAIN_PROBABILITY:
+            parent = i - 1
+        else:
+            parent = rng.choice(eligible)
+        depth = depths[parent] + 1 if parent >= 0 else 0
+        head = bones[parent][2] if parent >= 0 else (0.0, 0.0, 0.0)
+        direction = (rng.uniform(-0.05, 0.05), rng.uniform(-0.05, 0.05), rng.uniform(0.03, 0.12))
+        tail = tuple(h + d for h, d in zip(head, direction))
+        bones.append((f"bone_{i:04d}", head, tail, rng.uniform(-math.pi, math.pi), parent))
+        depths.append(depth)
+        if depth < scale.depth - 1:
+            eligible.append(i)
+    return bones
+
+
+def create_armature(name, bones):
+    """在当前场景中创建骨架物体，一次进入编辑模式创建全部骨骼"""
+    armature = bpy.data.armatures.new(name)
+    obj = bpy.data.objects.new(name, armature)
+    bpy.context.scene.collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    edit_bones = armature.edit_bones
+    created = []
+    for bone_name, head, tail, roll, parent in bones:
+        edit_bone = edit_bones.new(bone_name)
+        edit_bone.head = head
+        edit_bone.tail = tail
+        edit_bone.roll = roll
+        if parent >= 0:
+            edit_bone.parent = created[parent]
+        created.append(edit_bone)
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return obj
+
+
+def add_constraints(obj, bones, scale, ik_targets, seed=0):
+    """为参考骨架添加 IK 约束和 COPY_* / DAMPED_TRACK / LIMIT_ROTATION 约束"""
+    rng = random.Random(seed)
+    pose_bones = obj.pose.bones
+    names = [bone[0] for bone in bones]
+
+    # IK 链：末端骨骼的 IK 约束指向单独的 IK 控制骨骼
+    candidates = [i for i, bone in enumerate(bones) if bone[4] >= 0 and bones[bone[4]][4] >= 0]
+    for ik_target, end in zip(ik_targets, rng.sample(candidates, min(len(ik_targets), len(candidates)))):
+        constraint = pose_bones[names[end]].constraints.new('IK')
+        constraint.target = obj
+        constraint.subtarget = ik_target
+        constraint.chain_count = 2
+
+    whole, fraction = divmod(scale.constraints_per_bone, 1.0)
+    for name in names:
+        for _ in range(int(whole) + (rng.random() < fraction)):
+            c_type = rng.choice(CONSTRAINT_TYPES)
+            constraint = pose_bones[name].constraints.new(c_type)
+            if c_type == 'LIMIT_ROTATION':
+                constraint.use_limit_x = True
+                constraint.min_x = -rng.uniform(0.1, 1.5)
+                constraint.max_x = rng.uniform(0.1, 1.5)
+            else:
+                constraint.target = obj
+                constraint.subtarget = rng.choice(names)
+            constraint.influence = rng.uniform(0.2, 1.0)
+
+
+def make_armatures(scale, seed=0, reference_name="Reference", target_name="Target"):
+    """生成一对参考骨架和目标骨架，返回 (参考骨架, 目标骨架)"""
+    bones = generate_bones(scale, seed)
+    ik_targets = [f"ik_{k:02d}" for k in range(scale.ik_chains)]
+    ik_bones = [(name, (0.2 * k, -0.5, 0.0), (0.2 * k, -0.5, 0.1), 0.0, -1) for k, name in enumerate(ik_targets)]
+    reference = create_armature(reference_name, bones + ik_bones)
+    add_constraints(reference, bones, scale, ik_targets, seed)
+    target = create_armature(target_name, bones[:max(1, int(len(bones) * scale.target_fraction))])
+    return reference, target
+
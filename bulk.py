@@ -0,0 +1,293 @@
+"""批量骨骼数据
+
+用 foreach_get / foreach_set 和 NumPy 数组一次性读写骨骼的头、尾和 roll，
+代替逐骨骼的 Vector 复制与赋值。
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .hierarchy import HierarchyIndex
+from .incremental import BONE_TAG, IK_TARGET_TAG
+
+# names: 骨骼名列表；heads / tails: (n, 3)；rolls: (n,)；parents: (n,) 父骨骼下标，-1 表示无父骨骼；
+# external_parents: {下标: 父骨骼名}，记录父骨骼不在本组数据中的骨骼（如只含部分骨骼的结构字典）
+BoneArrays = namedtuple('BoneArrays', ('names', 'heads', 'tails', 'rolls', 'parents', 'external_parents'),
+                        defaults=(None,))
+
+IK_END_TAIL_OFFSET = np.array((0.05, 0.0, 0.0), dtype=np.float32)
+IK_TARGET_TAIL_OFFSET = np.array((0.1, 0.0, 0.0), dtype=np.float32)
+
+# 与 Blender vec_roll_to_mat3_normalized 相同的精度阈值
+_SAFE_THRESHOLD = 6.1e-3
+_CRITICAL_THRESHOLD_SQUARED = 2.5e-4 * 2.5e-4
+
+
+def _foreach_get(collection, attr, count, width):
+    buffer = np.empty(count * width, dtype=np.float32)
+    collection.foreach_get(attr, buffer)
+    return buffer.reshape(count, width) if width > 1 else buffer
+
+
+def _roll_base_matrices(heads, tails):
+    """roll 为 0 时的静止姿态 3x3 矩阵（按行存储，与 vec_roll_to_mat3_normalized 相同）"""
+    vec = (tails - heads).astype(np.float64)
+    length = np.linalg.norm(vec, axis=1)
+    length[length == 0.0] = 1.0
+    x, y, z = (vec / length[:, None]).T
+
+    # roll 为 0 时的基准矩阵（按行存储）
+    theta = 1.0 + y
+    theta_alt = x * x + z * z
+    regular = (theta > _SAFE_THRESHOLD) | (theta_alt > _CRITICAL_THRESHOLD_SQUARED)
+    theta = np.where(theta <= _SAFE_THRESHOLD, theta_alt * 0.5 + theta_alt * theta_alt * 0.125, theta)
+    theta[~regular] = 1.0
+    base = np.empty((len(vec), 3, 3))
+    base[:, 0, 0] = 1.0 - x * x / theta
+    base[:, 0, 1] = x
+    base[:, 0, 2] = -x * z / theta
+    base[:, 1, 0] = -x
+    base[:, 1, 1] = y
+    base[:, 1, 2] = -z
+    base[:, 2, 0] = -x * z / theta
+    base[:, 2, 1] = z
+    base[:, 2, 2] = 1.0 - z * z / theta
+    base[~regular] = np.diag((-1.0, -1.0, 1.0))
+    return base
+
+
+def rest_matrices_to_rolls(heads, tails, matrices):
+    """由骨骼方向和静止姿态 3x3 矩阵批量计算 roll（mat3_vec_to_roll 的向量化版本）"""
+    base = _roll_base_matrices(heads, tails)
+    # 基准矩阵为正交矩阵，转置即为逆矩阵
+    roll_matrices = np.matmul(base.transpose(0, 2, 1), matrices[:, :3, :3])
+    return np.arctan2(roll_matrices[:, 0, 2], roll_matrices[:, 2, 2]).astype(np.float32)
+
+
+def rolls_to_rest_matrices(heads, tails, rolls):
+    """由骨骼方向和 roll 批量计算静止姿态 3x3 矩阵（按行存储，rest_matrices_to_rolls 的逆运算）"""
+    rolls = np.asarray(rolls, dtype=np.float64)
+    cos, sin = np.cos(rolls), np.sin(rolls)
+    # 绕骨骼 Y 轴旋转 roll
+    roll_matrices = np.zeros((len(rolls), 3, 3))
+    roll_matrices[:, 0, 0] = cos
+    roll_matrices[:, 0, 2] = sin
+    roll_matrices[:, 1, 1] = 1.0
+    roll_matrices[:, 2, 0] = -sin
+    roll_matrices[:, 2, 2] = cos
+    return np.matmul(_roll_base_matrices(heads, tails), roll_matrices)
+
+
+def read_bone_arrays(armature, names=None):
+    """用 foreach_get 读取 armature.data.bones 的静止姿态数据
+
+    给定 names 时只逐根读取这些骨骼（开销与 names 的数量成正比），names 须包含每根骨骼的父骨骼。
+    """
+    bones = armature.data.bones
+    if names is not None:
+        return _read_bone_subset(bones, names)
+    count = len(bones)
+    names = bones.keys()
+    heads = _foreach_get(bones, 'head_local', count, 3)
+    tails = _foreach_get(bones, 'tail_local', count, 3)
+    # RNA 矩阵按列主序展开，转置后为按行存储
+    matrices = _foreach_get(bones, 'matrix_local', count, 16).reshape(count, 4, 4).transpose(0, 2, 1)
+    rolls = rest_matrices_to_rolls(heads, tails, matrices)
+
+    index = {name: i for i, name in enumerate(names)}
+    parents = np.fromiter(
+        (index[bone.parent.name] if bone.parent else -1 for bone in bones),
+        dtype=np.int32, count=count,
+    )
+    return BoneArrays(names, heads, tails, rolls, parents)
+
+
+def _read_bone_subset(bones, names):
+    names = list(names)
+    subset = [bones[name] for name in names]
+    count = len(subset)
+    heads = np.array([tuple(bone.head_local) for bone in subset], dtype=np.float32).reshape(count, 3)
+    tails = np.array([tuple(bone.tail_local) for bone in subset], dtype=np.float32).reshape(count, 3)
+    # mathutils 矩阵按行迭代
+    matrices = np.array([[tuple(row) for row in bone.matrix_local] for bone in subset], dtype=np.float32).reshape(count, 4, 4)
+    rolls = rest_matrices_to_rolls(heads, tails, matrices)
+
+    index = {name: i for i, name in enumerate(names)}
+    parents = np.fromiter(
+        (index[bone.parent.name] if bone.parent else -1 for bone in subset),
+        dtype=np.int32, count=count,
+    )
+    return BoneArrays(names, heads, tails, rolls, parents)
+
+
+def bone_arrays_from_structure(bone_structure):
+    """由骨骼结构字典构建 BoneArrays"""
+    names = list(bone_structure)
+    count = len(names)
+    index = {name: i for i, name in enumerate(names)}
+    heads = np.array([tuple(data['head']) for data in bone_structure.values()], dtype=np.float32).reshape(count, 3)
+    tails = np.array([tuple(data['tail']) for data in bone_structure.values()], dtype=np.float32).reshape(count, 3)
+    rolls = np.fromiter((data['roll'] for data in bone_structure.values()), dtype=np.float32, count=count)
+    parents = np.fromiter(
+        (index.get(data['parent'], -1) if data['parent'] else -1 for data in bone_structure.values()),
+        dtype=np.int32, count=count,
+    )
+    external_parents = {
+        i: data['parent'] for i, data in enumerate(bone_structure.values())
+        if data['parent'] and data['parent'] not in index
+    }
+    return BoneArrays(names, heads, tails, rolls, parents, external_parents or None)
+
+
+def bone_structure_from_arrays(arrays, vector_type=tuple):
+    """由 BoneArrays 构建骨骼结构字典"""
+    names = arrays.names
+    heads = arrays.heads.tolist()
+    tails = arrays.tails.tolist()
+    rolls = arrays.rolls.tolist()
+    parents = arrays.parents.tolist()
+    return {
+        name: {
+            'head': vector_type(heads[i]),
+            'tail': vector_type(tails[i]),
+            'roll': rolls[i],
+            'parent': names[parents[i]] if parents[i] >= 0 else None,
+        }
+        for i, name in enumerate(names)
+    }
+
+
+def missing_mask(names, existing_names):
+    """返回 names 中不在 existing_names 里的布尔掩码"""
+    names = np.asarray(names, dtype=str)
+    if not len(names):
+        return np.zeros(0, dtype=bool)
+    existing_names = list(existing_names)
+    if not existing_names:
+        return np.ones(len(names), dtype=bool)
+    return ~np.isin(names, np.asarray(existing_names, dtype=str))
+
+
+def _parent_name(arrays, i, bone_mapping):
+    parent_index = arrays.parents[i]
+    if parent_index >= 0:
+        parent_name = arrays.names[parent_index]
+    elif arrays.external_parents:
+        parent_name = arrays.external_parents.get(i)
+    else:
+        parent_name = None
+    if parent_name and bone_mapping:
+        parent_name = bone_mapping.get(parent_name, parent_name)
+    return parent_name
+
+
+def create_bones_bulk(edit_bones, arrays, indices=None, ik_end_bones=None, bone_mapping=None, hierarchy=None,
+                      updates=None, fingerprints=None, ik_lengths=None):
+    """在编辑模式下批量创建 arrays 中缺失的骨骼，返回创建的骨骼名列表
+
+    按层级索引的拓扑顺序单次遍历创建骨骼并立即设置父骨骼（父骨骼总是已存在），
+    再用三次 foreach_set 写入所有头、尾和 roll；
+    bone_mapping 用于把父骨骼名转换为目标骨架中名称不同的对应骨骼。
+    updates 为需要就地更新几何和父骨骼的已有骨骼下标，与新骨骼在同一次写入中完成；
+    给定 fingerprints 时把新建和更新骨骼的几何指纹写入骨骼的自定义属性。
+    ik_lengths 为按参考骨骼下标的IK目标骨骼长度（见 align.ik_target_lengths）：给定时IK链末端骨骼使用 arrays 中的几何，
+    IK目标骨骼沿末端骨骼方向放置；否则按固定的默认方向和长度创建。
+    """
+    if indices is None:
+        indices = np.arange(len(arrays.names))
+    indices = np.asarray(indices, dtype=np.int64)
+    names = np.asarray(arrays.names, dtype=str)
+    if len(indices):
+        indices = indices[missing_mask(names[indices], edit_bones.keys())]
+    updates = np.asarray(updates if updates is not None else (), dtype=np.int64)
+    if not len(indices) and not len(updates):
+        return []
+    if hierarchy is None:
+        hierarchy = HierarchyIndex.from_arrays(arrays)
+    indices = hierarchy.topological(indices)
+
+    first_new = len(edit_bones)
+    lookup = {bone.name: bone for bone in edit_bones}
+    positions = {name: row for row, name in enumerate(lookup)}
+    created_bones = []
+    for i in indices.tolist():
+        new_bone = edit_bones.new(arrays.names[i])
+        lookup[new_bone.name] = new_bone
+        created_bones.append(new_bone.name)
+        if fingerprints is not None:
+            new_bone[BONE_TAG] = fingerprints[i]
+        parent_name = _parent_name(arrays, i, bone_mapping)
+        if parent_name:
+            parent = lookup.get(parent_name)
+            if parent is not None:
+                new_bone.parent = parent
+
+    # 已有骨骼就地更新父骨骼
+    update_rows = []
+    update_indices = []
+    for i in updates.tolist():
+        target_name = bone_mapping.get(arrays.names[i], arrays.names[i]) if bone_mapping else arrays.names[i]
+        row = positions.get(target_name)
+        if row is None:
+            continue
+        bone = lookup[target_name]
+        parent_name = _parent_name(arrays, i, bone_mapping)
+        parent = lookup.get(parent_name) if parent_name else None
+        if parent is not bone and bone.parent != parent:
+            bone.parent = parent
+        if fingerprints is not None:
+            bone[BONE_TAG] = fingerprints[i]
+        update_rows.append(row)
+        update_indices.append(i)
+
+    # IK链末端骨骼额外创建IK目标骨骼
+    is_ik_end = np.isin(names[indices], list(ik_end_bones)) if ik_end_bones else np.zeros(len(indices), dtype=bool)
+    ik_target_rows = []
+    for row, i in enumerate(indices[is_ik_end]):
+        ik_target_name = f"{arrays.names[i]}_IK_Target"
+        if ik_target_name not in edit_bones:
+            ik_target_rows.append(np.flatnonzero(is_ik_end)[row])
+            ik_target = edit_bones.new(ik_target_name)
+            if fingerprints is not None:
+                ik_target[BONE_TAG] = IK_TARGET_TAG
+            created_bones.append(ik_target.name)
+
+    count = len(edit_bones)
+    heads = _foreach_get(edit_bones, 'head', count, 3)
+    tails = _foreach_get(edit_bones, 'tail', count, 3)
+    rolls = _foreach_get(edit_bones, 'roll', count, 1)
+
+    rows = np.arange(first_new, first_new + len(indices))
+    if ik_lengths is None:
+        # IK链末端骨骼以新骨骼默认的尾部为头部，并设置默认长度和方向
+        heads[rows] = np.where(is_ik_end[:, None], tails[rows], arrays.heads[indices])
+        tails[rows] = np.where(is_ik_end[:, None], heads[rows] + IK_END_TAIL_OFFSET, arrays.tails[indices])
+    else:
+        heads[rows] = arrays.heads[indices]
+        tails[rows] = arrays.tails[indices]
+    rolls[rows] = arrays.rolls[indices]
+    if ik_target_rows:
+        target_rows = np.arange(first_new + len(indices), count)
+        end_rows = rows[ik_target_rows]
+        heads[target_rows] = tails[end_rows]
+        if ik_lengths is None:
+            tails[target_rows] = heads[target_rows] + IK_TARGET_TAIL_OFFSET
+        else:
+            # 沿IK链末端骨骼方向，长度与IK链长度成比例；末端骨骼长度为 0 时沿默认方向
+            directions = (tails[end_rows] - heads[end_rows]).astype(np.float64)
+            norms = np.linalg.norm(directions, axis=1)
+            default = IK_TARGET_TAIL_OFFSET / np.linalg.norm(IK_TARGET_TAIL_OFFSET)
+            directions = np.where(norms[:, None] > 0.0, directions / np.maximum(norms, 1e-12)[:, None], default)
+            lengths = np.asarray(ik_lengths, dtype=np.float64)[indices[ik_target_rows]]
+            lengths = np.where(lengths > 0.0, lengths, np.linalg.norm(IK_TARGET_TAIL_OFFSET))
+            tails[target_rows] = heads[target_rows] + directions * lengths[:, None]
+    if update_rows:
+        heads[update_rows] = arrays.heads[update_indices]
+        tails[update_rows] = arrays.tails[update_indices]
+        rolls[update_rows] = arrays.rolls[update_indices]
+
+    edit_bones.foreach_set('head', heads.ravel())
+    edit_bones.foreach_set('tail', tails.ravel())
+    edit_bones.foreach_set('roll', rolls)
+    return created_bones
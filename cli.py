@@ -0,0 +1,205 @@
+"""命令行入口
+
+在 `blender -b` 中对当前打开的 .blend 文件执行传递，包装 transfer_constraints_batch：
+参考可以是文件中的骨架，也可以是导出的参考模板；目标默认为参考之外的所有骨架。
+结果（每个目标的状态和数量、日志的阶段耗时和计数器）可写入 JSON 文件，供 farm/coordinator.py 汇总。
+
+退出状态：0 全部目标成功，1 部分目标失败，2 参数错误或无法开始传递。
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import bpy
+
+from . import extract_reference_data, scope_reference_data, transfer_constraints_batch, verify_transfer
+from .log import LEVELS, TransferLog
+from .mapping import get_normalizer
+from .scope import Scope
+from .template import load_template
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_ERROR = 2
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="bonect", description="Transfer BoneCT constraints in the open .blend file")
+    reference = parser.add_mutually_exclusive_group(required=True)
+    reference.add_argument('--template', help="Reference template exported by BoneCT")
+    reference.add_argument('--reference', help="Name of the reference armature object in the open file")
+    parser.add_argument('--target', action='append', help="Target armature object name (default: every other armature)")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument('--bones', help="Only transfer these reference bones (comma separated) and their children")
+    scope.add_argument('--ik-chain', help="Only transfer the IK chain ending at this reference bone")
+    scope.add_argument('--collections', help="Only transfer bones in these bone collections (comma separated)")
+    scope.add_argument('--patterns', help="Only transfer bones matching these wildcard patterns (comma separated)")
+    parser.add_argument('--no-ik-bones', action='store_true', help="Do not transfer IK bones and their constraints")
+    parser.add_argument('--missing-bones', action='store_true', help="Also transfer other missing bones and constraints")
+    parser.add_argument('--full', action='store_true', help="Add every constraint instead of only applying changes")
+    parser.add_argument('--no-align', action='store_true', help="Copy reference bone positions instead of fitting them to the target")
+    parser.add_argument('--per-limb-scale', action='store_true', help="Also scale created bones per limb when fitting")
+    parser.add_argument('--translations', help="Text file with extra 'Japanese = English' bone name translations")
+    parser.add_argument('--aliases', help="Text file with 'reference bone = target bone' aliases")
+    parser.add_argument('--verify', type=int, default=0, metavar='POSES',
+                        help="After transferring, compare reference and target over this many sampled poses "
+                             "(needs --reference)")
+    parser.add_argument('--log-level', choices=sorted(LEVELS, key=LEVELS.get), default='WARNING')
+    parser.add_argument('--save', action='store_true', help="Save the .blend file when a target was changed")
+    parser.add_argument('--result', help="Write the result as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def read_text_file(filepath):
+    if not filepath:
+        return ''
+    with open(filepath, encoding='utf-8') as f:
+        return f.read()
+
+
+def get_scope(args):
+    """根据参数返回传递范围；未指定时返回 None"""
+    if args.bones:
+        return Scope('SELECTED', [name.strip() for name in args.bones.split(',') if name.strip()])
+    if args.ik_chain:
+        return Scope('IK_CHAIN', args.ik_chain)
+    if args.collections:
+        return Scope('COLLECTION', args.collections)
+    if args.patterns:
+        return Scope('PATTERN', args.patterns)
+    return None
+
+
+def get_target_armatures(names, reference_armature):
+    """按名称获取目标骨架；未指定时返回参考骨架之外的所有骨架"""
+    if names:
+        missing = [name for name in names if name not in bpy.data.objects]
+        if missing:
+            raise RuntimeError(f"Objects not found: {', '.join(missing)}")
+        return [bpy.data.objects[name] for name in names]
+    return [obj for obj in bpy.data.objects if obj.type == 'ARMATURE' and obj != reference_armature]
+
+
+def summarize_result(result):
+    """把批量传递的单个目标结果中的骨骼列表换算为数量"""
+    return {
+        'target': result['target'],
+        'status': result['status'],
+        'created_bones': len(result['created_bones']),
+        'updated_bones': len(result['updated_bones']),
+        'constrained_bones': result['constrained_bones'],
+        'constraints': result['constraints'],
+        'removed_constraints': result['removed_constraints'],
+        'error': result['error'],
+    }
+
+
+def summarize_verification(report):
+    """验证报告中只保留汇总和偏差骨骼名"""
+    return {
+        'status': report['status'],
+        'poses': report['poses'],
+        'max_angle': report['max_angle'],
+        'max_location': report['max_location'],
+        'deviating_bones': [entry['bone'] for entry in report['bones']],
+        'source_bones': [entry['bone'] for entry in report['bones'] if entry['source']],
+        'missing_constraints': [f"{entry['bone']}: {entry['constraint']}" for entry in report['constraints']
+                                if not entry['present']],
+    }
+
+
+def run(args):
+    """执行传递并返回 (退出状态, 结果字典)"""
+    start = time.perf_counter()
+    log = TransferLog(args.log_level)
+    output = {
+        'file': bpy.data.filepath,
+        'status': 'FAILED',
+        'targets': [],
+        'saved': False,
+        'error': None,
+    }
+    try:
+        scope = get_scope(args)
+        if args.template:
+            with log.phase('extraction'):
+                reference = load_template(args.template)
+                if scope is not None:
+                    reference = scope_reference_data(reference, scope)
+            reference_armature = None
+        else:
+            reference_armature = bpy.data.objects.get(args.reference)
+            if reference_armature is None or reference_armature.type != 'ARMATURE':
+                raise RuntimeError(f"Reference armature '{args.reference}' not found.")
+            reference = extract_reference_data(reference_armature, log, scope) if scope is not None else reference_armature
+        targets = get_target_armatures(args.target, reference_armature)
+        if not targets:
+            raise RuntimeError("No target armatures found.")
+        normalizer = get_normalizer(read_text_file(args.translations), read_text_file(args.aliases))
+    except Exception as e:
+        output['error'] = str(e)
+        log.error("%s", e)
+        output['seconds'] = round(time.perf_counter() - start, 3)
+        output['log'] = log.to_dict()
+        return EXIT_ERROR, output
+
+    results = transfer_constraints_batch(
+        reference,
+        targets,
+        transfer_ik_bones=not args.no_ik_bones,
+        transfer_missing_bones=args.missing_bones,
+        normalizer=normalizer,
+        incremental=not args.full,
+        log=log,
+        align=not args.no_align,
+        per_limb_scale=args.per_limb_scale,
+    )
+    output['targets'] = [summarize_result(result) for result in results]
+    if args.verify:
+        if reference_armature is None:
+            log.warning("Verification needs a reference armature; skipped for the template reference.")
+        else:
+            for result, target in zip(results, output['targets']):
+                if result['status'] != 'FINISHED':
+                    continue
+                try:
+                    target['verification'] = summarize_verification(verify_transfer(
+                        reference_armature, bpy.data.objects[result['target']], normalizer, poses=args.verify, log=log))
+                except Exception as e:
+                    target['verification'] = {'status': 'FAILED', 'error': str(e)}
+                    log.error("Verification of %s failed: %s", result['target'], e)
+    failed = [result for result in results if result['status'] != 'FINISHED']
+    output['status'] = 'FINISHED' if not failed else ('PARTIAL' if len(failed) < len(results) else 'FAILED')
+
+    changed = any(result['created_bones'] or result['updated_bones'] or result['constraints'] or result['removed_constraints']
+                  for result in results)
+    if args.save and changed and len(failed) < len(results):
+        try:
+            bpy.ops.wm.save_mainfile()
+            output['saved'] = True
+        except RuntimeError as e:
+            output['status'] = 'FAILED'
+            output['error'] = f"Could not save the file: {e}"
+            log.error("%s", output['error'])
+
+    output['seconds'] = round(time.perf_counter() - start, 3)
+    output['log'] = log.to_dict()
+    if output['status'] == 'FINISHED':
+        return EXIT_OK, output
+    return (EXIT_PARTIAL if output['status'] == 'PARTIAL' else EXIT_ERROR), output
+
+
+def main(argv=None):
+    if argv is None:
+        # 在 Blender 中运行时，脚本参数位于 "--" 之后
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    args = parse_args(argv)
+    status, output = run(args)
+    targets = ', '.join(f"{target['target']} {target['status']}" for target in output['targets'])
+    print(f"BoneCT {output['status']}: {output['file']} [{targets}] {output['error'] or ''}".rstrip())
+    if args.result:
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+    return status
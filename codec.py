@@ -0,0 +1,166 @@
+"""约束编解码
+
+按约束类型从 rna_type.properties 构建一次可写属性表并缓存，
+将约束编码为紧凑记录；应用时按属性表逐项写入，每个属性只写一次，与当前值相同的属性跳过。
+"""
+
+from collections import namedtuple
+
+import bpy
+from mathutils import Matrix
+
+# 约束记录：fields 为同类型约束共享的属性名元组，values 与之一一对应
+ConstraintRecord = namedtuple('ConstraintRecord', ('type', 'fields', 'values'))
+
+# 属性表条目：kind 为 VALUE / ENUM / ENUM_FLAG / ARRAY / MATRIX / POINTER / COLLECTION
+Field = namedtuple('Field', ('identifier', 'kind', 'detail'))
+
+# 指向约束所属骨架自身的指针（ID 名称不可能为空字符串）
+SELF = ''
+
+# 可编码的 ID 指针类型及其在 bpy.data 中的集合名
+ID_COLLECTIONS = {
+    'Object': 'objects',
+    'Action': 'actions',
+    'Armature': 'armatures',
+    'Mesh': 'meshes',
+    'Curve': 'curves',
+    'Text': 'texts',
+    'Image': 'images',
+    'Scene': 'scenes',
+    'Collection': 'collections',
+    'MovieClip': 'movieclips',
+}
+
+# 骨骼名属性与其所属指针属性的对应关系
+SUBTARGET_POINTERS = {
+    'subtarget': 'target',
+    'pole_subtarget': 'pole_target',
+    'space_subtarget': 'space_object',
+}
+
+_SKIPPED_PROPERTIES = {'rna_type', 'type', 'is_override_data_editable'}
+
+# 先写指针，再写普通值，最后写矩阵和子集合（如 Child Of 的逆矩阵依赖目标已设置）
+_KIND_ORDER = {'POINTER': 0, 'VALUE': 1, 'ENUM': 1, 'ENUM_FLAG': 1, 'ARRAY': 2, 'MATRIX': 2, 'COLLECTION': 3}
+
+_schema_cache = {}
+
+
+def _field_kind(prop):
+    if prop.type == 'COLLECTION':
+        return 'COLLECTION'
+    if prop.is_readonly:
+        return None
+    if prop.type == 'POINTER':
+        return 'POINTER' if prop.fixed_type.identifier in ID_COLLECTIONS else None
+    if prop.type == 'ENUM':
+        return 'ENUM_FLAG' if getattr(prop, 'is_enum_flag', False) else 'ENUM'
+    if getattr(prop, 'array_length', 0):
+        return 'MATRIX' if prop.subtype == 'MATRIX' else 'ARRAY'
+    return 'VALUE'
+
+
+def get_schema(struct):
+    """返回结构体类型的可写属性表，按 RNA 类型缓存"""
+    rna = struct.rna_type
+    schema = _schema_cache.get(rna.identifier)
+    if schema is None:
+        fields = []
+        for prop in rna.properties:
+            if prop.identifier in _SKIPPED_PROPERTIES:
+                continue
+            kind = _field_kind(prop)
+            if kind is None:
+                continue
+            detail = ID_COLLECTIONS[prop.fixed_type.identifier] if kind == 'POINTER' else None
+            fields.append(Field(prop.identifier, kind, detail))
+        fields.sort(key=lambda field: _KIND_ORDER[field.kind])
+        schema = (tuple(fields), tuple(field.identifier for field in fields), {field.identifier: field for field in fields})
+        _schema_cache[rna.identifier] = schema
+    return schema
+
+
+def clear_schema_cache():
+    _schema_cache.clear()
+
+
+def _encode_struct(struct, owner):
+    fields, identifiers, _ = get_schema(struct)
+    values = []
+    for field in fields:
+        value = getattr(struct, field.identifier)
+        kind = field.kind
+        if kind == 'POINTER':
+            value = None if value is None else (SELF if value == owner else value.name)
+        elif kind == 'ENUM_FLAG':
+            value = tuple(sorted(value))
+        elif kind == 'MATRIX':
+            value = tuple(v for row in value for v in row)
+        elif kind == 'ARRAY':
+            value = tuple(value)
+        elif kind == 'COLLECTION':
+            value = tuple(_encode_struct(item, owner) for item in value)
+        values.append(value)
+    return identifiers, tuple(values)
+
+
+def encode_constraint(constraint, owner):
+    """将约束编码为 ConstraintRecord；指向 owner 骨架自身的指针记为 SELF"""
+    identifiers, values = _encode_struct(constraint, owner)
+    return ConstraintRecord(constraint.type, identifiers, values)
+
+
+def _decode_struct(struct, identifiers, values, target_armature, bone_mapping, bone_names, failures):
+    _, _, by_identifier = get_schema(struct)
+    self_pointers = set()
+    for identifier, value in zip(identifiers, values):
+        field = by_identifier.get(identifier)
+        if field is None:
+            continue
+        kind = field.kind
+        try:
+            if kind == 'POINTER':
+                if value == SELF:
+                    value = target_armature
+                    self_pointers.add(identifier)
+                elif value is not None:
+                    pointer = getattr(bpy.data, field.detail).get(value)
+                    if pointer is None:
+                        failures.append((identifier, f"'{value}' not found in bpy.data.{field.detail}"))
+                        continue
+                    value = pointer
+            elif kind == 'COLLECTION':
+                collection = getattr(struct, identifier)
+                collection.clear()
+                for item_identifiers, item_values in value:
+                    _decode_struct(collection.new(), item_identifiers, item_values,
+                                   target_armature, bone_mapping, bone_names, failures)
+                continue
+            elif kind == 'ENUM_FLAG':
+                value = set(value)
+            elif kind == 'MATRIX':
+                value = Matrix([value[i:i + 4] for i in range(0, 16, 4)])
+            elif kind == 'ARRAY':
+                value = tuple(value)
+            elif identifier in SUBTARGET_POINTERS and value and SUBTARGET_POINTERS[identifier] in self_pointers:
+                # 子目标骨骼名通过骨骼映射转换为目标骨架中的骨骼
+                mapped = bone_mapping.get(value) if bone_mapping is not None else value
+                if not mapped or (bone_names is not None and mapped not in bone_names):
+                    failures.append((identifier, f"Subtarget bone '{value}' not found in the target armature"))
+                    continue
+                value = mapped
+            # 与当前值相同的属性不再写入：每次写入都会触发 RNA 更新回调并标记依赖关系
+            current = getattr(struct, identifier)
+            if (tuple(current) if kind == 'ARRAY' else current) == value:
+                continue
+            setattr(struct, identifier, value)
+        except (AttributeError, TypeError, ValueError) as e:
+            failures.append((identifier, str(e)))
+
+
+def decode_constraint(constraint, record, target_armature, bone_mapping=None, bone_names=None):
+    """将记录写入约束，返回无法写入的属性列表 [(属性名, 原因)]"""
+    failures = []
+    _decode_struct(constraint, record.fields, record.values, target_armature, bone_mapping, bone_names, failures)
+    return failures
@@ -0,0 +1,75 @@
+"""延迟依赖图更新
+
+Blender 执行 Python 代码时不会在每次修改后立即重建关系或求值，修改只标记依赖图；代码块内真正触发求值的是
+切换模式等操作，它们会调用 depsgraph 处理器。因此这里推迟的是：
+- 本插件自己的 depsgraph 处理器（如预览缓存失效），在代码块内暂停，退出时恢复；其他插件的处理器不受影响；
+- 被修改物体的更新标记和求值：foreach_set 等批量写入不会标记更新，退出最外层时对由 mark_updated 登记的物体
+  只标记一次，并只做一次关系更新和求值，使之后读取的矩阵是最新的；没有修改时不求值。
+可以嵌套使用（如批量传递中的每个目标），只有最外层在退出时更新。
+"""
+
+from contextlib import contextmanager
+
+import bpy
+
+_HANDLER_LISTS = ('depsgraph_update_pre', 'depsgraph_update_post')
+
+# 本插件的包名，用于区分本插件注册的处理器
+_PACKAGE = __name__.rpartition('.')[0]
+
+_depth = 0
+_pending_objects = []
+
+
+@contextmanager
+def deferred_updates(enabled=True, log=None):
+    """在代码块内暂停本插件的 depsgraph 处理器，退出最外层时恢复处理器并统一更新由 mark_updated 登记的物体"""
+    global _depth
+    if not enabled:
+        yield
+        return
+
+    handlers = bpy.app.handlers
+    suspended = {}
+    if _depth == 0:
+        for name in _HANDLER_LISTS:
+            handler_list = getattr(handlers, name)
+            own = [(i, handler) for i, handler in enumerate(handler_list) if _is_own_handler(handler)]
+            for _, handler in own:
+                handler_list.remove(handler)
+            suspended[name] = own
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        if _depth == 0:
+            for name, own in suspended.items():
+                handler_list = getattr(handlers, name)
+                # 放回原来的位置；暂停期间重新注册过的处理器不重复添加
+                for i, handler in own:
+                    if handler not in handler_list:
+                        handler_list.insert(i, handler)
+
+            pending = list(dict.fromkeys(_pending_objects))
+            _pending_objects.clear()
+            if pending:
+                for obj in pending:
+                    obj.update_tag()
+                if log is not None:
+                    with log.phase('evaluation'):
+                        bpy.context.view_layer.update()
+                    log.count('evaluations')
+                else:
+                    bpy.context.view_layer.update()
+
+
+def _is_own_handler(handler):
+    module = getattr(handler, '__module__', None) or ''
+    return module == _PACKAGE or module.startswith(_PACKAGE + '.')
+
+
+def mark_updated(obj):
+    """登记在延迟更新期间被修改的物体；不在延迟更新代码块内时不做任何事"""
+    if _depth > 0:
+        _pending_objects.append(obj)
@@ -0,0 +1,259 @@
+"""BoneCT 批量处理协调器
+
+把目录或清单中的 .blend 文件分发给一组工作进程（默认每个文件启动一个后台 Blender 运行 farm/worker.py），
+支持单个文件超时、失败重试、中断后继续，并汇总为一个 JSON 报告（每个文件的耗时、状态和数量）。
+
+用法：
+    python farm/coordinator.py characters/ --report report.json -- --template reference.json --save
+    python farm/coordinator.py --manifest files.txt --jobs 4 --timeout 600 --retries 1 -- --reference Reference
+
+"--" 之后的参数原样传给工作进程（即 cli.py 的参数）。--worker-command 可替换工作进程命令，
+其中的 {python}、{blender}、{worker}、{file}、{result} 会被替换，例如不经过 Blender 直接测试协调器：
+    python farm/coordinator.py files/ --worker-command "{python} fake_worker.py {file} --result {result}"
+
+进度按行追加到 --state 文件；再次运行时跳过其中已完成的文件（失败和超时的文件会重新处理）。
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+FARM_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER = os.path.join(FARM_DIR, 'worker.py')
+
+DEFAULT_WORKER_COMMAND = "{blender} -b {file} --factory-startup --python {worker} -- --result {result}"
+
+# 工作进程退出状态：0 全部目标成功，1 部分目标失败（与 cli.py 一致）
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+
+# 已完成的文件不会在继续运行时重新处理；其余状态（FAILED、TIMEOUT）会重试
+DONE_STATUSES = ('FINISHED', 'PARTIAL')
+
+# 报告中按文件汇总的数量
+COUNT_KEYS = ('created_bones', 'updated_bones', 'constrained_bones', 'constraints', 'removed_constraints')
+
+# 失败时保留的工作进程输出行数
+OUTPUT_TAIL_LINES = 20
+
+
+def available_cores():
+    """可用的 CPU 核数（考虑进程的 CPU 亲和性）"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def collect_files(paths, manifest=None, recursive=False):
+    """收集要处理的 .blend 文件的绝对路径，去重并保持顺序
+
+    paths 中的目录会展开为其中的 .blend 文件；manifest 为每行一个路径的文本文件（# 开头为注释），
+    相对路径相对于清单所在目录。
+    """
+    files = []
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    files.append(os.path.join(base, line))
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+        elif recursive:
+            for directory, _, names in sorted(os.walk(path)):
+                files.extend(os.path.join(directory, name) for name in sorted(names) if name.endswith('.blend'))
+        else:
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.blend'))
+    return list(dict.fromkeys(os.path.abspath(path) for path in files))
+
+
+def load_progress(state_path):
+    """读取进度文件 {文件路径: 最后一条记录}；文件不存在时返回空字典，被截断的最后一行会被忽略"""
+    progress = {}
+    if not state_path or not os.path.exists(state_path):
+        return progress
+    with open(state_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            progress[entry['file']] = entry
+    return progress
+
+
+def build_command(template, filepath, result_path, blender, worker_args):
+    """按模板生成工作进程命令，并在末尾追加传给工作进程的参数"""
+    values = {
+        'python': sys.executable,
+        'blender': blender,
+        'worker': WORKER,
+        'file': filepath,
+        'result': result_path,
+    }
+    return [part.format(**values) for part in shlex.split(template)] + list(worker_args)
+
+
+def read_result(result_path):
+    try:
+        with open(result_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def output_tail(output):
+    return (output or '').splitlines()[-OUTPUT_TAIL_LINES:]
+
+
+def summarize_worker_result(result):
+    """把工作进程结果中各目标的数量相加"""
+    counts = dict.fromkeys(COUNT_KEYS, 0)
+    for target in result.get('targets', ()):
+        for key in COUNT_KEYS:
+            counts[key] += target.get(key, 0)
+    return counts
+
+
+def process_file(filepath, options, result_dir, index):
+    """处理单个文件，超时或工作进程异常退出时重试，返回进度记录"""
+    entry = {'file': filepath, 'status': 'FAILED', 'attempts': 0, 'seconds': 0.0, 'error': None}
+    for attempt in range(1, options.retries + 2):
+        result_path = os.path.join(result_dir, f"{index}-{attempt}.json")
+        command = build_command(options.worker_command, filepath, result_path, options.blender, options.worker_args)
+        entry['attempts'] = attempt
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                     errors='replace', timeout=options.timeout)
+        except subprocess.TimeoutExpired as e:
+            entry.update(status='TIMEOUT', seconds=round(time.perf_counter() - start, 3),
+                         error=f"Timed out after {options.timeout:g} s", returncode=None,
+                         output=output_tail(e.stdout.decode('utf-8', 'replace') if isinstance(e.stdout, bytes) else e.stdout))
+            continue
+        except OSError as e:
+            # 工作进程命令本身无法启动，重试没有意义
+            entry.update(status='FAILED', error=f"Could not start the worker: {e}", returncode=None)
+            break
+        entry['seconds'] = round(time.perf_counter() - start, 3)
+        entry['returncode'] = process.returncode
+        result = read_result(result_path)
+        if result is not None and process.returncode in (EXIT_OK, EXIT_PARTIAL):
+            entry.update(status=result['status'], error=result.get('error'), targets=result.get('targets', []),
+                         counts=summarize_worker_result(result), saved=result.get('saved', False),
+                         timings_ms=result.get('log', {}).get('timings_ms', {}))
+            entry.pop('output', None)
+            if result['status'] == 'PARTIAL':
+                entry['error'] = '; '.join(f"{target['target']}: {target['error']}"
+                                           for target in entry['targets'] if target['status'] != 'FINISHED')
+            break
+        # 工作进程能正常结束但无法开始传递（如找不到参考骨架）时结果是确定的，不再重试
+        entry.update(status='FAILED', output=output_tail(process.stdout),
+                     error=(result or {}).get('error') or f"Worker exited with status {process.returncode}")
+        if result is not None:
+            break
+    return entry
+
+
+def build_report(files, progress, started, seconds, options):
+    """汇总所有文件（包括之前运行中已完成的文件）的进度记录"""
+    entries = [progress.get(path, {'file': path, 'status': 'PENDING'}) for path in files]
+    statuses = {}
+    totals = dict.fromkeys(COUNT_KEYS, 0)
+    for entry in entries:
+        statuses[entry['status']] = statuses.get(entry['status'], 0) + 1
+        for key, value in entry.get('counts', {}).items():
+            totals[key] = totals.get(key, 0) + value
+    return {
+        'started': started,
+        'seconds': round(seconds, 3),
+        'jobs': options.jobs,
+        'worker_command': options.worker_command,
+        'worker_args': list(options.worker_args),
+        'statuses': statuses,
+        'totals': totals,
+        'files': entries,
+    }
+
+
+def run(files, options):
+    """用 options.jobs 个工作进程处理 files，返回报告"""
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    start = time.perf_counter()
+    progress = {} if options.restart else load_progress(options.state)
+    pending = [path for path in files if progress.get(path, {}).get('status') not in DONE_STATUSES]
+    skipped = len(files) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} files already completed according to {options.state}")
+
+    state_file = open(options.state, 'w' if options.restart else 'a', encoding='utf-8') if options.state else None
+    try:
+        with tempfile.TemporaryDirectory() as result_dir, ThreadPoolExecutor(max_workers=options.jobs) as executor:
+            futures = {executor.submit(process_file, path, options, result_dir, index): path
+                       for index, path in enumerate(pending)}
+            for done, future in enumerate(as_completed(futures), 1):
+                entry = future.result()
+                progress[entry['file']] = entry
+                if state_file is not None:
+                    # 每个文件完成后立即写入，中断后可从此处继续
+                    state_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    state_file.flush()
+                print(f"[{done}/{len(pending)}] {entry['status']:<8} {entry['seconds']:7.1f} s  {entry['file']}"
+                      + (f"  ({entry['error']})" if entry['error'] else ''))
+    finally:
+        if state_file is not None:
+            state_file.close()
+
+    return build_report(files, progress, started, time.perf_counter() - start, options)
+
+
+def parse_args(argv):
+    if '--' in argv:
+        argv, worker_args = argv[:argv.index('--')], argv[argv.index('--') + 1:]
+    else:
+        worker_args = []
+    parser = argparse.ArgumentParser(description="Run BoneCT over many .blend files with a pool of worker processes")
+    parser.add_argument('paths', nargs='*', help=".blend files or directories containing them")
+    parser.add_argument('--manifest', help="Text file listing one .blend file per line")
+    parser.add_argument('--recursive', action='store_true', help="Also search subdirectories for .blend files")
+    parser.add_argument('--jobs', type=int, default=available_cores(), help="Number of worker processes (default: cores)")
+    parser.add_argument('--timeout', type=float, default=None, help="Seconds after which a worker is killed")
+    parser.add_argument('--retries', type=int, default=1, help="Retries after a timeout or a crashed worker")
+    parser.add_argument('--state', default='bonect_progress.jsonl', help="Progress file used to resume an interrupted run")
+    parser.add_argument('--restart', action='store_true', help="Ignore the progress file and process every file again")
+    parser.add_argument('--report', default='bonect_report.json', help="Consolidated JSON report")
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'), help="Blender executable")
+    parser.add_argument('--worker-command', default=DEFAULT_WORKER_COMMAND,
+                        help="Worker command template; {python}, {blender}, {worker}, {file} and {result} are substituted")
+    options = parser.parse_args(argv)
+    options.worker_args = worker_args
+    if not options.paths and not options.manifest:
+        parser.error("give at least one .blend file, directory or --manifest")
+    options.jobs = max(1, options.jobs)
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    files = collect_files(options.paths, options.manifest, options.recursive)
+    if not files:
+        print("No .blend files found.")
+        return 1
+    report = run(files, options)
+    with open(options.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"{len(files)} files: " + ', '.join(f"{count} {status.lower()}" for status, count in sorted(report['statuses'].items()))
+          + f". Report written to {options.report}")
+    return 0 if set(report['statuses']) <= set(DONE_STATUSES) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
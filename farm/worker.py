@@ -0,0 +1,29 @@
+"""BoneCT 批量处理的工作进程脚本
+
+在 Blender 中对打开的文件运行 cli.main：
+    blender -b character.blend --factory-startup --python farm/worker.py -- --template reference.json --save --result out.json
+
+以独立的包名导入仓库中的插件，不依赖已安装或已启用的 BoneCT。
+"""
+
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_NAME = 'bonect_farm'
+
+
+def load_cli():
+    spec = importlib.util.spec_from_file_location(
+        ADDON_NAME, os.path.join(ROOT, '__init__.py'), submodule_search_locations=[ROOT]
+    )
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_NAME] = addon
+    spec.loader.exec_module(addon)
+    return importlib.import_module(f'{ADDON_NAME}.cli')
+
+
+if __name__ == '__main__':
+    # 以传递的退出状态结束 Blender，协调器据此判断是否需要重试
+    sys.exit(load_cli().main())
@@ -0,0 +1,90 @@
+"""骨骼层级索引
+
+每个骨架只构建一次：父/子数组、深度、拓扑顺序（父骨骼总在子骨骼之前），
+以及按需记忆化的祖先链和祖先闭包。所有集合查询都是关于骨骼数量的线性时间，且不使用递归，层级再深也不会超出递归深度限制。
+"""
+
+import numpy as np
+
+
+class HierarchyIndex:
+    def __init__(self, names, parents):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.parents = np.asarray(parents, dtype=np.int32)
+        count = len(self.names)
+
+        self.children = [[] for _ in range(count)]
+        parent_list = self.parents.tolist()
+        for i, parent in enumerate(parent_list):
+            if parent >= 0:
+                self.children[parent].append(i)
+
+        # 沿父链向上找到第一个已知深度的骨骼，再把深度回填到路径上，总体为线性时间
+        depth = [-1] * count
+        for i in range(count):
+            path = []
+            node = i
+            while node >= 0 and depth[node] < 0:
+                path.append(node)
+                node = parent_list[node]
+            base = depth[node] if node >= 0 else -1
+            for node in reversed(path):
+                base += 1
+                depth[node] = base
+        self.depth = np.asarray(depth, dtype=np.int32)
+        self.order = np.argsort(self.depth, kind='stable')
+
+        self._ancestors = {}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays.names, arrays.parents)
+
+    @classmethod
+    def from_armature(cls, armature):
+        bones = armature.data.bones
+        names = bones.keys()
+        index = {name: i for i, name in enumerate(names)}
+        parents = [index[bone.parent.name] if bone.parent else -1 for bone in bones]
+        return cls(names, parents)
+
+    def indices_of(self, names):
+        """把骨骼名转换为下标数组，忽略不存在的骨骼"""
+        index = self.index
+        return np.fromiter((index[name] for name in names if name in index), dtype=np.int64)
+
+    def ancestors(self, i):
+        """返回骨骼 i 的全部祖先（由近及远），结果记忆化，共享的祖先链只计算一次"""
+        memo = self._ancestors
+        result = memo.get(i)
+        if result is not None:
+            return result
+        # 沿父链向上找到第一个已记忆化的骨骼，再由远及近回填路径上每根骨骼的祖先
+        parents = self.parents
+        path = []
+        node = i
+        while node >= 0 and node not in memo:
+            path.append(node)
+            node = int(parents[node])
+        result = () if node < 0 else (node,) + memo[node]
+        for node in reversed(path):
+            memo[node] = result
+            result = (node,) + result
+        return memo[i]
+
+    def with_ancestors(self, indices):
+        """祖先闭包：返回 indices 及其全部祖先的布尔掩码"""
+        mask = np.zeros(len(self.names), dtype=bool)
+        parents = self.parents
+        for node in np.asarray(indices, dtype=np.int64).tolist():
+            # 遇到已标记的骨骼即停止，每根骨骼最多被访问一次
+            while node >= 0 and not mask[node]:
+                mask[node] = True
+                node = parents[node]
+        return mask
+
+    def topological(self, indices):
+        """把 indices 按拓扑顺序（先父后子）稳定排序"""
+        indices = np.asarray(indices, dtype=np.int64)
+        return indices[np.argsort(self.depth[indices], kind='stable')]
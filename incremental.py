@@ -0,0 +1,221 @@
+"""增量传递
+
+为骨骼几何和编码后的约束计算指纹，并用自定义属性标记由 BoneCT 创建的骨骼和添加的约束。
+再次传递时只比较指纹，得到差异（需要更新的骨骼、缺失/变化/过期的约束）后只应用差异部分；
+目标骨架已是最新时不写入任何数据。
+"""
+
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+
+from .codec import SELF, SUBTARGET_POINTERS, encode_constraint
+
+# 骨骼自定义属性：创建或更新该骨骼时参考骨骼的几何指纹
+BONE_TAG = 'bonect_fingerprint'
+# 姿态骨骼自定义属性：{约束名: 约束指纹}，记录由 BoneCT 添加的约束
+CONSTRAINT_TAG = 'bonect_constraints'
+# IK 目标骨骼没有对应的参考骨骼，使用固定标记
+IK_TARGET_TAG = 'IK_TARGET'
+
+# 比较浮点数时保留的小数位数
+_PRECISION = 5
+
+# missing: [(目标骨骼名, 记录, 指纹)]；changed: [(目标骨骼名, 约束名, 记录, 指纹)]；
+# stale: [(目标骨骼名, 约束名)]；adopted: [(目标骨骼名, 约束名, 指纹)] 为与参考一致但尚未标记的已有约束
+ConstraintDiff = namedtuple('ConstraintDiff', ('missing', 'changed', 'stale', 'adopted', 'unchanged'))
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _round(value):
+    # 加 0.0 使 -0.0 与 0.0 得到相同的指纹
+    return round(value, _PRECISION) + 0.0 if isinstance(value, float) else value
+
+
+def bone_fingerprints(arrays):
+    """批量计算骨骼几何指纹（头、尾、roll 和父骨骼名），返回与 arrays.names 对应的列表"""
+    values = np.round(np.hstack((arrays.heads, arrays.tails, arrays.rolls[:, None])).astype(np.float64), _PRECISION) + 0.0
+    names = arrays.names
+    parents = arrays.parents.tolist()
+    external_parents = arrays.external_parents or {}
+    fingerprints = []
+    for i, row in enumerate(values):
+        parent = names[parents[i]] if parents[i] >= 0 else external_parents.get(i)
+        fingerprints.append(_digest(row.tobytes() + (parent or '').encode('utf-8')))
+    return fingerprints
+
+
+def _is_collection(value):
+    return bool(value) and isinstance(value[0], (tuple, list)) and len(value[0]) == 2 and isinstance(value[0][0], (tuple, list))
+
+
+def _normalize(fields, values, rename):
+    pointers = {identifier: value for identifier, value in zip(fields, values) if identifier in SUBTARGET_POINTERS.values()}
+    items = []
+    for identifier, value in zip(fields, values):
+        if identifier == 'name':
+            continue
+        if isinstance(value, (tuple, list)):
+            if _is_collection(value):
+                value = tuple(_normalize(item_fields, item_values, rename) for item_fields, item_values in value)
+            else:
+                value = tuple(_round(v) for v in value)
+        elif rename and value and identifier in SUBTARGET_POINTERS and pointers.get(SUBTARGET_POINTERS[identifier]) == SELF:
+            value = rename.get(value, value)
+        else:
+            value = _round(value)
+        items.append((identifier, value))
+    return tuple(items)
+
+
+def record_fingerprint(record, rename=None):
+    """计算约束记录的指纹
+
+    约束名不参与计算（目标骨骼上可能因重名被自动改名）；rename 用于把子目标骨骼名换算为参考骨架中的名称。
+    """
+    return _digest(repr((record.type, _normalize(record.fields, record.values, rename))).encode('utf-8'))
+
+
+def get_bone_fingerprints(reference_data):
+    """返回参考骨骼的几何指纹列表，结果缓存在参考数据中"""
+    fingerprints = reference_data.get('bone_fingerprints')
+    if fingerprints is None:
+        fingerprints = bone_fingerprints(reference_data['bone_arrays'])
+        reference_data['bone_fingerprints'] = fingerprints
+    return fingerprints
+
+
+def get_constraint_fingerprints(reference_data, bone_name):
+    """返回参考骨骼上各约束记录的指纹列表，结果缓存在参考数据中
+
+    模板保存了指纹时（见 template.LazyConstraints）直接使用，不反序列化约束。
+    """
+    cache = reference_data.setdefault('constraint_fingerprints', {})
+    fingerprints = cache.get(bone_name)
+    if fingerprints is None:
+        constraints = reference_data['constraints']
+        stored_fingerprints = getattr(constraints, 'stored_fingerprints', None)
+        if stored_fingerprints is not None:
+            fingerprints = stored_fingerprints(bone_name)
+        if fingerprints is None:
+            fingerprints = [record_fingerprint(record) for record in constraints[bone_name]]
+        cache[bone_name] = fingerprints
+    return fingerprints
+
+
+def get_constraint_tags(pose_bone):
+    """读取姿态骨骼上由 BoneCT 添加的约束标记 {约束名: 指纹}"""
+    tags = pose_bone.get(CONSTRAINT_TAG)
+    return {name: tags[name] for name in tags.keys()} if tags else {}
+
+
+def set_constraint_tags(pose_bone, tags):
+    if tags:
+        pose_bone[CONSTRAINT_TAG] = tags
+    elif pose_bone.get(CONSTRAINT_TAG) is not None:
+        del pose_bone[CONSTRAINT_TAG]
+
+
+def find_changed_bones(reference_data, target_armature, bone_mapping, indices, aligned=True):
+    """返回 indices 中由 BoneCT 创建、且参考骨骼几何已变化的骨骼下标
+
+    aligned 为 True 时IK链末端骨骼与其他骨骼一样按对齐后的参考几何放置，同样更新；
+    为 False 时IK链末端骨骼按默认方向和长度创建，几何与参考骨骼不同，不做更新。
+    """
+    fingerprints = get_bone_fingerprints(reference_data)
+    names = reference_data['bone_arrays'].names
+    ik_end_bones = set() if aligned else set(reference_data['ik_end_bones'])
+    target_bones = target_armature.data.bones
+    changed = []
+    for i in np.asarray(indices, dtype=np.int64).tolist():
+        name = names[i]
+        target_name = bone_mapping.get(name)
+        if target_name is None or name in ik_end_bones:
+            continue
+        tag = target_bones[target_name].get(BONE_TAG)
+        if tag is not None and tag != fingerprints[i]:
+            changed.append(i)
+    return np.asarray(changed, dtype=np.int64)
+
+
+def diff_constraints(reference_data, target_armature, bone_mapping, source_bones, orphans=False):
+    """比较 source_bones（参考骨骼名）上的约束与目标骨架中对应骨骼上的约束，返回 ConstraintDiff
+
+    已标记的约束只比较标记中的指纹；只有存在缺失约束的骨骼才会编码目标骨骼上未标记的约束，
+    与参考一致的未标记约束会被接管而不重复添加。
+    orphans 为 True 时 bone_mapping 须包含全部参考骨骼：目标骨架中没有对应参考骨骼（参考中已被删除）的骨骼上
+    带标记的约束全部视为过期。
+    """
+    source_constraints = reference_data['constraints']
+    pose_bones = target_armature.pose.bones
+    missing, changed, stale, adopted = [], [], [], []
+    unchanged = 0
+    inverse_mapping = None
+
+    for source_name in source_bones:
+        target_name = bone_mapping.get(source_name)
+        if target_name is None or target_name not in pose_bones:
+            continue
+        pb = pose_bones[target_name]
+        tags = get_constraint_tags(pb)
+        # 先只比较指纹，有需要应用的约束时才读取（模板中为反序列化）约束记录
+        if source_name in source_constraints:
+            fingerprints = get_constraint_fingerprints(reference_data, source_name)
+        else:
+            fingerprints = ()
+        if not tags and not fingerprints:
+            continue
+
+        # 标记中已被删除的约束也视为过期，只清除其标记
+        owned = {}
+        for name, fingerprint in tags.items():
+            owned.setdefault(fingerprint, []).append(name)
+        pending = []
+        for position, fingerprint in enumerate(fingerprints):
+            names = owned.get(fingerprint)
+            if names:
+                name = names.pop(0)
+                if pb.constraints.get(name) is not None:
+                    unchanged += 1
+                    continue
+                stale.append((target_name, name))
+            pending.append((position, fingerprint))
+        leftovers = [name for names in owned.values() for name in names]
+
+        records = source_constraints[source_name] if pending else ()
+        untagged = None
+        for position, fingerprint in pending:
+            record = records[position]
+            # 类型相同的过期约束就地更新
+            match = next((name for name in leftovers
+                          if pb.constraints.get(name) is not None and pb.constraints[name].type == record.type), None)
+            if match is not None:
+                leftovers.remove(match)
+                changed.append((target_name, match, record, fingerprint))
+                continue
+            if untagged is None:
+                if inverse_mapping is None:
+                    inverse_mapping = {target: source for source, target in bone_mapping.items()}
+                untagged = [
+                    (c.name, record_fingerprint(encode_constraint(c, target_armature), inverse_mapping))
+                    for c in pb.constraints if c.name not in tags
+                ]
+            match = next((item for item in untagged if item[1] == fingerprint), None)
+            if match is not None:
+                untagged.remove(match)
+                adopted.append((target_name, match[0], fingerprint))
+            else:
+                missing.append((target_name, record, fingerprint))
+        stale.extend((target_name, name) for name in leftovers)
+
+    if orphans:
+        mapped = set(bone_mapping.values())
+        for pb in pose_bones:
+            if pb.name not in mapped and pb.get(CONSTRAINT_TAG) is not None:
+                stale.extend((pb.name, name) for name in get_constraint_tags(pb))
+
+    return ConstraintDiff(missing, changed, stale, adopted, unchanged)
@@ -0,0 +1,111 @@
+"""传递日志
+
+按级别收集消息，按阶段计时并累计计数器（创建的骨骼、添加的约束、属性写入失败、模式切换等），
+代替逐条 print 整个数据结构。结果可汇总到操作符报告中，也可写入文本数据块或 JSON 文件。
+消息参数只在该级别启用时才格式化，调试级别的详细输出不会拖慢正常传递。
+"""
+
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+# 计数器名称及其在报告中的显示文本（按显示顺序）
+COUNTER_LABELS = {
+    'bones_created': "bones created",
+    'bones_updated': "bones updated",
+    'constraints_added': "constraints added",
+    'constraints_updated': "constraints updated",
+    'constraints_removed': "constraints removed",
+    'setattr_failures': "attribute failures",
+    'mode_switches': "mode switches",
+    'evaluations': "depsgraph evaluations",
+}
+
+
+class TransferLog:
+    """一次传递（或一批传递）的日志、阶段耗时和计数器"""
+
+    def __init__(self, level='WARNING', echo=True):
+        self.level = LEVELS[level]
+        self.echo = echo
+        self.records = []
+        self.timings = {}
+        self.counters = Counter()
+
+    def is_enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def log(self, level, message, *args):
+        if LEVELS[level] < self.level:
+            return
+        if args:
+            message = message % args
+        self.records.append((level, message))
+        if self.echo:
+            print(f"BoneCT {level}: {message}")
+
+    def debug(self, message, *args):
+        self.log('DEBUG', message, *args)
+
+    def info(self, message, *args):
+        self.log('INFO', message, *args)
+
+    def warning(self, message, *args):
+        self.log('WARNING', message, *args)
+
+    def error(self, message, *args):
+        self.log('ERROR', message, *args)
+
+    @contextmanager
+    def phase(self, name):
+        """统计代码块耗时，同名阶段的耗时累加（批量传递时按阶段汇总所有目标）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def messages(self, level='WARNING'):
+        """返回不低于 level 的消息"""
+        return [message for record_level, message in self.records if LEVELS[record_level] >= LEVELS[level]]
+
+    def summary(self):
+        """单行汇总，供操作符报告使用"""
+        counters = self.counters
+        parts = [f"{counters[name]} {label}" for name, label in COUNTER_LABELS.items() if counters[name]]
+        parts.extend(f"{value} {name.replace('_', ' ')}" for name, value in counters.items()
+                     if name not in COUNTER_LABELS and value)
+        total = sum(self.timings.values()) * 1000.0
+        return f"{', '.join(parts) or 'no changes'} ({total:.0f} ms)"
+
+    def to_dict(self):
+        return {
+            'timings_ms': {name: round(seconds * 1000.0, 3) for name, seconds in self.timings.items()},
+            'counters': dict(self.counters),
+            'messages': [{'level': level, 'message': message} for level, message in self.records],
+        }
+
+    def format_report(self):
+        lines = ["BoneCT transfer report", "", "Phases:"]
+        lines.extend(f"  {name}: {seconds * 1000.0:.1f} ms" for name, seconds in self.timings.items())
+        lines.append("Counters:")
+        lines.extend(f"  {name}: {value}" for name, value in self.counters.items())
+        if self.records:
+            lines.append("Messages:")
+            lines.extend(f"  [{level}] {message}" for level, message in self.records)
+        return "\n".join(lines) + "\n"
+
+    def write_text(self, text):
+        """把报告写入文本数据块（覆盖原内容）"""
+        text.clear()
+        text.write(self.format_report())
+
+    def write_json(self, filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,263 @@
+"""骨骼名称映射
+
+对骨骼名做规范化（全角/半角、大小写、分隔符、左右标记、日文↔英文），
+为每个骨架建立一次哈希索引，之后每根骨骼的匹配都是 O(1)。
+映射结果按（参考骨架, 目标骨架）缓存，骨骼名变化时自动失效。
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+
+# 标准 MMD 骨骼名 日文 → 英文 对照表（左右前缀单独处理）
+MMD_JP_EN = {
+    '全ての親': 'mother',
+    '操作中心': 'view cnt',
+    'センター': 'center',
+    'グルーブ': 'groove',
+    '腰': 'waist',
+    '上半身': 'upper body',
+    '上半身2': 'upper body2',
+    '上半身3': 'upper body3',
+    '下半身': 'lower body',
+    '首': 'neck',
+    '頭': 'head',
+    '両目': 'eyes',
+    '目': 'eye',
+    '舌': 'tongue',
+    '胸': 'bust',
+    '肩P': 'shoulder P',
+    '肩C': 'shoulder C',
+    '肩': 'shoulder',
+    '腕捩': 'arm twist',
+    '腕': 'arm',
+    'ひじ': 'elbow',
+    '手捩': 'wrist twist',
+    '手首': 'wrist',
+    'ダミー': 'dummy',
+    '親指': 'thumb',
+    '人指': 'fore',
+    '人差指': 'fore',
+    '中指': 'middle',
+    '薬指': 'third',
+    '小指': 'little',
+    '足IK親': 'leg IKP',
+    '足IK': 'leg IK',
+    'つま先IK': 'toe IK',
+    '足先EX': 'toe EX',
+    '足首D': 'ankle D',
+    'ひざD': 'knee D',
+    '足D': 'leg D',
+    '足首': 'ankle',
+    'ひざ': 'knee',
+    'つま先': 'toe',
+    '足': 'leg',
+    '腰キャンセル': 'waist cancel',
+    '髪': 'hair',
+    'スカート': 'skirt',
+    'ネクタイ': 'necktie',
+    '袖': 'sleeve',
+    '先': ' end',
+}
+
+MappingResult = namedtuple('MappingResult', ('mapping', 'matched_by', 'unmatched'))
+
+_JP_SIDES = (('左', 'L'), ('右', 'R'))
+_EN_SIDE_PREFIX = re.compile(r'^(left|right)(?=[\s._\-]|(?-i:[A-Z])|$)', re.IGNORECASE)
+_SIDE_SUFFIX = re.compile(r'[\s._\-](l|r|left|right)$', re.IGNORECASE)
+_SEPARATORS = re.compile(r'[\s._\-]+')
+
+
+def _strip_separator(match):
+    # 两侧都是数字的分隔符保留为一个 _，否则 スカート_1_10 与 スカート_11_0 会得到相同的键
+    text, start, end = match.string, match.start(), match.end()
+    return '_' if 0 < start and end < len(text) and text[start - 1].isdigit() and text[end].isdigit() else ''
+
+
+def parse_table_text(text):
+    """解析 “名称 = 名称” 形式的对照表文本，# 开头为注释"""
+    table = {}
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if '=' not in line:
+            continue
+        key, value = (part.strip() for part in line.split('=', 1))
+        if key and value:
+            table[key] = value
+    return table
+
+
+class BoneNameNormalizer:
+    """把骨骼名转换为与命名风格无关的规范键，例如 左腕 / LeftArm / arm_L → arm.L
+
+    数字之间的分隔符保留为 _，物理骨骼网格中编号不同的骨骼不会得到相同的键：
+
+    >>> normalizer = BoneNameNormalizer()
+    >>> normalizer('スカート_1_10'), normalizer('スカート_11_0'), normalizer('skirt 1.10')
+    ('skirt1_10', 'skirt11_0', 'skirt1_10')
+    >>> normalizer('hair_1_12') != normalizer('hair_11_2')
+    True
+    >>> normalizer('左腕'), normalizer('LeftArm'), normalizer('arm_L')
+    ('arm.L', 'arm.L', 'arm.L')
+    """
+
+    def __init__(self, translations=None, aliases=None):
+        self.translations = dict(MMD_JP_EN)
+        if translations:
+            self.translations.update(translations)
+        table = {unicodedata.normalize('NFKC', jp): en for jp, en in self.translations.items()}
+        self._table = table
+        self._pattern = re.compile('|'.join(re.escape(jp) for jp in sorted(table, key=len, reverse=True)))
+        self.aliases = dict(aliases or {})
+        self._cache = {}
+        self._normalized_aliases = {self(source): self(target) for source, target in self.aliases.items()}
+        self.signature = hash((tuple(sorted(self.translations.items())), tuple(sorted(self.aliases.items()))))
+
+    def __call__(self, name):
+        key = self._cache.get(name)
+        if key is not None:
+            return key
+        text = unicodedata.normalize('NFKC', name).strip()
+
+        side = ''
+        for prefix, prefix_side in _JP_SIDES:
+            if text.startswith(prefix):
+                side, text = prefix_side, text[len(prefix):]
+                break
+        if not side:
+            match = _EN_SIDE_PREFIX.match(text)
+            if match and len(text) > match.end():
+                side, text = match.group(1)[0].upper(), text[match.end():]
+        if not side:
+            match = _SIDE_SUFFIX.search(text)
+            if match:
+                side, text = match.group(1)[0].upper(), text[:match.start()]
+
+        text = self._pattern.sub(lambda m: f" {self._table[m.group(0)]} ", text)
+        key = _SEPARATORS.sub(_strip_separator, text).lower()
+        if side:
+            key = f"{key}.{side}"
+        self._cache[name] = key
+        return key
+
+    def alias(self, key):
+        return self._normalized_aliases.get(key)
+
+
+class BoneNameIndex:
+    """骨架骨骼名的哈希索引：精确名称和规范键各一张表"""
+
+    def __init__(self, names, normalizer):
+        self.names = set(names)
+        self._ordered_names = names
+        self._normalized = None
+        self.normalizer = normalizer
+
+    @property
+    def normalized(self):
+        # 规范键表在第一次需要非精确匹配时才构建，只映射少量骨骼且都能精确匹配时不必规范化整个目标骨架
+        if self._normalized is None:
+            normalized = {}
+            normalizer = self.normalizer
+            for name in self._ordered_names:
+                normalized.setdefault(normalizer(name), name)
+            self._normalized = normalized
+        return self._normalized
+
+    def resolve(self, name):
+        """返回 (目标骨骼名, 匹配方式)；未匹配时返回 (None, None)"""
+        if name in self.names:
+            return name, 'EXACT'
+        normalizer = self.normalizer
+        alias = normalizer.aliases.get(name)
+        if alias is not None and alias in self.names:
+            return alias, 'ALIAS'
+        key = normalizer(name)
+        target = self.normalized.get(key)
+        if target is not None:
+            return target, 'NORMALIZED'
+        alias_key = normalizer.alias(key)
+        if alias_key is not None:
+            target = self.normalized.get(alias_key)
+            if target is not None:
+                return target, 'ALIAS'
+        return None, None
+
+
+# 多根源骨骼匹配到同一根目标骨骼时的优先级，数值小的优先
+_METHOD_PRIORITY = {'EXACT': 0, 'ALIAS': 1, 'NORMALIZED': 2}
+
+
+def map_bone_names(source_names, target_names, normalizer):
+    """把源骨骼名映射到目标骨骼名，返回 MappingResult
+
+    每根目标骨骼最多对应一根源骨骼：先保留精确匹配，再按别名、规范键的顺序分配（同一方式按源骨骼顺序），
+    目标骨骼已被占用的源骨骼计入 unmatched。
+
+    >>> map_bone_names(['スカート_1_10', 'スカート_11_0'], ['スカート_11_0'], BoneNameNormalizer())
+    MappingResult(mapping={'スカート_11_0': 'スカート_11_0'}, matched_by={'スカート_11_0': 'EXACT'}, unmatched=['スカート_1_10'])
+    """
+    index = BoneNameIndex(target_names, normalizer)
+    resolved = [(name, *index.resolve(name)) for name in source_names]
+    claimed = {}
+    candidates = sorted(
+        (item for item in enumerate(resolved) if item[1][1] is not None),
+        key=lambda item: (_METHOD_PRIORITY[item[1][2]], item[0]),
+    )
+    for _, (name, target, _) in candidates:
+        claimed.setdefault(target, name)
+
+    mapping = {}
+    matched_by = {}
+    unmatched = []
+    for name, target, method in resolved:
+        if target is None or claimed[target] != name:
+            unmatched.append(name)
+        else:
+            mapping[name] = target
+            matched_by[name] = method
+    return MappingResult(mapping, matched_by, unmatched)
+
+
+_normalizer_cache = {}
+
+
+def get_normalizer(translations_text='', aliases_text=''):
+    """按对照表文本缓存规范化器，使规范键缓存在多次传递之间复用"""
+    cache_key = (translations_text, aliases_text)
+    normalizer = _normalizer_cache.get(cache_key)
+    if normalizer is None:
+        normalizer = BoneNameNormalizer(parse_table_text(translations_text), parse_table_text(aliases_text))
+        _normalizer_cache.clear()
+        _normalizer_cache[cache_key] = normalizer
+    return normalizer
+
+
+_mapping_cache = {}
+
+
+def _names_signature(names):
+    return len(names), hash(tuple(names))
+
+
+def get_bone_mapping(reference_key, source_names, target_armature, normalizer):
+    """获取（参考骨架, 目标骨架）的映射结果；骨骼名或对照表未变化时直接使用缓存"""
+    target_names = target_armature.data.bones.keys()
+    cache_key = (reference_key, target_armature.name)
+    signature = (_names_signature(source_names), _names_signature(target_names), normalizer.signature)
+    cached = _mapping_cache.get(cache_key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    result = map_bone_names(source_names, target_names, normalizer)
+    _mapping_cache[cache_key] = (signature, result)
+    return result
+
+
+def get_cached_bone_mapping(reference_key, target_armature):
+    """只读取缓存，不计算映射（供面板绘制使用）"""
+    cached = _mapping_cache.get((reference_key, target_armature.name))
+    return cached[1] if cached is not None else None
+
+
+def clear_mapping_cache():
+    _mapping_cache.clear()
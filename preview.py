@@ -0,0 +1,157 @@
+"""传递预览缓存
+
+按（参考, 目标骨架, 传递设置）缓存预览结果（缺失的骨骼、将添加/更新/删除的约束、未映射的子目标）。
+面板绘制时只读取缓存。缓存同时保存参考和目标骨架的结构签名（骨骼、静止姿态和编码后的约束）；参考或目标骨架出现在
+depsgraph_update_post 的更新中时重新计算签名，只有签名变化（增删或重命名骨骼、编辑约束等）时预览才失效。
+摆姿势和播放动画只更新骨架物体并改变姿态，这类更新不重新计算签名。打开其他文件时清空。
+"""
+
+import bpy
+import numpy as np
+
+from .codec import encode_constraint
+
+# {(参考键, 目标骨架名): (设置签名, 预览, 监视的骨架 {物体名: 结构签名})}
+_preview_cache = {}
+# 预览因骨架结构变化而失效时调用，由插件设置（见 register_handlers）
+_on_invalidated = None
+# {物体名: 姿态}，用于识别只改变了姿态的更新
+_pose_states = {}
+
+_POSE_PROPERTIES = (('location', 3), ('rotation_quaternion', 4), ('rotation_euler', 3), ('rotation_axis_angle', 4),
+                    ('scale', 3))
+
+
+def structure_signature(armature):
+    """骨架的结构签名：骨骼名和父骨骼、静止姿态，以及各骨骼上编码后的约束（全部可写属性）；与姿态无关"""
+    bones = armature.data.bones
+    count = len(bones)
+    matrices = np.empty(count * 16, dtype=np.float32)
+    tails = np.empty(count * 3, dtype=np.float32)
+    bones.foreach_get('matrix_local', matrices)
+    bones.foreach_get('tail_local', tails)
+    hierarchy = tuple((bone.name, bone.parent.name if bone.parent else '') for bone in bones)
+    constraints = repr([
+        (pose_bone.name, [encode_constraint(c, armature) for c in pose_bone.constraints])
+        for pose_bone in armature.pose.bones if pose_bone.constraints
+    ])
+    return hash((hierarchy, matrices.tobytes(), tails.tobytes(), constraints))
+
+
+def pose_state(armature):
+    """骨架当前姿态（各姿态骨骼的位置、旋转和缩放）"""
+    pose_bones = armature.pose.bones
+    count = len(pose_bones)
+    values = []
+    for identifier, size in _POSE_PROPERTIES:
+        array = np.empty(count * size, dtype=np.float32)
+        pose_bones.foreach_get(identifier, array)
+        values.append(array.tobytes())
+    return b''.join(values)
+
+
+def _pose_changed(armature):
+    """记录骨架的当前姿态，返回姿态是否与上次记录的不同"""
+    state = pose_state(armature)
+    changed = _pose_states.get(armature.name, state) != state
+    _pose_states[armature.name] = state
+    return changed
+
+
+def watched_armatures(*armatures):
+    """返回需要监视的骨架 {物体名: 结构签名}，同时记录其当前姿态"""
+    watched = {}
+    for armature in armatures:
+        if armature is not None:
+            watched[armature.name] = structure_signature(armature)
+            _pose_states[armature.name] = pose_state(armature)
+    return watched
+
+
+def get_cached_preview(reference_key, target_armature, settings):
+    """只读取缓存，设置签名不一致或已失效时返回 None（供面板绘制使用）"""
+    cached = _preview_cache.get((reference_key, target_armature.name))
+    if cached is None or cached[0] != settings:
+        return None
+    return cached[1]
+
+
+def store_preview(reference_key, target_armature, settings, preview, ids):
+    _preview_cache[(reference_key, target_armature.name)] = (settings, preview, ids)
+
+
+def invalidate_preview(object_names, armature_names):
+    """重新计算被更新的骨架（物体名或骨架数据名）的结构签名，删除签名已变化或骨架已不存在的预览，返回是否有预览被删除
+
+    只有骨架物体被更新（骨架数据没有）且姿态有变化时视为摆姿势或播放动画，不重新计算签名；
+    同一次更新中既改变姿态又编辑约束时这次编辑不会使预览失效。
+    """
+    signatures = {}
+    stale = []
+    for key, (_, _, watched) in _preview_cache.items():
+        for name, signature in watched.items():
+            armature = bpy.data.objects.get(name)
+            if armature is None or armature.type != 'ARMATURE':
+                stale.append(key)
+                break
+            if name not in object_names and armature.data.name not in armature_names:
+                continue
+            if name not in signatures:
+                if armature.data.name not in armature_names and _pose_changed(armature):
+                    signatures[name] = None
+                else:
+                    signatures[name] = structure_signature(armature)
+            if signatures[name] is not None and signatures[name] != signature:
+                stale.append(key)
+                break
+    for key in stale:
+        del _preview_cache[key]
+    return bool(stale)
+
+
+def clear_preview_cache():
+    _preview_cache.clear()
+    _pose_states.clear()
+
+
+@bpy.app.handlers.persistent
+def on_depsgraph_update(scene, depsgraph):
+    """骨架物体或骨架数据被更新时检查其结构签名，结构变化时使对应的预览失效并通知插件"""
+    if not _preview_cache:
+        return
+    object_names = set()
+    armature_names = set()
+    for update in depsgraph.updates:
+        data = getattr(update.id, 'original', update.id)
+        if isinstance(data, bpy.types.Object):
+            if data.type == 'ARMATURE':
+                object_names.add(data.name)
+        elif isinstance(data, bpy.types.Armature):
+            armature_names.add(data.name)
+    if (object_names or armature_names) and invalidate_preview(object_names, armature_names) and _on_invalidated:
+        _on_invalidated()
+
+
+@bpy.app.handlers.persistent
+def on_load(*args):
+    clear_preview_cache()
+
+
+def register_handlers(on_invalidated=None):
+    """注册处理器；on_invalidated 在预览因骨架结构变化而失效时调用（如安排重新计算）"""
+    global _on_invalidated
+    _on_invalidated = on_invalidated
+    if on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    if on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load)
+
+
+def unregister_handlers():
+    global _on_invalidated
+    _on_invalidated = None
+    if on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(on_depsgraph_update)
+    if on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load)
+    clear_preview_cache()
@@ -0,0 +1,233 @@
+"""传递范围
+
+把选中的骨骼（及其后代）、以某根骨骼为末端的 IK 链、骨骼集合或名称模式解析为参考骨架中的一组骨骼，
+再补上这些骨骼的约束引用的子目标骨骼，以及所有这些骨骼的祖先（创建缺失骨骼时需要父骨骼）。
+提取、映射和应用都只处理范围内的骨骼，开销与范围大小成正比，而不是与整个骨架的骨骼数量成正比。
+"""
+
+import fnmatch
+from collections import namedtuple
+
+import numpy as np
+from mathutils import Vector
+
+from .bulk import BoneArrays, bone_structure_from_arrays, read_bone_arrays
+from .codec import SELF, SUBTARGET_POINTERS, encode_constraint
+from .hierarchy import HierarchyIndex
+
+# kind: SELECTED 骨骼名列表（可含后代）/ IK_CHAIN 以该骨骼为末端的 IK 链 / COLLECTION 骨骼集合名 / PATTERN 名称模式
+# value 为骨骼名列表、末端骨骼名、逗号分隔的骨骼集合名或逗号分隔的 fnmatch 模式
+Scope = namedtuple('Scope', ('kind', 'value', 'descendants'), defaults=(True,))
+
+
+class ArmatureSource:
+    """从参考骨架按需读取骨骼和约束，编码结果缓存以便提取时复用"""
+
+    def __init__(self, armature):
+        self.armature = armature
+        self.bones = armature.data.bones
+        self.pose_bones = armature.pose.bones
+        self._records = {}
+
+    def names(self):
+        return self.bones.keys()
+
+    def __contains__(self, name):
+        return name in self.bones
+
+    def parent(self, name):
+        parent = self.bones[name].parent
+        return parent.name if parent else None
+
+    def children(self, name):
+        return [child.name for child in self.bones[name].children]
+
+    def records(self, name):
+        records = self._records.get(name)
+        if records is None:
+            records = [encode_constraint(c, self.armature) for c in self.pose_bones[name].constraints]
+            self._records[name] = records
+        return records
+
+    def collection_bones(self, collection_names):
+        data = self.armature.data
+        if hasattr(data, 'collections'):
+            # Blender 4.1 起 collections 只含顶层骨骼集合，嵌套的集合要从 collections_all 中查找
+            collections = getattr(data, 'collections_all', data.collections)
+            bones = []
+            for name in collection_names:
+                collection = collections.get(name)
+                if collection is None:
+                    raise RuntimeError(f"Bone collection '{name}' not found.")
+                bones.extend(bone.name for bone in collection.bones)
+            return bones
+        # Blender 4.0 之前使用骨骼组
+        groups = set(collection_names)
+        return [pb.name for pb in self.pose_bones if pb.bone_group and pb.bone_group.name in groups]
+
+
+class ReferenceDataSource:
+    """从已提取或已加载模板的参考数据中读取骨骼和约束"""
+
+    def __init__(self, reference_data):
+        self.reference_data = reference_data
+        self.hierarchy = reference_data['hierarchy']
+        self.constraints = reference_data['constraints']
+
+    def names(self):
+        return self.hierarchy.names
+
+    def __contains__(self, name):
+        return name in self.hierarchy.index
+
+    def parent(self, name):
+        parent = int(self.hierarchy.parents[self.hierarchy.index[name]])
+        return self.hierarchy.names[parent] if parent >= 0 else None
+
+    def children(self, name):
+        return [self.hierarchy.names[i] for i in self.hierarchy.children[self.hierarchy.index[name]]]
+
+    def records(self, name):
+        return self.constraints[name] if name in self.constraints else []
+
+    def collection_bones(self, collection_names):
+        raise RuntimeError("Bone collection scopes need a reference armature.")
+
+
+def record_subtargets(record):
+    """返回约束记录中指向所属骨架自身的子目标骨骼名（包括子集合中的目标）"""
+    return list(_subtargets(record.fields, record.values))
+
+
+def _subtargets(fields, values):
+    pointers = {identifier: value for identifier, value in zip(fields, values) if identifier in SUBTARGET_POINTERS.values()}
+    for identifier, value in zip(fields, values):
+        if identifier in SUBTARGET_POINTERS:
+            if value and pointers.get(SUBTARGET_POINTERS[identifier]) == SELF:
+                yield value
+        elif isinstance(value, (tuple, list)) and value and isinstance(value[0], (tuple, list)) and len(value[0]) == 2 \
+                and isinstance(value[0][0], (tuple, list)):
+            for item_fields, item_values in value:
+                yield from _subtargets(item_fields, item_values)
+
+
+def _record_value(record, identifier, default=None):
+    try:
+        return record.values[record.fields.index(identifier)]
+    except ValueError:
+        return default
+
+
+def ik_chain_bones(source, end_bone):
+    """以 end_bone 为末端的 IK 链：链上的骨骼（按 chain_count，0 表示直到根骨骼）及 IK 目标和极向目标"""
+    if end_bone not in source:
+        raise RuntimeError(f"Bone '{end_bone}' not found in the reference.")
+    ik_records = [record for record in source.records(end_bone) if record.type == 'IK']
+    if not ik_records:
+        raise RuntimeError(f"Bone '{end_bone}' has no IK constraint.")
+    bones = [end_bone]
+    for record in ik_records:
+        chain_count = _record_value(record, 'chain_count', 0)
+        node, length = end_bone, 1
+        while (not chain_count or length < chain_count) and source.parent(node):
+            node = source.parent(node)
+            bones.append(node)
+            length += 1
+        bones.extend(record_subtargets(record))
+    return list(dict.fromkeys(bones))
+
+
+def resolve_scope(source, scope):
+    """把 Scope 解析为范围内的参考骨骼名列表（不含补充的子目标和祖先骨骼）"""
+    if scope.kind == 'SELECTED':
+        roots = [name for name in scope.value if name in source]
+        if not scope.descendants:
+            return roots
+        bones = []
+        stack = list(reversed(roots))
+        while stack:
+            name = stack.pop()
+            bones.append(name)
+            stack.extend(reversed(source.children(name)))
+        return list(dict.fromkeys(bones))
+    if scope.kind == 'IK_CHAIN':
+        return ik_chain_bones(source, scope.value)
+    if scope.kind == 'COLLECTION':
+        names = [name.strip() for name in scope.value.split(',') if name.strip()]
+        return list(dict.fromkeys(source.collection_bones(names)))
+    if scope.kind == 'PATTERN':
+        patterns = [pattern.strip() for pattern in scope.value.split(',') if pattern.strip()]
+        return [name for name in source.names() if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+    raise ValueError(f"Unknown scope kind: {scope.kind}")
+
+
+def scope_closure(source, bones):
+    """补上范围内骨骼的约束引用的子目标骨骼，以及所有这些骨骼的祖先；返回按父先子后排列的骨骼名列表"""
+    closure = dict.fromkeys(bones)
+    for name in bones:
+        for record in source.records(name):
+            closure.update((subtarget, None) for subtarget in record_subtargets(record) if subtarget in source)
+    ordered = {}
+    for name in closure:
+        # 先收集尚未加入的祖先，再由远及近加入，保证父骨骼在前
+        chain = []
+        node = name
+        while node is not None and node not in ordered:
+            chain.append(node)
+            node = source.parent(node)
+        for node in reversed(chain):
+            ordered[node] = None
+    return list(ordered)
+
+
+def subset_arrays(arrays, hierarchy, names):
+    """从完整的 BoneArrays 中取出 names 中的骨骼，父骨骼下标换算到子集中"""
+    indices = np.asarray([hierarchy.index[name] for name in names], dtype=np.int64)
+    position = np.full(len(arrays.names), -1, dtype=np.int32)
+    position[indices] = np.arange(len(indices), dtype=np.int32)
+    parents = arrays.parents[indices]
+    parents = np.where(parents >= 0, position[np.maximum(parents, 0)], -1).astype(np.int32)
+    return BoneArrays(list(names), arrays.heads[indices], arrays.tails[indices], arrays.rolls[indices], parents)
+
+
+def build_scoped_data(source, scope, key, armature=None, bone_arrays=None):
+    """按范围构建与 extract_reference_data 结构相同的参考数据
+
+    armature 为参考骨架时只读取范围内的骨骼；否则 bone_arrays 为已加载参考数据的完整骨骼数组。
+    约束只包含范围内的骨骼，IK 链骨骼只包含范围内的 IK 约束所在的链。
+    """
+    bones = resolve_scope(source, scope)
+    if not bones:
+        raise RuntimeError("No reference bones in the transfer scope.")
+    names = scope_closure(source, bones)
+    if armature is not None:
+        arrays = read_bone_arrays(armature, names)
+    else:
+        arrays = subset_arrays(bone_arrays, source.hierarchy, names)
+    hierarchy = HierarchyIndex.from_arrays(arrays)
+
+    constraints = {}
+    for name in bones:
+        records = source.records(name)
+        if records:
+            constraints[name] = records
+    ik_end_bones = [name for name, records in constraints.items() if any(record.type == 'IK' for record in records)]
+    ik_bones = set(ik_end_bones)
+    for name in ik_end_bones:
+        for record in constraints[name]:
+            if record.type == 'IK':
+                ik_bones.update(subtarget for subtarget in record_subtargets(record) if subtarget in hierarchy.index)
+    closure = hierarchy.with_ancestors(hierarchy.indices_of(ik_bones))
+    ik_bones.update(hierarchy.names[i] for i in np.flatnonzero(closure))
+
+    return {
+        'key': key + ('SCOPED',),
+        'armature': armature,
+        'bone_structure': bone_structure_from_arrays(arrays, Vector),
+        'bone_arrays': arrays,
+        'hierarchy': hierarchy,
+        'ik_end_bones': ik_end_bones,
+        'ik_chain_bones': ik_bones,
+        'constraints': constraints,
+        'scope': bones,
+    }
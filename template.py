@@ -0,0 +1,176 @@
+"""参考骨架模板
+
+把参考骨架快照（骨骼结构、IK链和编码后的约束）保存为带版本号的 JSON 文件，
+使传递不再依赖同一 .blend 中的参考骨架。每根骨骼的约束单独存为一段 JSON 文本，
+加载时只解析外层结构，约束记录在首次访问该骨骼时才反序列化；约束指纹在写入时计算并随模板保存，
+过滤和增量比较都不需要反序列化约束。
+已加载的模板按文件内容哈希缓存，同一会话中重复使用同一模板不再解析。
+"""
+
+import hashlib
+import json
+from collections.abc import Mapping
+
+from mathutils import Vector
+
+from .bulk import bone_arrays_from_structure
+from .codec import ConstraintRecord
+from .hierarchy import HierarchyIndex
+from .incremental import record_fingerprint
+
+TEMPLATE_FORMAT = "BoneCT-template"
+TEMPLATE_VERSION = 1
+
+_template_cache = {}
+_path_hashes = {}
+
+
+def _decode_bone_constraints(payload, schemas):
+    return [
+        ConstraintRecord(item[0], tuple(item[2]) if len(item) > 2 else schemas[item[0]], tuple(item[1]))
+        for item in json.loads(payload)
+    ]
+
+
+class LazyConstraints(Mapping):
+    """按骨骼延迟反序列化的约束记录 {骨骼名: [ConstraintRecord]}"""
+
+    def __init__(self, payloads, schemas, fingerprints=None, decoded=None):
+        self._payloads = payloads
+        self._schemas = schemas
+        self._fingerprints = fingerprints or {}
+        self._decoded = {} if decoded is None else decoded
+
+    def __getitem__(self, bone_name):
+        records = self._decoded.get(bone_name)
+        if records is None:
+            records = _decode_bone_constraints(self._payloads[bone_name], self._schemas)
+            self._decoded[bone_name] = records
+        return records
+
+    def stored_fingerprints(self, bone_name):
+        """返回模板中保存的约束指纹列表，不反序列化约束；旧模板没有保存时返回 None"""
+        return self._fingerprints.get(bone_name)
+
+    def subset(self, bone_names):
+        """返回只含 bone_names 的 LazyConstraints，与原对象共享已反序列化的记录"""
+        payloads = {name: self._payloads[name] for name in bone_names}
+        return LazyConstraints(payloads, self._schemas, self._fingerprints, self._decoded)
+
+    def __contains__(self, bone_name):
+        return bone_name in self._payloads
+
+    def __iter__(self):
+        return iter(self._payloads)
+
+    def __len__(self):
+        return len(self._payloads)
+
+
+def _encode_bone_constraints(records, schemas):
+    items = []
+    for record in records:
+        fields = schemas.setdefault(record.type, record.fields)
+        if fields == record.fields:
+            items.append([record.type, record.values])
+        else:
+            items.append([record.type, record.values, record.fields])
+    return json.dumps(items, ensure_ascii=False, separators=(',', ':'))
+
+
+def write_template(reference_data, filepath, metadata=None):
+    """将参考数据写入模板文件"""
+    schemas = {}
+    constraints = {
+        bone_name: _encode_bone_constraints(reference_data['constraints'][bone_name], schemas)
+        for bone_name in reference_data['constraints']
+    }
+    # 指纹按加载后的记录计算，与不保存指纹时由反序列化的记录计算的结果一致
+    fingerprints = {
+        bone_name: [record_fingerprint(record) for record in _decode_bone_constraints(payload, schemas)]
+        for bone_name, payload in constraints.items()
+    }
+    template = {
+        'format': TEMPLATE_FORMAT,
+        'version': TEMPLATE_VERSION,
+        'metadata': metadata or {},
+        'bones': {
+            bone_name: {
+                'head': list(bone_data['head']),
+                'tail': list(bone_data['tail']),
+                'roll': bone_data['roll'],
+                'parent': bone_data['parent'],
+            }
+            for bone_name, bone_data in reference_data['bone_structure'].items()
+        },
+        'ik_end_bones': list(reference_data['ik_end_bones']),
+        'ik_chain_bones': sorted(reference_data['ik_chain_bones']),
+        'schemas': {c_type: list(fields) for c_type, fields in schemas.items()},
+        'constraints': constraints,
+        'fingerprints': fingerprints,
+    }
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(template, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def parse_template(content):
+    """解析模板内容（bytes），返回与 extract_reference_data 相同结构的参考数据"""
+    try:
+        template = json.loads(content)
+    except ValueError as e:
+        raise RuntimeError(f"Invalid reference template: {e}")
+    if not isinstance(template, dict) or template.get('format') != TEMPLATE_FORMAT:
+        raise RuntimeError("Not a BoneCT reference template.")
+    if template.get('version') != TEMPLATE_VERSION:
+        raise RuntimeError(f"Unsupported reference template version: {template.get('version')}")
+
+    bone_structure = {
+        bone_name: {
+            'head': Vector(bone_data['head']),
+            'tail': Vector(bone_data['tail']),
+            'roll': bone_data['roll'],
+            'parent': bone_data['parent'],
+        }
+        for bone_name, bone_data in template['bones'].items()
+    }
+    schemas = {c_type: tuple(fields) for c_type, fields in template['schemas'].items()}
+    bone_arrays = bone_arrays_from_structure(bone_structure)
+    return {
+        'armature': None,
+        'bone_structure': bone_structure,
+        'bone_arrays': bone_arrays,
+        'hierarchy': HierarchyIndex.from_arrays(bone_arrays),
+        'ik_end_bones': template['ik_end_bones'],
+        'ik_chain_bones': set(template['ik_chain_bones']),
+        'constraints': LazyConstraints(template['constraints'], schemas, template.get('fingerprints')),
+        'metadata': template.get('metadata', {}),
+    }
+
+
+def load_template(filepath):
+    """加载模板文件；内容未变化时直接返回缓存的参考数据"""
+    try:
+        with open(filepath, 'rb') as f:
+            content = f.read()
+    except OSError as e:
+        raise RuntimeError(f"Cannot read reference template '{filepath}': {e}")
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    _path_hashes[filepath] = content_hash
+    reference_data = _template_cache.get(content_hash)
+    if reference_data is None:
+        reference_data = parse_template(content)
+        reference_data['key'] = ('TEMPLATE', content_hash)
+        reference_data['content_hash'] = content_hash
+        _template_cache[content_hash] = reference_data
+    return reference_data
+
+
+def get_loaded_template_hash(filepath):
+    """返回该路径最近一次加载时的内容哈希，不读取文件；未加载过时返回 None"""
+    return _path_hashes.get(filepath)
+
+
+def clear_template_cache():
+    _template_cache.clear()
+    _path_hashes.clear()
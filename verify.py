@@ -0,0 +1,423 @@
+"""姿态等价验证
+
+传递后让参考骨架和目标骨架摆出相同的姿态（随机采样的旋转，或参考骨架动作中各帧的姿态），
+每个姿态只做一次 foreach_set、一次求值和一次 foreach_get，再对所有姿态和骨骼一次性比较求值后的世界矩阵。
+一个视图层同时只能求值一个姿态，所以各姿态依次求值（每个姿态一次 view_layer.update()），只有比较是批量进行的。
+驱动前两个骨架的其他骨骼都回到静止姿态（按动作驱动时参考骨架除外），原有姿态不会造成偏差。
+两个骨架比例或静止姿态不同时，先用对应骨骼的静止姿态拟合相似变换（见 align.fit_similarity），
+把目标骨架的姿态换算到参考骨架的坐标系中再比较；比较的是相对静止姿态的旋转和位移。
+
+偏差超过容差的骨骼按全局偏差报告；偏差由骨骼自身产生（而不是从父骨骼继承）时，
+把该骨骼上的约束一并报告，找出无效的子目标、回退为默认值的枚举设置或被跳过的属性。
+采样的姿态只由种子和姿态编号决定，与采样的顺序和数量无关，同一种子的验证结果可以复现。
+"""
+
+import math
+
+import numpy as np
+
+from .align import fit_similarity, nearest_anchors
+from .hierarchy import HierarchyIndex
+
+DEFAULT_POSES = 50
+# 采样姿态中每根骨骼的最大旋转角（度）
+DEFAULT_MAX_ANGLE = 45.0
+DEFAULT_ANGLE_TOLERANCE = 1.0
+DEFAULT_LOCATION_TOLERANCE = 0.01
+
+_EPSILON = 1e-9
+
+
+def _matrix_array(matrix):
+    return np.array([tuple(row) for row in matrix], dtype=np.float64)
+
+
+def _foreach_matrices(collection, attr):
+    count = len(collection)
+    buffer = np.empty(count * 16, dtype=np.float32)
+    collection.foreach_get(attr, buffer)
+    # RNA 矩阵按列主序展开，转置后为按行存储
+    return buffer.reshape(count, 4, 4).transpose(0, 2, 1).astype(np.float64)
+
+
+def _foreach_vectors(collection, attr, width):
+    buffer = np.empty(len(collection) * width, dtype=np.float32)
+    collection.foreach_get(attr, buffer)
+    return buffer.reshape(len(collection), width)
+
+
+def quaternions_to_matrices(quaternions):
+    """(..., 4) 的 (w, x, y, z) 四元数批量转换为 (..., 3, 3) 旋转矩阵"""
+    q = quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    return np.stack((
+        np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)), axis=-1),
+        np.stack((2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)), axis=-1),
+        np.stack((2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)), axis=-1),
+    ), axis=-2)
+
+
+def matrices_to_quaternions(matrices):
+    """(..., 3, 3) 旋转矩阵批量转换为 (..., 4) 的 (w, x, y, z) 四元数（按最大的对角分量选择计算分支）"""
+    m = matrices
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    candidates = np.stack((
+        np.stack((1 + trace, m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1]), -1),
+        np.stack((m[..., 2, 1] - m[..., 1, 2], 1 + 2 * m[..., 0, 0] - trace, m[..., 0, 1] + m[..., 1, 0],
+                  m[..., 0, 2] + m[..., 2, 0]), -1),
+        np.stack((m[..., 0, 2] - m[..., 2, 0], m[..., 0, 1] + m[..., 1, 0], 1 + 2 * m[..., 1, 1] - trace,
+                  m[..., 1, 2] + m[..., 2, 1]), -1),
+        np.stack((m[..., 1, 0] - m[..., 0, 1], m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1],
+                  1 + 2 * m[..., 2, 2] - trace), -1),
+    ), -2)
+    choice = np.argmax(np.stack((trace, m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]), -1), axis=-1)
+    q = np.take_along_axis(candidates, choice[..., None, None], axis=-2)[..., 0, :]
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.where(q[..., :1] < 0.0, -q, q)
+
+
+def _rotation_parts(matrices):
+    """取出 4x4 矩阵的旋转部分（各列归一化，去掉缩放）"""
+    rotations = matrices[..., :3, :3]
+    return rotations / np.maximum(np.linalg.norm(rotations, axis=-2, keepdims=True), _EPSILON)
+
+
+def _angles(a, b):
+    """批量计算旋转矩阵 a 与 b 之间的夹角（度）"""
+    cos = (np.einsum('...ji,...ji->...', a, b) - 1.0) * 0.5
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def _rest_offsets(rest, parents, children):
+    """静止姿态中子骨骼头部在父骨骼局部空间中的位置"""
+    return np.einsum('nji,nj->ni', _rotation_parts(rest[parents]), rest[children][:, :3, 3] - rest[parents][:, :3, 3])
+
+
+def _local_offsets(poses, rest, parents, children):
+    """子骨骼头部在父骨骼局部空间中相对静止姿态的位移"""
+    posed = np.einsum('pnji,pnj->pni', _rotation_parts(poses[:, parents]),
+                      poses[:, children][..., :3, 3] - poses[:, parents][..., :3, 3])
+    return posed - _rest_offsets(rest, parents, children)
+
+
+def sample_poses(count, max_angle=DEFAULT_MAX_ANGLE, seed=0):
+    """返回 (姿态编号列表, 采样函数)，采样函数为 (姿态编号, 骨骼数) -> (骨骼数, 4) 四元数
+
+    每个姿态的随机旋转只由种子和姿态编号决定。
+    """
+    limit = math.radians(max_angle)
+
+    def pose(index, bone_count):
+        rng = np.random.default_rng((seed, index))
+        axes = rng.normal(size=(bone_count, 3))
+        axes /= np.maximum(np.linalg.norm(axes, axis=1, keepdims=True), _EPSILON)
+        angles = rng.uniform(0.0, limit, bone_count)
+        return np.hstack((np.cos(angles * 0.5)[:, None], axes * np.sin(angles * 0.5)[:, None]))
+
+    return list(range(count)), pose
+
+
+def action_frames(armature, limit=None):
+    """返回骨架动作中有关键帧的帧（升序）；超过 limit 个时均匀抽取"""
+    animation_data = armature.animation_data
+    action = animation_data.action if animation_data else None
+    if action is None:
+        return []
+    frames = sorted({int(round(point.co[0])) for fcurve in action.fcurves for point in fcurve.keyframe_points})
+    if limit and len(frames) > limit:
+        frames = [frames[i] for i in np.linspace(0, len(frames) - 1, limit).round().astype(int)]
+    return frames
+
+
+class _PoseState:
+    """保存并恢复姿态骨骼的旋转模式、位置、旋转和缩放；写入的姿态以保存的姿态（clear() 后为静止姿态）为基础"""
+
+    def __init__(self, armature, rows):
+        self.pose_bones = armature.pose.bones
+        self.location = _foreach_vectors(self.pose_bones, 'location', 3).copy()
+        # 切换旋转模式时 Blender 会把当前旋转换算到新模式的值，所以三种旋转的值都要在切换前保存
+        self.rotation_euler = _foreach_vectors(self.pose_bones, 'rotation_euler', 3).copy()
+        self.rotation_axis_angle = _foreach_vectors(self.pose_bones, 'rotation_axis_angle', 4).copy()
+        self.rotation = _foreach_vectors(self.pose_bones, 'rotation_quaternion', 4).copy()
+        self.scale = _foreach_vectors(self.pose_bones, 'scale', 3).copy()
+        # 旋转模式不能用 foreach 读写，只逐根处理被驱动的骨骼
+        self.modes = {}
+        for row in rows:
+            pose_bone = self.pose_bones[int(row)]
+            if pose_bone.rotation_mode != 'QUATERNION':
+                self.modes[int(row)] = pose_bone.rotation_mode
+                pose_bone.rotation_mode = 'QUATERNION'
+        self.base = (self.location, self.rotation, self.scale)
+
+    def clear(self):
+        """把全部骨骼设为静止姿态"""
+        count = len(self.pose_bones)
+        location = np.zeros((count, 3), dtype=np.float32)
+        rotation = np.tile(np.array((1.0, 0.0, 0.0, 0.0), dtype=np.float32), (count, 1))
+        scale = np.ones((count, 3), dtype=np.float32)
+        self.pose_bones.foreach_set('location', location.ravel())
+        self.pose_bones.foreach_set('rotation_quaternion', rotation.ravel())
+        self.pose_bones.foreach_set('rotation_euler', location.ravel())
+        self.pose_bones.foreach_set('rotation_axis_angle', np.tile(np.array((0.0, 0.0, 1.0, 0.0), dtype=np.float32),
+                                                                   (count, 1)).ravel())
+        self.pose_bones.foreach_set('scale', scale.ravel())
+        self.base = (location, rotation, scale)
+
+    def set_rotations(self, rows, quaternions):
+        rotation = self.base[1].copy()
+        rotation[rows] = quaternions
+        self.pose_bones.foreach_set('rotation_quaternion', rotation.astype(np.float32).ravel())
+
+    def set_basis(self, rows, quaternions, locations, scales):
+        location = self.base[0].copy()
+        location[rows] = locations
+        scale = self.base[2].copy()
+        scale[rows] = scales
+        self.pose_bones.foreach_set('location', location.astype(np.float32).ravel())
+        self.pose_bones.foreach_set('scale', scale.astype(np.float32).ravel())
+        self.set_rotations(rows, quaternions)
+
+    def restore(self):
+        # 先恢复旋转模式，再写回保存的值，避免模式切换时的换算覆盖原来的旋转
+        for row, mode in self.modes.items():
+            self.pose_bones[row].rotation_mode = mode
+        self.pose_bones.foreach_set('location', self.location.ravel())
+        self.pose_bones.foreach_set('rotation_quaternion', self.rotation.ravel())
+        self.pose_bones.foreach_set('rotation_euler', self.rotation_euler.ravel())
+        self.pose_bones.foreach_set('rotation_axis_angle', self.rotation_axis_angle.ravel())
+        self.pose_bones.foreach_set('scale', self.scale.ravel())
+
+
+def verify_pose_equivalence(context, reference_armature, target_armature, bone_mapping, poses=DEFAULT_POSES,
+                            frames=None, max_angle=DEFAULT_MAX_ANGLE, seed=0,
+                            angle_tolerance=DEFAULT_ANGLE_TOLERANCE, location_tolerance=DEFAULT_LOCATION_TOLERANCE,
+                            log=None):
+    """驱动两个骨架摆出相同的姿态并比较对应骨骼的世界矩阵，返回验证报告
+
+    frames 给定时使用参考骨架在这些帧的姿态（由其动作驱动），否则使用 poses 个随机采样的姿态（只有旋转）。
+    location_tolerance 以参考骨架的长度单位计。两个骨架的姿态在结束后恢复。
+    """
+    reference_bones = reference_armature.data.bones
+    target_bones = target_armature.data.bones
+    reference_names = reference_bones.keys()
+    target_index = {name: i for i, name in enumerate(target_bones.keys())}
+    pairs = [(i, target_index[bone_mapping[name]]) for i, name in enumerate(reference_names)
+             if bone_mapping.get(name) in target_index]
+    if not pairs:
+        raise RuntimeError("No bones of the reference armature are mapped to the target armature.")
+    reference_rows = np.asarray([pair[0] for pair in pairs], dtype=np.int64)
+    target_rows = np.asarray([pair[1] for pair in pairs], dtype=np.int64)
+
+    # 静止姿态（世界空间）及把参考骨架映射到目标骨架的相似变换
+    reference_world = _matrix_array(reference_armature.matrix_world)
+    target_world = _matrix_array(target_armature.matrix_world)
+    reference_rest = reference_world @ _foreach_matrices(reference_bones, 'matrix_local')[reference_rows]
+    target_rest = target_world @ _foreach_matrices(target_bones, 'matrix_local')[target_rows]
+    reference_rest_tails = _foreach_vectors(reference_bones, 'tail_local', 3)[reference_rows] @ reference_world[:3, :3].T \
+        + reference_world[:3, 3]
+    target_rest_tails = _foreach_vectors(target_bones, 'tail_local', 3)[target_rows] @ target_world[:3, :3].T \
+        + target_world[:3, 3]
+    alignment = fit_similarity(
+        np.vstack((reference_rest[:, :3, 3], reference_rest_tails)),
+        np.vstack((target_rest[:, :3, 3], target_rest_tails)),
+    )
+    rotation = alignment.rotation
+    reference_rest_rotations = _rotation_parts(reference_rest)
+    target_rest_rotations = _rotation_parts(target_rest)
+    # 把参考骨骼局部空间中的旋转换算到目标骨骼局部空间：F = Wt^T R Wr
+    frame_change = np.matmul(target_rest_rotations.transpose(0, 2, 1), np.matmul(rotation, reference_rest_rotations))
+
+    scene = context.scene
+    view_layer = context.view_layer
+    current_frame = scene.frame_current
+    if frames is not None:
+        indices, sampler = list(frames), None
+    else:
+        indices, sampler = sample_poses(poses, max_angle, seed)
+
+    reference_state = _PoseState(reference_armature, reference_rows if sampler else ())
+    target_state = _PoseState(target_armature, target_rows)
+    reference_poses = np.empty((len(indices), len(pairs), 4, 4))
+    target_poses = np.empty((len(indices), len(pairs), 4, 4))
+    try:
+        if sampler is not None:
+            reference_state.clear()
+        target_state.clear()
+        for p, index in enumerate(indices):
+            if sampler is not None:
+                reference_quaternions = sampler(index, len(pairs))
+                reference_state.set_rotations(reference_rows, reference_quaternions)
+                reference_locations = np.zeros((len(pairs), 3))
+                reference_scales = np.ones((len(pairs), 3))
+            else:
+                scene.frame_set(int(index))
+                basis = _foreach_matrices(reference_armature.pose.bones, 'matrix_basis')[reference_rows]
+                reference_quaternions = matrices_to_quaternions(_rotation_parts(basis))
+                reference_locations = basis[:, :3, 3]
+                reference_scales = np.linalg.norm(basis[:, :3, :3], axis=-2)
+            # 目标骨骼的局部旋转 F Q F^T，局部位移按相似变换缩放；
+            # 缩放按坐标轴的对应关系换算，非均匀缩放只在两根骨骼的局部坐标轴相互对应时准确
+            local = np.matmul(np.matmul(frame_change, quaternions_to_matrices(reference_quaternions)),
+                              frame_change.transpose(0, 2, 1))
+            target_state.set_basis(target_rows, matrices_to_quaternions(local),
+                                   alignment.scale * np.einsum('nij,nj->ni', frame_change, reference_locations),
+                                   np.einsum('nij,nj->ni', np.square(frame_change), reference_scales))
+            view_layer.update()
+            reference_poses[p] = reference_world @ _foreach_matrices(reference_armature.pose.bones, 'matrix')[reference_rows]
+            target_poses[p] = target_world @ _foreach_matrices(target_armature.pose.bones, 'matrix')[target_rows]
+    finally:
+        reference_state.restore()
+        target_state.restore()
+        if frames is not None:
+            scene.frame_set(current_frame)
+        else:
+            view_layer.update()
+
+    # 相对静止姿态的旋转：参考为 P Wr^T，目标换算到参考坐标系后为 R^T P Wt^T R
+    reference_deform = np.matmul(_rotation_parts(reference_poses), reference_rest_rotations.transpose(0, 2, 1))
+    target_deform = np.matmul(np.matmul(rotation.T, _rotation_parts(target_poses)),
+                              np.matmul(target_rest_rotations.transpose(0, 2, 1), rotation))
+    # 相对静止姿态的位移，目标换算到参考坐标系
+    reference_offsets = reference_poses[..., :3, 3] - reference_rest[:, :3, 3]
+    target_offsets = (target_poses[..., :3, 3] - target_rest[:, :3, 3]) @ rotation / alignment.scale
+    errors = np.matmul(reference_deform.transpose(0, 1, 3, 2), target_deform)
+    angles = _angles(np.broadcast_to(np.eye(3), errors.shape), errors)
+    distances = np.linalg.norm(reference_offsets - target_offsets, axis=-1)
+
+    # 骨骼自身产生的偏差：相对最近的已对应祖先骨骼的局部旋转和局部位移之差，从父骨骼继承的偏差不计入
+    hierarchy = HierarchyIndex.from_armature(reference_armature)
+    is_mapped = np.zeros(len(reference_names), dtype=bool)
+    is_mapped[reference_rows] = True
+    row_of = np.full(len(reference_names), -1, dtype=np.int64)
+    row_of[reference_rows] = np.arange(len(pairs))
+    parents = row_of[nearest_anchors(hierarchy, is_mapped)[reference_rows]]
+    children = np.flatnonzero(parents >= 0)
+    parents = parents[children]
+    local_angles = angles.copy()
+    local_angles[:, children] = _angles(
+        np.matmul(reference_deform[:, parents].transpose(0, 1, 3, 2), reference_deform[:, children]),
+        np.matmul(target_deform[:, parents].transpose(0, 1, 3, 2), target_deform[:, children]),
+    )
+    reference_local = _local_offsets(reference_poses, reference_rest, parents, children)
+    # 目标骨架的局部位移换算到参考父骨骼的局部空间：F^T v / s
+    target_local = np.einsum('nji,pnj->pni', frame_change[parents],
+                             _local_offsets(target_poses, target_rest, parents, children)) / alignment.scale
+    local_distances = distances.copy()
+    local_distances[:, children] = np.linalg.norm(reference_local - target_local, axis=-1)
+    # 静止姿态中相对父骨骼的位置不同时，父骨骼转动会使子骨骼偏离，偏差同样从该骨骼开始
+    rest_distances = np.zeros(len(pairs))
+    rest_distances[children] = np.linalg.norm(
+        _rest_offsets(reference_rest, parents, children)
+        - np.einsum('nji,nj->ni', frame_change[parents], _rest_offsets(target_rest, parents, children)) / alignment.scale,
+        axis=-1,
+    )
+
+    report = build_report(
+        reference_armature, target_armature, pairs, reference_names, angles, distances, local_angles, local_distances,
+        rest_distances, angle_tolerance, location_tolerance,
+    )
+    for entry in report['bones']:
+        entry['pose'] = int(indices[entry['pose']])
+    report.update(poses=len(indices), frames=[int(frame) for frame in frames] if frames is not None else [],
+                  scale=alignment.scale, rest_residual=alignment.residual)
+    if log is not None:
+        log.info("Verified '%s' over %d poses: max deviation %.3g deg, %.3g", target_armature.name, len(indices),
+                 report['max_angle'], report['max_location'])
+        for entry in report['bones']:
+            log.warning("Bone '%s' deviates from the reference by %.3g deg, %.3g (%s %d)",
+                        entry['bone'], entry['angle'], entry['location'], 'frame' if frames is not None else 'pose',
+                        entry['pose'])
+        for entry in report['constraints']:
+            if not entry['present']:
+                log.warning("Constraint '%s' (%s) on '%s' is missing in the target.",
+                            entry['constraint'], entry['type'], entry['bone'])
+    return report
+
+
+def _constraint_entries(reference_pose_bone, target_pose_bone, angle, location):
+    """把骨骼自身的偏差归到其约束上；参考约束按类型依次对应目标骨骼上的约束"""
+    available = list(target_pose_bone.constraints)
+    entries = []
+    for constraint in reference_pose_bone.constraints:
+        match = next((c for c in available if c.type == constraint.type), None)
+        if match is not None:
+            available.remove(match)
+        entries.append({
+            'bone': reference_pose_bone.name,
+            'target_bone': target_pose_bone.name,
+            'constraint': constraint.name,
+            'target_constraint': match.name if match is not None else None,
+            'type': constraint.type,
+            'present': match is not None,
+            'angle': angle,
+            'location': location,
+        })
+    # 目标骨骼上多出的约束同样可能造成偏差
+    entries.extend({
+        'bone': reference_pose_bone.name,
+        'target_bone': target_pose_bone.name,
+        'constraint': None,
+        'target_constraint': c.name,
+        'type': c.type,
+        'present': True,
+        'angle': angle,
+        'location': location,
+    } for c in available)
+    return entries
+
+
+def _severity(entry, angle_tolerance, location_tolerance):
+    """偏差相对容差的大小，用于排序"""
+    return entry['angle'] / max(angle_tolerance, _EPSILON) + entry['location'] / max(location_tolerance, _EPSILON)
+
+
+def build_report(reference_armature, target_armature, pairs, reference_names, angles, distances, local_angles,
+                 local_distances, rest_distances, angle_tolerance, location_tolerance):
+    """由 (姿态数, 骨骼数) 的偏差数组生成报告：超出容差的骨骼及其上的约束，按偏差从大到小排列
+
+    source 表示偏差从该骨骼开始（自身的局部旋转、局部位移或静止姿态中相对父骨骼的位置不同），而不是从父骨骼继承。
+    """
+    worst_angle = angles.max(axis=0) if len(angles) else np.zeros(len(pairs))
+    worst_distance = distances.max(axis=0) if len(distances) else np.zeros(len(pairs))
+    worst_pose = np.argmax(angles / max(angle_tolerance, _EPSILON) + distances / max(location_tolerance, _EPSILON),
+                           axis=0) if len(angles) else np.zeros(len(pairs), dtype=np.int64)
+    failed = (worst_angle > angle_tolerance) | (worst_distance > location_tolerance)
+    local_angle = local_angles.max(axis=0) if len(angles) else np.zeros(len(pairs))
+    local_distance = local_distances.max(axis=0) if len(angles) else np.zeros(len(pairs))
+    is_source = failed & ((local_angle > angle_tolerance) | (local_distance > location_tolerance)
+                          | (rest_distances > location_tolerance))
+
+    reference_pose_bones = reference_armature.pose.bones
+    target_pose_bones = target_armature.pose.bones
+    target_names = target_armature.data.bones.keys()
+    bones = []
+    constraints = []
+    for row in np.flatnonzero(failed).tolist():
+        reference_row, target_row = pairs[row]
+        bones.append({
+            'bone': reference_names[reference_row],
+            'target_bone': target_names[target_row],
+            'angle': float(worst_angle[row]),
+            'location': float(worst_distance[row]),
+            'pose': int(worst_pose[row]),
+            'local_angle': float(local_angle[row]),
+            'local_location': float(local_distance[row]),
+            'rest_location': float(rest_distances[row]),
+            'source': bool(is_source[row]),
+        })
+        if is_source[row]:
+            constraints.extend(_constraint_entries(reference_pose_bones[reference_row], target_pose_bones[target_row],
+                                                   float(local_angle[row]), float(local_distance[row])))
+    bones.sort(key=lambda entry: _severity(entry, angle_tolerance, location_tolerance), reverse=True)
+    return {
+        'reference': reference_armature.name,
+        'target': target_armature.name,
+        'status': 'FAILED' if bones else 'PASSED',
+        'mapped_bones': len(pairs),
+        'angle_tolerance': angle_tolerance,
+        'location_tolerance': location_tolerance,
+        'max_angle': float(worst_angle.max()) if len(pairs) else 0.0,
+        'max_location': float(worst_distance.max()) if len(pairs) else 0.0,
+        'bones': bones,
+        'constraints': constraints,
+    }